@@ -39,7 +39,7 @@ def create_app(config: Type[BaseConfig] = DevelopmentConfig):
     app.config.from_object(config)
 
     db.init_app(app)
-    socketio.init_app(app)
+    load_socketio(app)
     moment.init_app(app)
     cors.init_app(app)
     migrate.init_app(app, db)
@@ -85,9 +85,20 @@ def create_app(config: Type[BaseConfig] = DevelopmentConfig):
 
     return app
 
+def load_socketio(app):
+    from app.shared.message_queue import create_client_manager
+
+    client_manager = create_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL'])
+    if client_manager:
+        socketio.init_app(app, client_manager=client_manager)
+    else:
+        socketio.init_app(app)
+
 def load_oauth_client(app):
     global oauth_client
     oauth_client = WebApplicationClient(app.config['GOOGLE_CLIENT_ID'])
 
 def load_pinecone_index(app):
+    if app.config['QNA_RETRIEVER'] != 'pinecone':
+        return
     pinecone.init(api_key=app.config['PINECONE_API_KEY'], environment=app.config['PINECONE_ENV'])
@@ -1,7 +1,7 @@
 from flask import Blueprint
 
 ai_blueprint = Blueprint('ai', __name__)
-ai_api_blueprint = Blueprint("ai_api", __name__, url_prefix='/api/v1/ai')
+ai_api_blueprint = Blueprint("ai_api", __name__, url_prefix='/api/v1/ai', cli_group='qna')
 
-from app.ai.essay import api, routes
-from app.ai.qna import api, routes
+from app.ai.essay import api, routes, commands
+from app.ai.qna import api, routes, commands
@@ -2,9 +2,10 @@ from flask import request, jsonify, Response
 from flask_login import current_user, login_required
 
 from app.ai import ai_api_blueprint
-from app.ai.essay import services
+from app.ai.essay import jobs, services
 from app.exceptions import BadRequest, Unauthorized, NotFound
-from app.models import Essay
+from app.models import Essay, EssayJob
+from app.shared.pagination import page_size
 
 
 @ai_api_blueprint.route('/essay/<int:essay_id>')
@@ -23,8 +24,14 @@ def get_essay(essay_id: int):
 @ai_api_blueprint.route('/essay/all')
 @login_required
 def get_all_essays():
-    essays = [essay.serialized for essay in list(current_user.essays)]
-    return jsonify(essays)
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int), default=20)
+    summary = request.args.get('summary', default='false').lower() == 'true'
+
+    essays, next_cursor = services.get_user_essays_page(current_user.id, cursor, limit, summary)
+    if summary:
+        return jsonify({'essays': [essay.serialized_summary for essay in essays], 'nextCursor': next_cursor})
+    return jsonify({'essays': [essay.serialized for essay in essays], 'nextCursor': next_cursor})
 
 
 @ai_api_blueprint.route('/essay/grade', methods=['POST'])
@@ -38,5 +45,18 @@ def grade_essay() -> Response:
     if not essay:
         raise BadRequest(message='Essay not present')
 
-    essay = services.grade_essay(topic, essay, current_user.id)
-    return jsonify(essay.serialized)
+    job = jobs.enqueue(topic, essay, current_user.id)
+    return jsonify(job.serialized), 202
+
+
+@ai_api_blueprint.route('/essay/jobs/<job_id>')
+@login_required
+def get_essay_job(job_id: str):
+    job = EssayJob.get_by_id(job_id)
+    if not job:
+        raise NotFound(message='Essay job not found')
+
+    if job.user_id != current_user.id:
+        raise Unauthorized(message='This essay job is not yours')
+
+    return jsonify(job.serialized)
@@ -0,0 +1,17 @@
+import click
+from flask import current_app
+
+from app.ai import ai_blueprint
+from app.ai.essay import jobs
+from app.ai.llm import get_llm_client
+
+
+@ai_blueprint.cli.command('recover-essay-jobs')
+def recover_essay_jobs():
+    """
+    Grade the essay jobs left queued by stopped workers, and fail and refund those left running.
+    Run when starting the workers, such as when deploying; the command exits once the queued jobs are graded.
+    """
+    queued, failed = jobs.recover(current_app._get_current_object(), get_llm_client(),
+                                  current_app.config['ESSAY_JOB_TIMEOUT'])
+    click.echo(f'Submitted {queued} queued essay jobs again and failed {failed} stale running jobs')
@@ -0,0 +1,178 @@
+import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import select, update
+
+from app import db, socketio
+from app.ai.essay import services
+from app.ai.llm import LLMClient, get_llm_client
+from app.models import EssayJob, EssayJobStatus, User
+
+NAMESPACE = '/essay/socket'
+FAILED_ERROR = 'The essay could not be graded, please try again'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(app: Flask) -> ThreadPoolExecutor:
+    """
+    Get the pool of grading workers of this process, sized by the ESSAY_GRADING_WORKERS setting.
+
+    :param app: The app whose settings size the pool.
+    :type app: Flask
+    :return: The pool of grading workers.
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['ESSAY_GRADING_WORKERS'],
+                                           thread_name_prefix='essay-grading')
+        return _executor
+
+
+def enqueue(topic: str, essay: str, user_id: int, charged: bool = False) -> EssayJob:
+    """
+    Save an essay grading job and submit it to the grading workers, without waiting for the grade.
+
+    :param topic: The topic of the essay.
+    :type topic: str
+    :param essay: The content of the essay.
+    :type essay: str
+    :param user_id: The ID of the author of the essay.
+    :type user_id: int
+    :param charged: Whether a credit was charged for the grading, which is refunded if it fails.
+    :type charged: bool
+    :return: The queued job.
+    :rtype: EssayJob
+    """
+    job = EssayJob(topic, essay, user_id, charged)
+    job.save()
+    submit(current_app._get_current_object(), job.id, get_llm_client())
+    return job
+
+
+def submit(app: Flask, job_id: str, client: LLMClient) -> Future:
+    """
+    Submit a queued job to the grading workers.
+
+    :param app: The app the job runs in.
+    :type app: Flask
+    :param job_id: The ID of the job.
+    :type job_id: str
+    :param client: The LLM client grading the essay.
+    :type client: LLMClient
+    :return: The future of the job.
+    :rtype: Future
+    """
+    return get_executor(app).submit(run_job, app, job_id, client)
+
+
+def claim(job_id: str) -> bool:
+    """
+    Mark a queued job as running, so a job submitted twice is only graded once.
+
+    :param job_id: The ID of the job.
+    :type job_id: str
+    :return: Whether the job was queued and is now claimed by the caller.
+    :rtype: bool
+    """
+    result = db.session.execute(
+        update(EssayJob)
+        .where(EssayJob.id == job_id, EssayJob.status == EssayJobStatus.QUEUED)
+        .values(status=EssayJobStatus.RUNNING, date_updated=datetime.datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_job(app: Flask, job_id: str, client: LLMClient):
+    """
+    Grade the essay of a job outside the request cycle, then push the finished job to its author.
+
+    :param app: The app the job runs in.
+    :type app: Flask
+    :param job_id: The ID of the job.
+    :type job_id: str
+    :param client: The LLM client grading the essay.
+    :type client: LLMClient
+    """
+    with app.app_context():
+        if not claim(job_id):
+            return
+
+        job = EssayJob.get_by_id(job_id)
+        try:
+            essay = services.grade_essay(job.topic, job.essay, job.user_id, client)
+        except Exception:
+            app.logger.exception('Could not grade essay of job %s', job_id)
+            db.session.rollback()
+            job.status = EssayJobStatus.FAILED
+            job.error = FAILED_ERROR
+            if job.charged:
+                db.session.execute(
+                    update(User).where(User.id == job.user_id).values(credits=User.credits + 1),
+                    execution_options={'synchronize_session': False}
+                )
+        else:
+            job.status = EssayJobStatus.DONE
+            job.essay_id = essay.id
+        db.session.commit()
+
+        socketio.emit('essay_graded', job.serialized, room=job.user_id, namespace=NAMESPACE)
+
+
+def recover(app: Flask, client: LLMClient, timeout: int) -> Tuple[int, int]:
+    """
+    Recover the jobs lost by grading workers which stopped, such as on a restart.
+    Queued jobs are submitted again, and running jobs not updated within the timeout are failed and their
+    credit refunded. Jobs still queued in a live worker are only graded once, as workers claim jobs first.
+
+    :param app: The app the jobs run in.
+    :type app: Flask
+    :param client: The LLM client grading the essays.
+    :type client: LLMClient
+    :param timeout: The number of seconds after which a running job is considered lost.
+    :type timeout: int
+    :return: The number of jobs submitted again, and the number of jobs failed.
+    :rtype: Tuple[int, int]
+    """
+    now = datetime.datetime.utcnow()
+    stale_jobs = db.session.execute(
+        select(EssayJob.id, EssayJob.user_id, EssayJob.charged)
+        .where(EssayJob.status == EssayJobStatus.RUNNING, EssayJob.date_updated < now - datetime.timedelta(seconds=timeout))
+    ).all()
+
+    failed_ids = []
+    for job_id, user_id, charged in stale_jobs:
+        # Failed conditionally, so a job finishing meanwhile is neither failed nor refunded
+        result = db.session.execute(
+            update(EssayJob)
+            .where(EssayJob.id == job_id, EssayJob.status == EssayJobStatus.RUNNING)
+            .values(status=EssayJobStatus.FAILED, error=FAILED_ERROR, date_updated=now),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount != 1:
+            continue
+        if charged:
+            db.session.execute(
+                update(User).where(User.id == user_id).values(credits=User.credits + 1),
+                execution_options={'synchronize_session': False}
+            )
+        failed_ids.append(job_id)
+    db.session.commit()
+
+    for job_id in failed_ids:
+        job = EssayJob.get_by_id(job_id)
+        socketio.emit('essay_graded', job.serialized, room=job.user_id, namespace=NAMESPACE)
+
+    queued_ids = db.session.execute(select(EssayJob.id).where(EssayJob.status == EssayJobStatus.QUEUED)).scalars().all()
+    for job_id in queued_ids:
+        submit(app, job_id, client)
+
+    return len(queued_ids), len(failed_ids)
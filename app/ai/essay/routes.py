@@ -1,9 +1,11 @@
 import bleach
 from flask import render_template, redirect, url_for
 from flask_login import current_user, login_required
+from flask_socketio import join_room
 
+from app import socketio
 from app.ai import ai_blueprint
-from app.ai.essay import services
+from app.ai.essay import jobs
 from app.ai.essay.forms import GradeEssayForm
 from app.exceptions import Forbidden
 from app.models import Essay
@@ -23,9 +25,9 @@ def grade_essay():
         title = bleach.clean(form.title.data)
         content = bleach.clean(form.content.data)
 
-        essay = services.grade_essay(title, content, current_user.id)
+        job = jobs.enqueue(title, content, current_user.id, charged=True)
 
-        return redirect(url_for('ai.view_essay', essay_id=essay.id))
+        return redirect(url_for('ai.grade_essay', job=job.id))
 
     return render_template('essay_home.html', form=form)
 
@@ -34,3 +36,14 @@ def grade_essay():
 def view_essay(essay_id: int):
     Essay.query.filter_by(id=essay_id).first_or_404()
     return render_template('essay.html')
+
+
+@socketio.on('connect', namespace=jobs.NAMESPACE)
+@login_required
+def handle_connect():
+    """
+    Handle the user connection event.
+
+    Join a room based on the user's ID, where the essay_graded event of the user's jobs is emitted.
+    """
+    join_room(current_user.id)
@@ -1,8 +1,13 @@
 import json
+from typing import List, Tuple, Union
 
-import openai
+from sqlalchemy import insert
+from sqlalchemy.orm import defer, selectinload
 
+from app import db
+from app.ai.llm import LLMClient, get_llm_client
 from app.models import Essay, EssayGrade, EssaySuggestion
+from app.shared.pagination import keyset_page
 
 ESSAY_PROMPT = """
 You are a diligent and harsh teacher who knows all about scoring essays. Your goal is to provide accurate and reliable feedback on the essay's quality. Please follow these instructions carefully:
@@ -38,15 +43,63 @@ Excellent: Exemplary vocabulary, insightful explanations, engaging.
 """
 
 
-def grade_essay(topic: str, essay: str, user_id: int):
+def grade_essay(topic: str, essay: str, user_id: int, client: LLMClient = None) -> Essay:
+    """
+    Grade an essay and save it with its suggestions.
+
+    :param topic: The topic of the essay.
+    :type topic: str
+    :param essay: The content of the essay.
+    :type essay: str
+    :param user_id: The ID of the author of the essay.
+    :type user_id: int
+    :param client: The LLM client grading the essay, the client of the app by default.
+    :type client: LLMClient
+    :return: The graded essay.
+    :rtype: Essay
+    """
+    client = client or get_llm_client()
     prompt = f"{ESSAY_PROMPT} \nEssay Topic: {topic} \nEssay Content: {essay}"
-    response = openai.ChatCompletion.create(model='gpt-3.5-turbo', messages=[{"role": "system", "content": prompt}])
-    graded = json.loads(response.choices[0].message.content.replace("\n", ""))
+    content = client.complete([{"role": "system", "content": prompt}])
+    graded = json.loads(content.replace("\n", ""))
 
     essay = Essay(topic, essay, graded['comment'], EssayGrade(graded['grade'].lower()), user_id)
-    essay.save()
+    db.session.add(essay)
+    db.session.flush()
 
-    for suggestion in graded['suggestions']:
-        EssaySuggestion(suggestion['area'], suggestion['problem'], suggestion['solution'], essay.id).save()
+    # Insert every suggestion with a single statement, in the same transaction as the essay
+    suggestions = [{
+        'area': suggestion['area'],
+        'problem': suggestion['problem'],
+        'solution': suggestion['solution'],
+        'essay_id': essay.id
+    } for suggestion in graded['suggestions']]
+    if suggestions:
+        db.session.execute(insert(EssaySuggestion), suggestions)
+    db.session.commit()
 
     return essay
+
+
+def get_user_essays_page(user_id: int, cursor: Union[str, None], limit: int,
+                         summary: bool = False) -> Tuple[List[Essay], Union[str, None]]:
+    """
+    Get a page of the essays of a user, most recent first.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of essays to return.
+    :type limit: int
+    :param summary: Whether to skip loading the content and suggestions of the essays.
+    :type summary: bool
+    :return: The essays of the page and the cursor of the next page, or None if there are no more.
+    :rtype: Tuple[List[Essay], str | None]
+    """
+    query = Essay.query.filter(Essay.user_id == user_id)
+    if summary:
+        query = query.options(defer(Essay.essay))
+    else:
+        query = query.options(selectinload(Essay.suggestions))
+    return keyset_page(query, Essay.timestamp, Essay.id, cursor, limit)
@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import openai
+import openai.error
+import requests
+from flask import current_app
+
+# Errors after which the same request may succeed if it is sent again
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: tokens are added at a constant rate up to a capacity,
+    and every request takes one, waiting for it if the bucket is empty.
+    """
+
+    def __init__(self, rate: float, capacity: int, timer: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        :param rate: The number of tokens added per second.
+        :type rate: float
+        :param capacity: The maximum number of tokens, which is the largest burst of requests allowed.
+        :type capacity: int
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.timer = timer
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated = timer()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.timer()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class Gateway:
+    """
+    Gateway to the OpenAI API shared by the AI features of a process.
+
+    Requests share a pooled HTTP session and go through a token bucket rate limit and a cap on the number
+    of requests in flight. Requests failing with a retryable error are retried with exponential backoff.
+    Embedding requests of concurrent callers arriving within a short window are sent as a single request.
+    """
+
+    def __init__(self, requests_per_minute: int = 3000, max_concurrency: int = 16, max_retries: int = 3,
+                 timeout: float = 60, backoff: float = 0.5, batch_window: float = 0.01,
+                 max_batch_size: int = 100, api_base: str = None, sleep: Callable[[float], None] = time.sleep):
+        self.bucket = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute // 60), sleep=sleep)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.api_base = api_base
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._batch_lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[List[str], Future]]] = {}
+
+    @classmethod
+    def from_config(cls, config) -> 'Gateway':
+        return cls(requests_per_minute=config['AI_REQUESTS_PER_MINUTE'],
+                   max_concurrency=config['AI_MAX_CONCURRENCY'],
+                   max_retries=config['AI_MAX_RETRIES'],
+                   timeout=config['AI_REQUEST_TIMEOUT'],
+                   api_base=config['OPENAI_API_BASE'])
+
+    def _options(self, options: dict) -> dict:
+        options.setdefault('request_timeout', self.timeout)
+        if self.api_base:
+            options.setdefault('api_base', self.api_base)
+        return options
+
+    def _send(self, create: Callable, **options):
+        # The openai module sends every request with the session set here
+        openai.requestssession = self.session
+        self.bucket.acquire()
+        return create(**self._options(options))
+
+    def request(self, create: Callable, **options):
+        """
+        Send a request to the API, retrying it with exponential backoff after a retryable error.
+
+        :param create: The create method of an API resource, such as openai.ChatCompletion.create.
+        :type create: Callable
+        :param options: The arguments of the request.
+        :return: The response of the API.
+        :raises openai.error.OpenAIError: If the request failed and cannot or can no longer be retried.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.semaphore:
+                    return self._send(create, **options)
+            except openai.error.OpenAIError as e:
+                if not self._retryable(e, attempt):
+                    raise
+            self.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def _retryable(self, error: openai.error.OpenAIError, attempt: int) -> bool:
+        if attempt == self.max_retries:
+            return False
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        # Server errors are retried, client errors would fail again
+        return isinstance(error, openai.error.APIError) and (error.http_status or 500) >= 500
+
+    def chat(self, messages: List[Dict[str, str]], model: str, **options) -> str:
+        """
+        Complete a chat.
+
+        :return: The content of the reply.
+        :rtype: str
+        """
+        response = self.request(openai.ChatCompletion.create, messages=messages, model=model, **options)
+        return response.choices[0].message.content
+
+    def chat_stream(self, messages: List[Dict[str, str]], model: str, **options) -> Iterator[str]:
+        """
+        Complete a chat, yielding the reply as it is generated.
+        Only opening the stream is retried, and the stream holds a concurrency slot until it is consumed.
+
+        :return: The successive fragments of the reply.
+        :rtype: Iterator[str]
+        """
+        for attempt in range(self.max_retries + 1):
+            # The slot is only held while a request is in flight, not while backing off
+            self.semaphore.acquire()
+            try:
+                chunks = self._send(openai.ChatCompletion.create, messages=messages, model=model,
+                                    stream=True, **options)
+                break
+            except BaseException as e:
+                self.semaphore.release()
+                if not isinstance(e, openai.error.OpenAIError) or not self._retryable(e, attempt):
+                    raise
+            self.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+        try:
+            for chunk in chunks:
+                content = chunk.choices[0].delta.get('content')
+                if content:
+                    yield content
+        finally:
+            self.semaphore.release()
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        """
+        Embed texts. The texts of concurrent callers are embedded together, in requests of up to
+        max_batch_size texts: the first caller waits batch_window seconds for others to join and sends the batch.
+
+        :param texts: The texts to embed.
+        :type texts: List[str]
+        :param model: The name of the embedding model.
+        :type model: str
+        :return: The embedding of every text, in the same order.
+        :rtype: List[List[float]]
+        """
+        future = Future()
+        with self._batch_lock:
+            leader = model not in self._pending
+            self._pending.setdefault(model, []).append((texts, future))
+
+        if leader:
+            self.sleep(self.batch_window)
+            with self._batch_lock:
+                batch = self._pending.pop(model)
+            self._send_batch(batch, model)
+
+        return future.result()
+
+    def _send_batch(self, batch: List[Tuple[List[str], Future]], model: str):
+        inputs = [text for texts, _ in batch for text in texts]
+        try:
+            embeddings = []
+            for i in range(0, len(inputs), self.max_batch_size):
+                response = self.request(openai.Embedding.create, input=inputs[i:i + self.max_batch_size], model=model)
+                embeddings.extend(item['embedding'] for item in sorted(response['data'], key=lambda item: item['index']))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for texts, future in batch:
+            future.set_result(embeddings[start:start + len(texts)])
+            start += len(texts)
+
+
+def get_gateway() -> Gateway:
+    """
+    Get the gateway of the app, configured by the AI_* settings.
+
+    :return: The gateway.
+    :rtype: Gateway
+    """
+    if 'ai_gateway' not in current_app.extensions:
+        current_app.extensions['ai_gateway'] = Gateway.from_config(current_app.config)
+    return current_app.extensions['ai_gateway']
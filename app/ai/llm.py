@@ -0,0 +1,70 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List
+
+from flask import current_app
+
+from app.ai.gateway import Gateway, get_gateway
+
+GENERATIVE_MODEL = "gpt-3.5-turbo"
+
+
+class LLMClient(ABC):
+    """
+    Client of a chat completion model.
+    """
+
+    @abstractmethod
+    def complete(self, messages: List[Dict[str, str]], model: str = GENERATIVE_MODEL, **options) -> str:
+        """
+        Complete a chat.
+
+        :param messages: The messages of the chat, each with a role and content.
+        :type messages: List[Dict[str, str]]
+        :param model: The name of the model.
+        :type model: str
+        :param options: Extra options of the model, such as max_tokens or temperature.
+        :return: The content of the reply.
+        :rtype: str
+        """
+
+    def stream(self, messages: List[Dict[str, str]], model: str = GENERATIVE_MODEL, **options) -> Iterator[str]:
+        """
+        Complete a chat, yielding the reply as it is generated.
+        Clients which cannot stream yield the whole reply at once.
+
+        :param messages: The messages of the chat, each with a role and content.
+        :type messages: List[Dict[str, str]]
+        :param model: The name of the model.
+        :type model: str
+        :param options: Extra options of the model, such as max_tokens or temperature.
+        :return: The successive fragments of the reply.
+        :rtype: Iterator[str]
+        """
+        yield self.complete(messages, model, **options)
+
+
+class OpenAIClient(LLMClient):
+    """
+    Client of the OpenAI chat completion API, sending its requests through the gateway.
+    """
+
+    def __init__(self, gateway: Gateway):
+        self.gateway = gateway
+
+    def complete(self, messages: List[Dict[str, str]], model: str = GENERATIVE_MODEL, **options) -> str:
+        return self.gateway.chat(messages, model, **options)
+
+    def stream(self, messages: List[Dict[str, str]], model: str = GENERATIVE_MODEL, **options) -> Iterator[str]:
+        return self.gateway.chat_stream(messages, model, **options)
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Get the LLM client of the app. Tests replace it by setting app.extensions['llm_client'].
+
+    :return: The LLM client.
+    :rtype: LLMClient
+    """
+    if 'llm_client' not in current_app.extensions:
+        current_app.extensions['llm_client'] = OpenAIClient(get_gateway())
+    return current_app.extensions['llm_client']
@@ -1,5 +1,7 @@
+import json
+
 import bleach
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask_login import current_user
 
 from app.ai import ai_api_blueprint
@@ -10,10 +12,39 @@ from app.exceptions import Forbidden
 @ai_api_blueprint.route('/qna/answer', methods=['POST'])
 def answer_question():
     if current_user.credits <= 0:
-        return Forbidden(message='User does not have enough credits left')
-    current_user.credits -= 1
-    current_user.save()
+        raise Forbidden(message='User does not have enough credits left')
+
+    question = bleach.clean(request.json.get('question'))
+    answer, cached = services.answer(question)
+
+    # Answers served from the cache cost nothing, so they are free for the user too
+    if not cached:
+        current_user.credits -= 1
+        current_user.save()
+    return jsonify({'answer': answer, 'cached': cached}), 200
+
+
+@ai_api_blueprint.route('/qna/answer/stream', methods=['POST'])
+def stream_answer_question() -> Response:
+    """
+    Answer a question as server-sent events: the retrieved sources first, then the answer as it is generated.
+    See services.stream_answer for the events.
+
+    :return: A text/event-stream response.
+    :rtype: flask.Response
+    """
+    if current_user.credits <= 0:
+        raise Forbidden(message='User does not have enough credits left')
 
     question = bleach.clean(request.json.get('question'))
-    answer = services.answer(question)
-    return jsonify({'answer': answer}), 200
+
+    def generate():
+        for event, data in services.stream_answer(question):
+            if event == 'done' and not data['cached']:
+                current_user.credits -= 1
+                current_user.save()
+            yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+    # Proxies must not buffer the response, or the events would only arrive once the answer is complete
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,403 @@
+import datetime
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.ai.qna.embedders import Embedder
+from app.models import QnaAnswer, QnaCacheMetric, QnaEmbedding
+
+EMBEDDING_CACHE_SIZE = 10000
+ANSWER_CACHE_SIZE = 2000
+CACHE_TTL = datetime.timedelta(days=30)
+# Cosine similarity above which two questions are considered the same question
+ANSWER_SIMILARITY_THRESHOLD = 0.97
+
+# Share of the cache size evicted beyond it, so a full table is only counted again after that many insertions
+EVICTION_SLACK = 0.1
+
+METRICS = ('embedding_hits', 'embedding_misses', 'answer_hits', 'answer_misses')
+# Seconds between two writes of the metrics counted in process to the database
+METRICS_FLUSH_INTERVAL = 10
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalise a question so that questions differing only in case, spacing and punctuation are equal.
+
+    :param question: The question.
+    :type question: str
+    :return: The normalised question.
+    :rtype: str
+    """
+    return ' '.join(re.findall(r'\w+', question.lower()))
+
+
+def _is_expired(date_created: datetime.datetime) -> bool:
+    return date_created < datetime.datetime.utcnow() - CACHE_TTL
+
+
+def _to_bytes(embedding) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def _unit(embedding) -> np.ndarray:
+    embedding = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+class MetricsBuffer:
+    """
+    In-process increments of the cache metrics, added to the database counters at most every
+    METRICS_FLUSH_INTERVAL seconds instead of updating the same rows on every question.
+    Increments of a worker which stops before its next flush are lost.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = Counter()
+        self.last_flush = time.monotonic()
+
+    def add(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def take(self, force: bool = False) -> Dict[str, int]:
+        """
+        Take the increments to write, if the flush interval elapsed.
+
+        :param force: Whether to take the increments even if the flush interval did not elapse.
+        :type force: bool
+        :return: The increment of every counter, empty if there is nothing to write.
+        :rtype: Dict[str, int]
+        """
+        with self.lock:
+            if not force and time.monotonic() - self.last_flush < METRICS_FLUSH_INTERVAL:
+                return {}
+            counts, self.counts = self.counts, Counter()
+            self.last_flush = time.monotonic()
+            return counts
+
+    def restore(self, counts: Dict[str, int]):
+        with self.lock:
+            self.counts.update(counts)
+
+
+_metrics = MetricsBuffer()
+
+
+def record(name: str):
+    """
+    Increment a cache counter. The increment is written to the database with the next flush of the metrics.
+
+    :param name: The name of the counter, one of METRICS.
+    :type name: str
+    """
+    _metrics.add(name)
+
+
+@contextmanager
+def _session() -> Iterator[Session]:
+    """
+    Open a session of the cache's own, so committing or rolling back a cache write never touches
+    the pending changes of the request's session.
+    """
+    session = db.session.session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _commit(session: Session):
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another worker inserted the same entry concurrently, the cache can do without this write
+        session.rollback()
+
+
+def flush_metrics(force: bool = False):
+    """
+    Add the increments counted by this process to the database counters, if the flush interval elapsed.
+
+    :param force: Whether to write the increments even if the flush interval did not elapse.
+    :type force: bool
+    """
+    counts = _metrics.take(force)
+    if not counts:
+        return
+
+    with _session() as session:
+        for name, count in counts.items():
+            result = session.execute(
+                update(QnaCacheMetric).where(QnaCacheMetric.name == name).values(value=QnaCacheMetric.value + count),
+                execution_options={'synchronize_session': False}
+            )
+            if result.rowcount == 0:
+                session.add(QnaCacheMetric(name=name, value=count))
+
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another worker inserted the same counter concurrently, so the increments are written with the next flush
+            session.rollback()
+            _metrics.restore(counts)
+
+
+def stats() -> Dict[str, Dict[str, Union[int, float]]]:
+    """
+    Report the hits, misses and hit rate of both cache levels.
+
+    :return: The metrics of the embedding and answer caches.
+    :rtype: Dict[str, Dict[str, int | float]]
+    """
+    # Increments of other workers are only included once they flush them
+    flush_metrics(force=True)
+    with _session() as session:
+        values = dict(session.execute(select(QnaCacheMetric.name, QnaCacheMetric.value)).all())
+    report = {}
+    for level in ('embedding', 'answer'):
+        hits, misses = values.get(f'{level}_hits', 0), values.get(f'{level}_misses', 0)
+        report[level] = {'hits': hits, 'misses': misses, 'hitRate': hits / (hits + misses) if hits + misses else 0.0}
+    return report
+
+
+# Approximate number of rows of every cache table, counting the rows inserted by this process
+_table_sizes: Dict[str, int] = {}
+
+
+def _evict(session: Session, model, size: int):
+    """
+    Delete the least recently used entries of a cache table once it grows beyond its size, after a row was inserted.
+    The table is only counted when its approximate size crosses the cache size, and is then shrunk
+    EVICTION_SLACK below the cache size, so it is not counted again on every insertion.
+    """
+    name = model.__tablename__
+    estimate = _table_sizes.get(name)
+    if estimate is not None and estimate < size:
+        _table_sizes[name] = estimate + 1
+        return
+
+    count = session.scalar(select(func.count()).select_from(model))
+    if count > size:
+        # MySQL cannot delete from a table using a LIMIT subquery on the same table, so select the keys first
+        primary_key = model.__mapper__.primary_key[0]
+        limit = count - size + int(size * EVICTION_SLACK)
+        oldest = session.scalars(select(primary_key).order_by(model.last_used).limit(limit)).all()
+        session.execute(delete(model).where(primary_key.in_(oldest)), execution_options={'synchronize_session': False})
+        count -= len(oldest)
+    _table_sizes[name] = count
+
+
+def get_embedding(question: str, embedder: Embedder) -> np.ndarray:
+    """
+    Get the embedding of a question, only calling the embedder if the normalised question is not cached.
+
+    :param question: The question.
+    :type question: str
+    :param embedder: The embedder of the question.
+    :type embedder: Embedder
+    :return: The embedding of the question.
+    :rtype: np.ndarray
+    """
+    key = hashlib.sha256(f'{embedder.name}\n{normalize_question(question)}'.encode()).hexdigest()
+    with _session() as session:
+        entry = session.get(QnaEmbedding, key)
+        if entry is not None and not _is_expired(entry.date_created):
+            entry.last_used = datetime.datetime.utcnow()
+            embedding = _from_bytes(entry.embedding)
+            _commit(session)
+            record('embedding_hits')
+            flush_metrics()
+            return embedding
+
+    # The embedder is called without holding a connection of the cache
+    embedding = np.asarray(embedder.embed([question])[0], dtype=np.float32)
+    record('embedding_misses')
+    with _session() as session:
+        entry = session.get(QnaEmbedding, key)
+        if entry is None:
+            entry = QnaEmbedding(key=key)
+            session.add(entry)
+        entry.embedding = _to_bytes(embedding)
+        entry.date_created = entry.last_used = datetime.datetime.utcnow()
+        session.flush()
+        _evict(session, QnaEmbedding, EMBEDDING_CACHE_SIZE)
+        _commit(session)
+    flush_metrics()
+    return embedding
+
+
+class AnswerIndex:
+    """
+    In-process matrix of the unit-normalised embeddings of the cached answers, used to find the cached
+    answer of the most similar question. It is synced incrementally with the rows added by any worker,
+    and every candidate is checked against its row so evicted or replaced answers are never served.
+    Rows are appended to a preallocated buffer, and answers evicted or expired meanwhile are dropped
+    once the index holds more answers than the cache, so its size follows ANSWER_CACHE_SIZE.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.embedder = None
+        self.ids = []
+        self.buffer = None
+        self.max_id = 0
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.buffer[:len(self.ids)]
+
+    def append(self, ids: List[int], embeddings: np.ndarray):
+        size = len(self.ids) + len(ids)
+        if self.buffer is None or size > len(self.buffer):
+            # The buffer grows geometrically, so every row is only copied a few times on average
+            buffer = np.empty((max(size, 2 * len(self.ids), 64), embeddings.shape[1]), dtype=np.float32)
+            if self.buffer is not None:
+                buffer[:len(self.ids)] = self.matrix
+            self.buffer = buffer
+        self.buffer[len(self.ids):size] = embeddings
+        self.ids.extend(ids)
+
+    def keep(self, mask: np.ndarray):
+        kept = int(mask.sum())
+        self.buffer[:kept] = self.matrix[mask]
+        self.ids = [row_id for row_id, keep in zip(self.ids, mask) if keep]
+
+    def remove(self, position: int):
+        mask = np.ones(len(self.ids), dtype=bool)
+        mask[position] = False
+        self.keep(mask)
+
+    def prune(self, session: Session):
+        """
+        Drop the answers which were evicted or expired since they were indexed.
+        """
+        live = set(session.scalars(
+            select(QnaAnswer.id)
+            .where(QnaAnswer.embedder == self.embedder, QnaAnswer.date_created >= datetime.datetime.utcnow() - CACHE_TTL)
+        ))
+        self.keep(np.array([row_id in live for row_id in self.ids], dtype=bool))
+
+    def sync(self, session: Session, embedder_name: str):
+        if embedder_name != self.embedder:
+            self.reset()
+            self.embedder = embedder_name
+
+        rows = session.execute(
+            select(QnaAnswer.id, QnaAnswer.embedding)
+            .where(QnaAnswer.id > self.max_id, QnaAnswer.embedder == embedder_name)
+            .order_by(QnaAnswer.id)
+        ).all()
+        if rows:
+            self.append([row_id for row_id, _ in rows], np.stack([_unit(_from_bytes(embedding)) for _, embedding in rows]))
+            self.max_id = rows[-1][0]
+
+        if len(self.ids) > ANSWER_CACHE_SIZE + max(1, int(ANSWER_CACHE_SIZE * EVICTION_SLACK)):
+            self.prune(session)
+
+    def find(self, session: Session, embedding: np.ndarray, embedder_name: str) -> Union[QnaAnswer, None]:
+        """
+        Find the cached answer of the most similar question above the similarity threshold.
+
+        :param session: The session of the cache.
+        :type session: Session
+        :param embedding: The embedding of the question.
+        :type embedding: np.ndarray
+        :param embedder_name: The name of the embedder of the question.
+        :type embedder_name: str
+        :return: The cached answer, or None.
+        :rtype: QnaAnswer | None
+        """
+        query = _unit(embedding)
+        with self.lock:
+            self.sync(session, embedder_name)
+
+            while self.ids:
+                scores = self.matrix @ query
+                position = int(np.argmax(scores))
+                if scores[position] < ANSWER_SIMILARITY_THRESHOLD:
+                    return None
+
+                entry = session.get(QnaAnswer, self.ids[position])
+                if entry is not None and float(_unit(_from_bytes(entry.embedding)) @ query) < ANSWER_SIMILARITY_THRESHOLD:
+                    # The table was recreated and the ID now belongs to another answer
+                    self.reset()
+                    self.sync(session, embedder_name)
+                    continue
+                if entry is None or _is_expired(entry.date_created):
+                    self.remove(position)
+                    continue
+                return entry
+
+        return None
+
+
+_answer_index = AnswerIndex()
+
+
+def find_answer(embedding: np.ndarray, embedder_name: str) -> Union[str, None]:
+    """
+    Find the cached answer of a question similar enough to the given one.
+
+    :param embedding: The embedding of the question.
+    :type embedding: np.ndarray
+    :param embedder_name: The name of the embedder of the question.
+    :type embedder_name: str
+    :return: The cached answer, or None on a cache miss.
+    :rtype: str | None
+    """
+    with _session() as session:
+        entry = _answer_index.find(session, embedding, embedder_name)
+        if entry is None:
+            answer = None
+            record('answer_misses')
+        else:
+            answer = entry.answer
+            entry.hits += 1
+            entry.last_used = datetime.datetime.utcnow()
+            _commit(session)
+            record('answer_hits')
+    flush_metrics()
+    return answer
+
+
+def store_answer(question: str, embedding: np.ndarray, embedder_name: str, answer: str):
+    """
+    Cache the answer to a question, evicting the least recently used answers beyond the cache size.
+
+    :param question: The question.
+    :type question: str
+    :param embedding: The embedding of the question.
+    :type embedding: np.ndarray
+    :param embedder_name: The name of the embedder of the question.
+    :type embedder_name: str
+    :param answer: The answer to the question.
+    :type answer: str
+    """
+    with _session() as session:
+        session.add(QnaAnswer(embedder=embedder_name, question=question, embedding=_to_bytes(embedding), answer=answer))
+        session.flush()
+        _evict(session, QnaAnswer, ANSWER_CACHE_SIZE)
+        _commit(session)
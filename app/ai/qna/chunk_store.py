@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Tuple, Union
+
+# Name of the chunk store written next to the local index by ingestion
+CHUNK_STORE_FILE = 'chunks.sqlite'
+
+
+class ChunkStore:
+    """
+    Read-only store of the text of the QnA source chunks, kept in an SQLite file.
+
+    Chunks are looked up by their primary key, so a question only reads the few chunks it needs
+    instead of parsing every chunk. The file is opened read-only and its pages live in the
+    operating system's file cache, which is shared by every gunicorn worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads, so every thread opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._local.connection = connection
+        return connection
+
+    def get(self, chunk_id: str) -> Union[str, None]:
+        """
+        Get the text of a chunk.
+
+        :param chunk_id: The ID of the chunk.
+        :type chunk_id: str
+        :return: The text of the chunk, or None if there is no such chunk.
+        :rtype: str | None
+        """
+        row = self.connection.execute('SELECT text FROM chunks WHERE id = ?', (chunk_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """
+        Get the text of several chunks with a single lookup.
+
+        :param chunk_ids: The IDs of the chunks.
+        :type chunk_ids: List[str]
+        :return: The text of every chunk found by chunk ID.
+        :rtype: Dict[str, str]
+        """
+        if not chunk_ids:
+            return {}
+
+        placeholders = ', '.join('?' * len(chunk_ids))
+        rows = self.connection.execute(f'SELECT id, text FROM chunks WHERE id IN ({placeholders})', list(chunk_ids))
+        return dict(rows)
+
+    @staticmethod
+    def build(path: str, chunks: Iterable[Tuple[str, str]], source_hash: str = None):
+        """
+        Write a chunk store. The store is written to a temporary file which then replaces the
+        previous store, so readers never see a partially written store.
+
+        :param path: The path of the store.
+        :type path: str
+        :param chunks: The ID and text of every chunk.
+        :type chunks: Iterable[Tuple[str, str]]
+        :param source_hash: The SHA-256 of the mapping the chunks were read from, if any.
+        :type source_hash: str
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.sqlite')
+        os.close(fd)
+
+        try:
+            connection = sqlite3.connect(temp_path)
+            with connection:
+                connection.execute('CREATE TABLE chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL) WITHOUT ROWID')
+                connection.executemany('INSERT INTO chunks (id, text) VALUES (?, ?)', chunks)
+                if source_hash:
+                    connection.execute('CREATE TABLE source (hash TEXT NOT NULL)')
+                    connection.execute('INSERT INTO source (hash) VALUES (?)', (source_hash,))
+            connection.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def source_hash(path: str) -> Union[str, None]:
+        """
+        Get the SHA-256 of the mapping a store was built from.
+
+        :param path: The path of the store.
+        :type path: str
+        :return: The hash, or None if the store is missing or was not built from a mapping.
+        :rtype: str | None
+        """
+        if not os.path.exists(path):
+            return None
+
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            row = connection.execute('SELECT hash FROM source').fetchone()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    @classmethod
+    def from_json(cls, path: str, json_path: str) -> 'ChunkStore':
+        """
+        Open a chunk store, building it first from a JSON mapping of chunk IDs to text if the store
+        is missing or was built from other contents of the mapping. The contents are compared by
+        hash rather than by modification time, which a checkout or a deploy changes on its own.
+
+        :param path: The path of the store.
+        :type path: str
+        :param json_path: The path of the JSON mapping.
+        :type json_path: str
+        :return: The chunk store.
+        :rtype: ChunkStore
+        """
+        with open(json_path, 'rb') as fp:
+            data = fp.read()
+
+        source_hash = hashlib.sha256(data).hexdigest()
+        if cls.source_hash(path) != source_hash:
+            cls.build(path, json.loads(data).items(), source_hash)
+        return cls(path)
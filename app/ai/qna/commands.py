@@ -0,0 +1,32 @@
+import click
+from flask import current_app
+
+from app.ai import ai_api_blueprint
+from app.ai.qna import cache, ingest as ingestion
+from app.ai.qna.embedders import create_embedder
+
+
+@ai_api_blueprint.cli.command('ingest')
+def ingest():
+    """
+    Chunk the QnA source documents, embed the new or changed chunks and rebuild the local index with its chunk store.
+    """
+    # Ingestion renumbers the chunks, which would no longer match the IDs of the hosted Pinecone index
+    if current_app.config['QNA_RETRIEVER'] != 'local':
+        raise click.ClickException('Ingestion rebuilds the local index, set QNA_RETRIEVER to local first')
+
+    result = ingestion.ingest(
+        current_app.config['QNA_SOURCE_DIR'],
+        current_app.config['QNA_INDEX_DIR'],
+        create_embedder(current_app.config['QNA_EMBEDDER'])
+    )
+    click.echo(f'Ingested {result.chunks} chunks, embedded {result.embedded} and reused {result.reused}')
+
+
+@ai_api_blueprint.cli.command('cache-stats')
+def cache_stats():
+    """
+    Report the hit rate of the QnA question embedding and answer caches.
+    """
+    for level, metrics in cache.stats().items():
+        click.echo(f'{level}: {metrics["hits"]} hits, {metrics["misses"]} misses, {metrics["hitRate"]:.1%} hit rate')
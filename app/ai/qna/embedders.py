@@ -0,0 +1,78 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from app.ai.gateway import Gateway, get_gateway
+
+EMBEDDINGS_MODEL = "text-embedding-ada-002"
+
+
+class Embedder(ABC):
+    """
+    Turns texts into embedding vectors.
+    """
+
+    #: Identifies the embeddings produced, so embeddings of different embedders are never mixed
+    name: str
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts.
+
+        :param texts: The texts to embed.
+        :type texts: List[str]
+        :return: The embedding of every text, in the same order.
+        :rtype: List[List[float]]
+        """
+
+
+class OpenAIEmbedder(Embedder):
+    """
+    Embedder calling the OpenAI embeddings API through the gateway, which batches concurrent requests.
+    """
+
+    def __init__(self, gateway: Gateway, model: str = EMBEDDINGS_MODEL):
+        self.gateway = gateway
+        self.model = model
+        self.name = f'openai:{model}'
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.gateway.embed(texts, self.model)
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder which hashes every word of a text into a fixed number of buckets.
+    Texts sharing words get similar embeddings, which is enough to test retrieval without network access.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.name = f'hashing:{dimension}'
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                digest = hashlib.md5(word.encode()).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+                embeddings[row, bucket] += 1 if digest[4] & 1 else -1
+        return embeddings.tolist()
+
+
+def create_embedder(name: str) -> Embedder:
+    """
+    Create the embedder selected by the QNA_EMBEDDER setting.
+
+    :param name: 'openai' for the OpenAI embeddings API, or 'hashing' for the local stub.
+    :type name: str
+    :return: The embedder.
+    :rtype: Embedder
+    """
+    if name == 'hashing':
+        return HashingEmbedder()
+    return OpenAIEmbedder(get_gateway())
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+from app.ai.qna.chunk_store import CHUNK_STORE_FILE, ChunkStore
+from app.ai.qna.embedders import Embedder
+from app.ai.qna.retrievers import LocalRetriever
+
+CHUNK_SIZE = 150
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_WORKERS = 4
+MANIFEST_FILE = 'manifest.json'
+DOCUMENT_EXTENSIONS = ('.txt', '.pdf')
+
+
+class Chunk(NamedTuple):
+    id: str
+    text: str
+    hash: str
+
+
+class IngestResult(NamedTuple):
+    chunks: int
+    embedded: int
+    reused: int
+
+
+def read_document(path: str) -> str:
+    """
+    Extract the text of a source document.
+
+    :param path: The path of a .txt or .pdf document.
+    :type path: str
+    :return: The text of the document.
+    :rtype: str
+    """
+    if path.endswith('.pdf'):
+        from PyPDF2 import PdfReader
+        return '\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)
+
+    with open(path, 'r', encoding='utf-8') as fp:
+        return fp.read()
+
+
+def iter_documents(directory: str) -> Iterator[Tuple[str, str]]:
+    """
+    Read the source documents of a directory one at a time, in name order.
+
+    :param directory: The directory of the source documents.
+    :type directory: str
+    :return: The topic, which is the file name without extension, and the text of every document.
+    :rtype: Iterator[Tuple[str, str]]
+    """
+    for filename in sorted(os.listdir(directory)):
+        topic, extension = os.path.splitext(filename)
+        if extension in DOCUMENT_EXTENSIONS:
+            yield topic, read_document(os.path.join(directory, filename))
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Split a text into chunks of about size words, preferably ending at the end of a sentence.
+
+    :param text: The text to split.
+    :type text: str
+    :param size: The target number of words of a chunk.
+    :type size: int
+    :return: The chunks of the text.
+    :rtype: Iterator[str]
+    """
+    words = re.findall(r'\S+\s*', text)
+    i = 0
+    while i < len(words):
+        # Find the nearest end of sentence between 0.5 and 1.5 times the target size
+        j = min(i + int(1.5 * size), len(words))
+        while j > i + int(0.5 * size):
+            if words[j - 1].rstrip().endswith('.') or '\n' in words[j - 1]:
+                break
+            j -= 1
+        # If there is no end of sentence, cut at the target size
+        if j == i + int(0.5 * size):
+            j = min(i + size, len(words))
+        yield ''.join(words[i:j]).strip()
+        i = j
+
+
+def iter_chunks(directory: str) -> Iterator[Chunk]:
+    """
+    Stream the chunks of every source document of a directory.
+
+    :param directory: The directory of the source documents.
+    :type directory: str
+    :return: The chunks, identified by their topic and index within the document.
+    :rtype: Iterator[Chunk]
+    """
+    for topic, text in iter_documents(directory):
+        for i, chunk in enumerate(chunk_text(text)):
+            yield Chunk(f'{topic}/{i}', chunk, hashlib.sha256(chunk.encode()).hexdigest())
+
+
+def load_embeddings_by_hash(index_dir: str, embedder: Embedder) -> Dict[str, np.ndarray]:
+    """
+    Load the embeddings of the current index by the content hash of their chunk,
+    so unchanged chunks are not embedded again even if their position changed.
+    The embeddings are rows of the memory-mapped index, so they are not copied into memory.
+
+    :param index_dir: The directory of the index.
+    :type index_dir: str
+    :param embedder: The embedder of the new index. Embeddings of another embedder are not reused.
+    :type embedder: Embedder
+    :return: The embedding of every chunk hash.
+    :rtype: Dict[str, np.ndarray]
+    """
+    index_dir = os.path.realpath(index_dir)
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), 'r') as fp:
+            manifest = json.load(fp)
+        retriever = LocalRetriever.load(index_dir)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get('embedder') != embedder.name or len(manifest['hashes']) != len(retriever.chunk_ids):
+        return {}
+
+    return dict(zip(manifest['hashes'], retriever.embeddings))
+
+
+def embed_in_batches(embedder: Embedder, texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts in batches, sending the batches concurrently.
+
+    :param embedder: The embedder.
+    :type embedder: Embedder
+    :param texts: The texts to embed.
+    :type texts: List[str]
+    :return: The embedding of every text, in the same order.
+    :rtype: List[List[float]]
+    """
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+        return [embedding for batch in executor.map(embedder.embed, batches) for embedding in batch]
+
+
+def swap_directory(path: str, directory: str):
+    """
+    Atomically point path, a symbolic link, to a new directory and remove the directory it pointed to.
+    Readers resolve the link once, so they see either the previous or the new directory, never a mix.
+
+    :param path: The path of the link.
+    :type path: str
+    :param directory: The new directory, next to the link.
+    :type directory: str
+    """
+    previous = None
+    if os.path.islink(path):
+        previous = os.path.realpath(path)
+    elif os.path.isdir(path):
+        # A directory written before the link existed is moved aside once, which is not atomic
+        previous = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix=f'.{os.path.basename(path)}-')
+        os.replace(path, previous)
+
+    link = f'{directory}.link'
+    os.symlink(os.path.basename(directory), link)
+    os.replace(link, path)
+
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def ingest(source_dir: str, index_dir: str, embedder: Embedder) -> IngestResult:
+    """
+    Chunk the source documents and write the vector index along with the chunk store of its chunks.
+    Only chunks whose content changed since the last ingestion are embedded.
+
+    The documents are streamed into the new chunk store, so only the IDs and hashes of the chunks
+    and the text of the changed chunks are kept in memory. The embeddings, the chunk store and the
+    manifest are written to a new directory which replaces the previous one with an atomic rename of
+    the index_dir link, so the index and the text of its chunks always change together.
+
+    :param source_dir: The directory of the source documents.
+    :type source_dir: str
+    :param index_dir: The path of the local vector index, a link to the current index directory.
+    :type index_dir: str
+    :param embedder: The embedder of the chunks.
+    :type embedder: Embedder
+    :return: The number of chunks, of texts embedded, and of chunks whose embedding was reused.
+    :rtype: IngestResult
+    """
+    index_dir = os.path.abspath(index_dir)
+    os.makedirs(os.path.dirname(index_dir), exist_ok=True)
+
+    previous = load_embeddings_by_hash(index_dir, embedder)
+    chunk_ids, hashes = [], []
+    # Identical chunks share their content hash, so they are only embedded once
+    changed = {}
+
+    def record(chunks: Iterator[Chunk]) -> Iterator[Tuple[str, str]]:
+        for chunk in chunks:
+            chunk_ids.append(chunk.id)
+            hashes.append(chunk.hash)
+            if chunk.hash not in previous:
+                changed.setdefault(chunk.hash, chunk.text)
+            yield chunk.id, chunk.text
+
+    new_index_dir = tempfile.mkdtemp(dir=os.path.dirname(index_dir), prefix=f'.{os.path.basename(index_dir)}-')
+    try:
+        ChunkStore.build(os.path.join(new_index_dir, CHUNK_STORE_FILE), record(iter_chunks(source_dir)))
+
+        embeddings = dict(previous)
+        embeddings.update(zip(changed, embed_in_batches(embedder, list(changed.values()))))
+
+        LocalRetriever.from_embeddings(chunk_ids, [embeddings[chunk_hash] for chunk_hash in hashes]).save(new_index_dir)
+        with open(os.path.join(new_index_dir, MANIFEST_FILE), 'w') as fp:
+            json.dump({'embedder': embedder.name, 'hashes': hashes}, fp)
+    except BaseException:
+        shutil.rmtree(new_index_dir, ignore_errors=True)
+        raise
+
+    swap_directory(index_dir, new_index_dir)
+
+    return IngestResult(len(chunk_ids), len(changed), sum(chunk_hash in previous for chunk_hash in hashes))
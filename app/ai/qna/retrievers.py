@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Sequence
+
+import numpy as np
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+CHUNK_IDS_FILE = 'chunk-ids.json'
+
+
+class Match(NamedTuple):
+    """
+    A chunk of the source documents retrieved for a question.
+    """
+    id: str
+    score: float
+    topic: str
+
+
+def topic_of(chunk_id: str) -> str:
+    """
+    Get the topic of a chunk from its ID, which is the document name followed by the chunk index.
+
+    :param chunk_id: The ID of the chunk, e.g. Magnetism/3.
+    :type chunk_id: str
+    :return: The topic of the chunk, e.g. Magnetism.
+    :rtype: str
+    """
+    return chunk_id.rsplit('/', 1)[0]
+
+
+class Retriever(ABC):
+    """
+    Finds the chunks of the source documents most similar to a question embedding.
+    """
+
+    @abstractmethod
+    def query(self, embedding: Sequence[float], top_k: int) -> List[Match]:
+        """
+        Find the chunks most similar to an embedding.
+
+        :param embedding: The embedding of the question.
+        :type embedding: Sequence[float]
+        :param top_k: The maximum number of chunks to return.
+        :type top_k: int
+        :return: The matching chunks, most similar first, scored by cosine similarity.
+        :rtype: List[Match]
+        """
+
+
+class PineconeRetriever(Retriever):
+    """
+    Retriever backed by a hosted Pinecone index.
+    """
+
+    def __init__(self, index_name: str):
+        import pinecone
+        self.index = pinecone.Index(index_name)
+
+    def query(self, embedding: Sequence[float], top_k: int) -> List[Match]:
+        response = self.index.query(top_k=top_k, include_values=False, include_metadata=True, vector=list(embedding))
+        return [Match(match.id, match.score, match.metadata['topic']) for match in response.matches]
+
+
+class LocalRetriever(Retriever):
+    """
+    Retriever holding every chunk embedding in a NumPy matrix, searched by brute force.
+
+    Rows are normalised to unit length when the index is saved, so cosine similarity is a single
+    matrix-vector product. The matrix is memory-mapped when loaded, so gunicorn workers share
+    the pages of the operating system's file cache instead of each holding a copy.
+    """
+
+    def __init__(self, chunk_ids: List[str], embeddings: np.ndarray):
+        if len(chunk_ids) != len(embeddings):
+            raise ValueError('Every embedding needs exactly one chunk ID')
+        self.chunk_ids = chunk_ids
+        self.embeddings = embeddings
+
+    @staticmethod
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
+        """
+        Scale every row of a matrix to unit length, leaving zero rows untouched.
+
+        :param embeddings: The matrix of embeddings, one per row.
+        :type embeddings: np.ndarray
+        :return: The normalised float32 matrix.
+        :rtype: np.ndarray
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_embeddings(cls, chunk_ids: List[str], embeddings) -> 'LocalRetriever':
+        """
+        Build an in-memory index from raw embeddings.
+
+        :param chunk_ids: The ID of the chunk of every embedding.
+        :type chunk_ids: List[str]
+        :param embeddings: The embeddings, one per chunk.
+        :return: The retriever.
+        :rtype: LocalRetriever
+        """
+        return cls(list(chunk_ids), cls.normalize(np.reshape(embeddings, (len(chunk_ids), -1))))
+
+    @classmethod
+    def load(cls, directory: str) -> 'LocalRetriever':
+        """
+        Memory-map an index written by save.
+
+        :param directory: The directory of the index, or a link to it.
+        :type directory: str
+        :return: The retriever.
+        :rtype: LocalRetriever
+        """
+        # Resolve the link once, so both files are read from the same index even if it is swapped meanwhile
+        directory = os.path.realpath(directory)
+        with open(os.path.join(directory, CHUNK_IDS_FILE), 'r') as fp:
+            chunk_ids = json.load(fp)
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+        return cls(chunk_ids, embeddings)
+
+    def save(self, directory: str):
+        """
+        Write the index to a directory. Every file is written to a temporary file first and then
+        renamed over the previous one, so readers never see a partially written index.
+
+        :param directory: The directory of the index.
+        :type directory: str
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.npy', delete=False) as fp:
+            np.save(fp, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        os.replace(fp.name, os.path.join(directory, EMBEDDINGS_FILE))
+
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.json', delete=False) as fp:
+            json.dump(self.chunk_ids, fp)
+        os.replace(fp.name, os.path.join(directory, CHUNK_IDS_FILE))
+
+    def query(self, embedding: Sequence[float], top_k: int) -> List[Match]:
+        top_k = min(top_k, len(self.chunk_ids))
+        if top_k <= 0:
+            return []
+
+        scores = self.embeddings @ self.normalize(embedding)
+
+        # Only the top k scores need to be sorted, which argpartition finds in linear time
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [Match(self.chunk_ids[i], float(scores[i]), topic_of(self.chunk_ids[i])) for i in best]
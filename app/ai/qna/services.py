@@ -1,65 +1,219 @@
-import json
+import os
+from typing import Dict, Iterator, List, Tuple
 
-import openai
-import pinecone
+from flask import current_app
+
+from app.ai.llm import GENERATIVE_MODEL, get_llm_client
+from app.ai.qna import cache
+from app.ai.qna.chunk_store import CHUNK_STORE_FILE, ChunkStore
+from app.ai.qna.embedders import Embedder, create_embedder
+from app.ai.qna.retrievers import LocalRetriever, Match, PineconeRetriever, Retriever
 
-EMBEDDINGS_MODEL = "text-embedding-ada-002"
-GENERATIVE_MODEL = "gpt-3.5-turbo"
 COSINE_SIM_THRESHOLD = 0.7
 TOP_K = 10
+MAX_TOKENS = 1000
+TEMPERATURE = 0.5
 
+QNA_PROMPT = """You are an intelligent teaching assistant whose goal is to answer and explain queries from the student.
 
-def answer(question):
-    search_query_embedding = openai.Engine(id=EMBEDDINGS_MODEL).embeddings(input=[question])["data"][0]["embedding"]
+Along with the student's question, you will be given extracts from the textbook (showing both topic and contents) to help you better assist the student. First, check if the student's question is related to the subject at hand (Physics). If not, reply "This is not a valid question.".
 
-    try:
-        query_response = pinecone.Index('studyhub').query(
-            top_k=TOP_K,
-            include_values=False,
-            include_metadata=True,
-            vector=search_query_embedding,
-        )
+You will then go through the extracts to find answers to the student's question. If it is not found, use your own knowledge on the topic to give a reliable and accurate answer to the student. Make references to the textbook in your answer if possible."""
+
+_retriever = None
+_embedder = None
+_chunk_store = None
+# The version directory of the local index, with its retriever and chunk store, loaded together
+_local_index = None
+
+
+def get_local_index() -> Tuple[LocalRetriever, ChunkStore]:
+    """
+    Get the retriever and the chunk store of the current version of the local index.
+    Both are reloaded together once 'flask qna ingest' links a new version, so the IDs of the
+    retrieved chunks always resolve to the text of the same version.
+
+    :return: The retriever and the chunk store.
+    :rtype: Tuple[LocalRetriever, ChunkStore]
+    """
+    global _local_index
+    version = os.path.realpath(current_app.config['QNA_INDEX_DIR'])
+    local_index = _local_index
+    if local_index is None or local_index[0] != version:
+        store_path = os.path.join(version, CHUNK_STORE_FILE)
+        if os.path.exists(store_path):
+            chunk_store = ChunkStore(store_path)
+        else:
+            # An index saved without ingestion, which uses the chunks of the shipped mapping
+            chunk_store = ChunkStore.from_json(current_app.config['QNA_CHUNK_STORE'], current_app.config['QNA_CHUNKS_JSON'])
+        local_index = _local_index = (version, LocalRetriever.load(version), chunk_store)
+    return local_index[1], local_index[2]
+
+
+def get_sources() -> Tuple[Retriever, ChunkStore]:
+    """
+    Get the retriever selected by the QNA_RETRIEVER setting with the chunk store of the same chunks.
+
+    :return: The retriever and the chunk store.
+    :rtype: Tuple[Retriever, ChunkStore]
+    """
+    global _retriever, _chunk_store
+    if _retriever is None and current_app.config['QNA_RETRIEVER'] == 'local':
+        return get_local_index()
+
+    if _retriever is None:
+        _retriever = PineconeRetriever(current_app.config['PINECONE_INDEX'])
+    if _chunk_store is None:
+        _chunk_store = ChunkStore.from_json(current_app.config['QNA_CHUNK_STORE'], current_app.config['QNA_CHUNKS_JSON'])
+    return _retriever, _chunk_store
+
+
+def get_embedder() -> Embedder:
+    """
+    Get the embedder selected by the QNA_EMBEDDER setting, created once per process.
+
+    :return: The embedder.
+    :rtype: Embedder
+    """
+    global _embedder
+    if _embedder is None:
+        _embedder = create_embedder(current_app.config['QNA_EMBEDDER'])
+    return _embedder
+
+
+def relevant_matches(matches: List[Match]) -> List[Match]:
+    """
+    Select the retrieved chunks used as extracts.
+    The best match is always included, the others only if they are similar enough to the question.
+
+    :param matches: The retrieved chunks, most similar first.
+    :type matches: List[Match]
+    :return: The relevant chunks, most similar first.
+    :rtype: List[Match]
+    """
+    for i, match in enumerate(matches):
+        if match.score < COSINE_SIM_THRESHOLD and i > 0:
+            return matches[:i]
+    return matches
+
+
+def format_extracts(matches: List[Match], file_text_dict: dict) -> str:
+    """
+    Format the relevant retrieved chunks as extracts for the prompt.
+
+    :param matches: The retrieved chunks, most similar first.
+    :type matches: List[Match]
+    :param file_text_dict: The text of every chunk by chunk ID.
+    :type file_text_dict: dict
+    :return: The extracts.
+    :rtype: str
+    """
+    files_string = "Extract:\n"
+
+    for match in relevant_matches(matches):
+        file_text = file_text_dict.get(match.id)
+        files_string += f"\nTopic: {match.topic}\nContent: {file_text}\n"
+
+    return files_string
+
+
+def build_messages(question: str, matches: List[Match], chunk_store: ChunkStore) -> List[Dict[str, str]]:
+    """
+    Build the chat asking the model to answer a question from the extracts of the retrieved chunks.
+
+    :param question: The question of the student.
+    :type question: str
+    :param matches: The retrieved chunks, most similar first.
+    :type matches: List[Match]
+    :param chunk_store: The chunk store of the retriever of the chunks.
+    :type chunk_store: ChunkStore
+    :return: The messages of the chat.
+    :rtype: List[Dict[str, str]]
+    """
+    file_text_dict = chunk_store.get_many([match.id for match in matches])
+    files_string = format_extracts(matches, file_text_dict)
+
+    return [
+        {"role": "system", "content": QNA_PROMPT},
+        {"role": "user", "content": f"Question: {question}\n{files_string}"}
+    ]
+
+
+def answer(question: str) -> Tuple[str, bool]:
+    """
+    Answer a question from the extracts of the source documents most relevant to it.
+    Answers are cached, and a question similar enough to one answered before gets the cached answer.
+
+    :param question: The question of the student.
+    :type question: str
+    :return: The answer, and whether it was served from the cache.
+    :rtype: Tuple[str, bool]
+    """
+    embedder = get_embedder()
+    search_query_embedding = cache.get_embedding(question, embedder)
 
-        with open('app/ai/qna/file-text-mapping.json', 'r') as fp:
-            file_text_dict = json.load(fp)
+    try:
+        cached_answer = cache.find_answer(search_query_embedding, embedder.name)
+        if cached_answer is not None:
+            return cached_answer, True
 
-        files_string = "Extract:\n"
+        retriever, chunk_store = get_sources()
+        matches = retriever.query(search_query_embedding, TOP_K)
+        messages = build_messages(question, matches, chunk_store)
 
-        for i in range(len(query_response.matches)):
-            result = query_response.matches[i]
-            file_chunk_id = result.id
+        answer_text = get_llm_client().complete(messages, GENERATIVE_MODEL, max_tokens=MAX_TOKENS,
+                                                temperature=TEMPERATURE).strip()
+        cache.store_answer(question, search_query_embedding, embedder.name, answer_text)
+        return answer_text, False
 
-            score = result.score
-            if score < COSINE_SIM_THRESHOLD and i > 0:
-                break
+    except Exception as e:
+        return str(e), False
 
-            topic = result.metadata["topic"]
-            file_text = file_text_dict.get(file_chunk_id)
-            files_string += f"\nTopic: {topic}\nContent: {file_text}\n"
 
-        messages = [
-            {
-                "role": "system",
-                "content": """You are an intelligent teaching assistant whose goal is to answer and explain queries from the student.
+def stream_answer(question: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Answer a question like answer, yielding the retrieved sources as soon as they are known and then
+    the answer as it is generated, instead of waiting for the whole answer.
 
-Along with the student's question, you will be given extracts from the textbook (showing both topic and contents) to help you better assist the student. First, check if the student's question is related to the subject at hand (Physics). If not, reply "This is not a valid question.".
+    The events are ('context', {'sources': [...]}), then ('token', {'text': ...}) for every fragment
+    of the answer, then ('done', {'cached': ...}), or ('error', {'message': ...}) if answering failed.
+    A cached answer is yielded as a single token.
 
-You will then go through the extracts to find answers to the student's question. If it is not found, use your own knowledge on the topic to give a reliable and accurate answer to the student. Make references to the textbook in your answer if possible."""
-            },
-            {
-                "role": "user",
-                "content": f"Question: {question}\n{files_string}"
-            }
-        ]
-
-        response = openai.ChatCompletion.create(
-            messages=messages,
-            model=GENERATIVE_MODEL,
-            max_tokens=1000,
-            temperature=0.5,
-        )
-
-        return response.choices[0].message.content.strip()
+    :param question: The question of the student.
+    :type question: str
+    :return: The events of the answer.
+    :rtype: Iterator[Tuple[str, dict]]
+    """
+    try:
+        embedder = get_embedder()
+        search_query_embedding = cache.get_embedding(question, embedder)
+
+        cached_answer = cache.find_answer(search_query_embedding, embedder.name)
+        if cached_answer is not None:
+            yield 'context', {'sources': []}
+            yield 'token', {'text': cached_answer}
+            yield 'done', {'cached': True}
+            return
+
+        retriever, chunk_store = get_sources()
+        matches = relevant_matches(retriever.query(search_query_embedding, TOP_K))
+        yield 'context', {'sources': [{'id': match.id, 'topic': match.topic, 'score': float(match.score)}
+                                      for match in matches]}
+
+        fragments = []
+        stream = get_llm_client().stream(build_messages(question, matches, chunk_store), GENERATIVE_MODEL,
+                                         max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        for fragment in stream:
+            # Leading whitespace is stripped like in answer, so the streamed and cached answers are the same
+            if not fragments:
+                fragment = fragment.lstrip()
+                if not fragment:
+                    continue
+            fragments.append(fragment)
+            yield 'token', {'text': fragment}
+
+        cache.store_answer(question, search_query_embedding, embedder.name, ''.join(fragments).strip())
+        yield 'done', {'cached': False}
 
     except Exception as e:
-        return str(e)
+        yield 'error', {'message': str(e)}
@@ -1,12 +1,14 @@
-from flask import flash, redirect, render_template, request, url_for
-from flask_login import current_user, login_required
+import json
+
+import requests
+from flask import current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user
 
 from app import oauth_client, email
 from app.auth import auth_blueprint, auth_service
 from app.auth.forms import RegisterForm, LoginForm
 from app.models import User
-from app.users.user_services import update_pfp
-from app.upload.files import File, ProfileFile
+from app.upload import tasks
 from app.auth import auth_blueprint, auth_service
 from app.auth.forms import RegisterForm, LoginForm
 
@@ -134,14 +136,15 @@ def login_google_callback():
         return redirect(url_for("auth.login"))
 
     email = userinfo_response.json()['email']
-    picture = userinfo_response.json()['picture']
+    picture = userinfo_response.json().get('picture')
     username = userinfo_response.json()['name']
 
     user = User.get_by_email(email)
     if not user:
         user = User(email=email, username=username, password=None, verified=True)
         user.save()
-        update_pfp(user.id, File.download_from_url(picture))
+        if picture:
+            tasks.import_profile_picture_later(user.id, picture)
 
     login_user(user)
 
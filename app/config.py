@@ -1,4 +1,5 @@
 import os
+import tempfile
 from redmail import gmail
 
 base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -15,12 +16,56 @@ class BaseConfig:
     AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 
+    # Whether post attachments are uploaded to S3 after the post is created, while the post shows no attachment,
+    # and uploaded profile pictures processed after the request, while the user keeps their previous picture,
+    # by UPLOAD_WORKERS threads of every worker process
+    UPLOAD_IN_BACKGROUND = os.getenv('UPLOAD_IN_BACKGROUND', 'false').lower() == 'true'
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+    # Directory where attachments wait to be uploaded, kept across restarts so interrupted uploads can be resumed
+    UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'studyhub-uploads'))
+    # Spooled attachments whose post was never saved are deleted once older than this many seconds
+    UPLOAD_SPOOL_MAX_AGE = int(os.getenv('UPLOAD_SPOOL_MAX_AGE', 3600))
+    # Profile pictures are decoded, resized and encoded by IMAGE_PROCESSES processes of every worker process
+    IMAGE_PROCESSES = int(os.getenv('IMAGE_PROCESSES', 2))
+
     PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
     PINECONE_ENV = 'gcp-starter'
+    PINECONE_INDEX = 'studyhub'
+
+    # Limits of the requests of every worker process to the OpenAI API, see app.ai.gateway.
+    # OPENAI_API_BASE points the API at another server, such as the mock server of benchmarks.mock_openai_server
+    OPENAI_API_BASE = os.getenv('OPENAI_API_BASE')
+    AI_REQUESTS_PER_MINUTE = int(os.getenv('AI_REQUESTS_PER_MINUTE', 3000))
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 16))
+    AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 3))
+    AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', 60))
+
+    # Retriever of the QnA source chunks: 'pinecone' for the hosted index, or 'local' for the
+    # NumPy index memory-mapped from QNA_INDEX_DIR
+    QNA_RETRIEVER = os.getenv('QNA_RETRIEVER', 'pinecone')
+    QNA_INDEX_DIR = os.getenv('QNA_INDEX_DIR', os.path.join(base_dir, 'ai', 'qna', 'index'))
+    QNA_SOURCE_DIR = os.path.join(base_dir, 'ai', 'qna', 'data')
+    # Embedder of questions and source chunks: 'openai', or 'hashing' for the deterministic local stub
+    QNA_EMBEDDER = os.getenv('QNA_EMBEDDER', 'openai')
+
+    # Text of the QnA source chunks, compiled from the JSON mapping into a read-only SQLite store.
+    # An index written by 'flask qna ingest' has a chunk store of its own in QNA_INDEX_DIR instead
+    QNA_CHUNKS_JSON = os.path.join(base_dir, 'ai', 'qna', 'file-text-mapping.json')
+    QNA_CHUNK_STORE = os.getenv('QNA_CHUNK_STORE', os.path.join(base_dir, 'ai', 'qna', 'chunks.sqlite'))
 
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///test.sqlite')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Number of threads of every worker process grading essays in the background
+    ESSAY_GRADING_WORKERS = int(os.getenv('ESSAY_GRADING_WORKERS', 4))
+    # Running essay jobs not updated for this many seconds are considered lost by recover-essay-jobs
+    ESSAY_JOB_TIMEOUT = int(os.getenv('ESSAY_JOB_TIMEOUT', 600))
+
+    # Message queue shared by the Socket.IO servers of every worker, e.g. redis://localhost:6379/0.
+    # Without one, events only reach the clients connected to the worker that emitted them.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'studyhub-socketio')
+
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 
@@ -75,3 +120,5 @@ class TestingConfig(BaseConfig):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL_TEST', 'sqlite:///testt.sqlite')
     WTF_CSRF_ENABLED = False
+    QNA_RETRIEVER = 'local'
+    QNA_EMBEDDER = 'hashing'
@@ -1,6 +1,6 @@
 from flask import Blueprint
 
 conversations_blueprint = Blueprint("conversations", __name__)
-conversations_api_blueprint = Blueprint("conversations_api", __name__, url_prefix='/api/v1/conversations')
+conversations_api_blueprint = Blueprint("conversations_api", __name__, url_prefix='/api/v1/conversations', cli_group='conversations')
 
-from app.conversations import routes, api
+from app.conversations import routes, api, commands
@@ -1,41 +1,26 @@
-import datetime
-
 from flask import request, jsonify
 from flask_login import current_user, login_required
 
 from app.conversations import conversations_api_blueprint, conversation_services
 from app.exceptions import BadRequest, Unauthorized, NotFound, Conflict
-from app.models import User, Conversation
+from app.models import User, Conversation, Message
+from app.shared.pagination import keyset_page, page_size
 
 
 @conversations_api_blueprint.route('/all')
 @login_required
 def get_all_conversations():
     """
-    Get all conversations for the current user.
+    Get the conversations of the current user, most recently active first, using cursor pagination.
 
-    :return: A JSON response containing the serialized conversations.
+    :return: A JSON response containing a page of serialized conversations and the cursor of the next page.
     :rtype: flask.Response
     """
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int), default=20)
 
-    def last_update(conv: Conversation) -> datetime.datetime:
-        """
-        Inner function to determine the time of the latest update that occurred in a conversation
-        by taking the max of the creation time and time of last message; Used to sort conversations
-
-        :param conv: Conversation to evaluate
-        :type conv: Conversation
-        :return: Time of the last update
-        :rtype: datetime.datetime
-        """
-        messages = list(conv.messages)
-        if messages:
-            return max(messages[-1].timestamp, conv.date_created)
-        return conv.date_created
-
-    convs = conversation_services.get_user_conversations(current_user.id)
-    convs.sort(key=lambda conv: last_update(conv), reverse=True)
-    return jsonify([conv.serialized for conv in convs])
+    convs, next_cursor = conversation_services.get_user_conversations_page(current_user.id, cursor, limit)
+    return jsonify({'conversations': Conversation.serialize_all(convs, current_user.id), 'nextCursor': next_cursor})
 
 
 @conversations_api_blueprint.route('/<string:conversation_id>', methods=['GET', ])
@@ -66,7 +51,8 @@ def get_conversation(conversation_id: str):
 @login_required
 def get_conversation_history(conversation_id: str):
     """
-    Get the history of a specific conversation by its ID.
+    Get the history of a specific conversation by its ID, one page at a time.
+    Pages are returned oldest message first, while the cursor walks backwards in time.
 
     :param conversation_id: The ID of the conversation.
     :type conversation_id: str
@@ -83,10 +69,15 @@ def get_conversation_history(conversation_id: str):
     if not conversation_services.check_user_in_conversation(current_user.id, conversation_id):
         raise Unauthorized(message='You are not in this conversation, and therefore cannot view its data')
 
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int), default=50)
+    messages, next_cursor = keyset_page(conversation.messages, Message.timestamp, Message.id, cursor, limit)
+    messages.reverse()
+
     onlyGetMessageIds = request.args.get('onlyGetId', default='false').lower() == 'true'
     if onlyGetMessageIds:
-        return jsonify([message.id for message in conversation.messages])
-    return jsonify([message.serialized_min for message in conversation.messages])
+        return jsonify({'messages': [message.id for message in messages], 'nextCursor': next_cursor})
+    return jsonify({'messages': Message.serialize_all_min(messages), 'nextCursor': next_cursor})
 
 
 @conversations_api_blueprint.route('/new/private', methods=['POST', ])
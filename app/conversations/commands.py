@@ -0,0 +1,21 @@
+import click
+
+from app.conversations import conversations_api_blueprint, conversation_services
+
+
+@conversations_api_blueprint.cli.command('backfill-read-state')
+def backfill_read_state():
+    """
+    Initialise the read watermarks of conversation members from the per-message read records.
+    """
+    count = conversation_services.backfill_read_watermarks()
+    click.echo(f'Backfilled read watermarks for {count} conversation members')
+
+
+@conversations_api_blueprint.cli.command('backfill-last-message')
+def backfill_last_message():
+    """
+    Initialise the last activity time and last message of every conversation from its messages.
+    """
+    count = conversation_services.backfill_last_messages()
+    click.echo(f'Backfilled last messages for {count} conversations')
@@ -1,9 +1,17 @@
-from sqlalchemy import func, or_, desc
+from sqlalchemy import func, or_, desc, select, update
 from sqlalchemy.orm import joinedload
-from typing import List, Union
+from typing import List, Tuple, Union
 
 from app import db
 from app.models import Message, User, Conversation, ConversationMember, ReadMessage
+from app.shared.cache import TTLCache
+from app.shared.pagination import keyset_page
+
+MEMBERSHIP_CACHE_SIZE = 10000
+MEMBERSHIP_CACHE_TTL = 300
+
+# Maps (user_id, conversation_id) to whether the user is a member of the conversation
+_membership_cache = TTLCache(MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL)
 
 
 def get_user_conversations(user_id: int) -> List[Conversation]:
@@ -20,30 +28,158 @@ def get_user_conversations(user_id: int) -> List[Conversation]:
     return [] if user is None else list(user.conversations)
 
 
-def read_conversation(user_id: int, conversation_id: str):
-    conversation = Conversation.get_by_id(conversation_id)
+def get_user_conversations_page(user_id: int, cursor: Union[str, None], limit: int) -> Tuple[List[Conversation], Union[str, None]]:
+    """
+    Retrieves one page of the conversations of a user, most recently active first.
 
-    if conversation is None:
-        # Conversation not found
-        return
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of conversations to return.
+    :type limit: int
+    :return: The conversations of the page and the cursor of the next page, or None if there are no more.
+    :rtype: Tuple[List[Conversation], str | None]
+    """
+    query = Conversation.query.join(ConversationMember, ConversationMember.conversation_id == Conversation.id) \
+        .filter(ConversationMember.user_id == user_id)
+    return keyset_page(query, Conversation.last_message_at, Conversation.id, cursor, limit)
 
-    # Retrieve all unread messages in the conversation for the user
-    unread_messages = db.session.query(Message). \
-        filter(Message.conversation_id == conversation_id). \
-        filter(~Message.read_users.any(user_id=user_id)). \
-        all()
 
-    if not unread_messages:
-        return
+def get_user_conversation_ids(user_id: int) -> List[str]:
+    """
+    Retrieves the IDs of the conversations a user is a member of, without loading the conversations.
 
-    # Create a list of ReadMessage objects to be inserted
-    read_messages = [ReadMessage(message_id=message.id, user_id=user_id) for message in list(unread_messages)]
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :return: The IDs of the conversations of the user.
+    :rtype: List[str]
+    """
+    return list(db.session.scalars(
+        select(ConversationMember.conversation_id).where(ConversationMember.user_id == user_id)
+    ))
 
-    # Commit all the ReadMessage objects
-    db.session.add_all(read_messages)
+
+def advance_read_watermark(user_id: int, conversation_id: str, message_id: int) -> List[int]:
+    """
+    Mark every message of a conversation up to and including message_id as read by a user.
+
+    The read state of a member is a single watermark, so this is one conditional UPDATE
+    no matter how many messages are being marked as read. The watermarks of the members are
+    locked for the transaction, so concurrent reads in the same conversation are applied one
+    after the other and each message is reported as read by everyone exactly once.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param conversation_id: The ID of the conversation.
+    :type conversation_id: str
+    :param message_id: The ID of the latest message read by the user.
+    :type message_id: int
+    :return: IDs of the messages that have now been read by every member of the conversation.
+    :rtype: List[int]
+    """
+    members = ConversationMember.conversation_id == conversation_id
+    watermarks = dict(db.session.execute(
+        select(ConversationMember.user_id, func.coalesce(ConversationMember.last_read_message_id, 0))
+        .where(members)
+        .with_for_update()
+    ).all())
+    if user_id not in watermarks or watermarks[user_id] >= message_id:
+        db.session.commit()
+        return []
+
+    previous_min = min(watermarks.values())
+
+    result = db.session.execute(
+        update(ConversationMember)
+        .where(ConversationMember.user_id == user_id, members)
+        .where(or_(ConversationMember.last_read_message_id.is_(None),
+                   ConversationMember.last_read_message_id < message_id))
+        .values(last_read_message_id=message_id),
+        execution_options={'synchronize_session': False}
+    )
+    if result.rowcount != 1:
+        # The watermark was moved past message_id by another request, which reports the messages itself
+        db.session.commit()
+        return []
+
+    current_min = db.session.scalar(
+        select(func.min(func.coalesce(ConversationMember.last_read_message_id, 0))).where(members)
+    )
+    read_ids = []
+    if current_min > previous_min:
+        # Messages between the old and new minimum watermark have just been read by everyone
+        read_ids = list(db.session.scalars(
+            select(Message.id)
+            .where(Message.conversation_id == conversation_id, Message.id > previous_min, Message.id <= current_min)
+            .order_by(Message.id)
+        ))
     db.session.commit()
+    return read_ids
+
+
+def read_conversation(user_id: int, conversation_id: str) -> List[int]:
+    """
+    Mark all messages in a conversation as read by a user.
 
-    return read_messages
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param conversation_id: The ID of the conversation.
+    :type conversation_id: str
+    :return: IDs of the messages that have now been read by every member of the conversation.
+    :rtype: List[int]
+    """
+    latest_message_id = db.session.scalar(
+        select(func.max(Message.id)).where(Message.conversation_id == conversation_id)
+    )
+    if latest_message_id is None:
+        return []
+
+    return advance_read_watermark(user_id, conversation_id, latest_message_id)
+
+
+def backfill_read_watermarks() -> int:
+    """
+    Initialise the read watermarks of conversation members from the legacy per-message read records.
+
+    :return: The number of conversation members updated.
+    :rtype: int
+    """
+    last_read = select(func.max(ReadMessage.message_id)) \
+        .join(Message, Message.id == ReadMessage.message_id) \
+        .where(ReadMessage.user_id == ConversationMember.user_id,
+               Message.conversation_id == ConversationMember.conversation_id) \
+        .scalar_subquery()
+
+    result = db.session.execute(
+        update(ConversationMember)
+        .where(ConversationMember.last_read_message_id.is_(None))
+        .values(last_read_message_id=last_read),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def backfill_last_messages() -> int:
+    """
+    Initialise the last activity columns of every conversation from its messages.
+
+    :return: The number of conversations updated.
+    :rtype: int
+    """
+    last_message_id = select(func.max(Message.id)).where(Message.conversation_id == Conversation.id).scalar_subquery()
+    last_message_at = select(func.max(Message.timestamp)).where(Message.conversation_id == Conversation.id).scalar_subquery()
+
+    result = db.session.execute(
+        update(Conversation).values(
+            last_message_id=last_message_id,
+            last_message_at=func.coalesce(last_message_at, Conversation.date_created)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
 
 
 def private_conversation_exists(user1_id: int, user2_id: int) -> bool:
@@ -88,6 +224,7 @@ def create_private_conversation(user1_id: int, user2_id: int) -> Union[Conversat
 
     ConversationMember(user_id=user1_id, conversation_id=conversation.id).save()
     ConversationMember(user_id=user2_id, conversation_id=conversation.id).save()
+    cache_memberships(conversation.id, [user1_id, user2_id])
 
     return conversation
 
@@ -113,6 +250,7 @@ def create_group_conversation(group_name: str, user_ids: List[int], admin_id: in
     for user_id in user_ids:
         member = ConversationMember(user_id=user_id, conversation_id=conversation.id, is_admin=user_id == admin_id)
         member.save()
+    cache_memberships(conversation.id, user_ids)
 
     return conversation
 
@@ -120,6 +258,7 @@ def create_group_conversation(group_name: str, user_ids: List[int], admin_id: in
 def check_user_in_conversation(user_id: int, conversation_id: str) -> bool:
     """
     Check if a user is a member of a conversation.
+    Results are cached per worker, so repeated checks by the REST and socket handlers cost no queries.
 
     :param user_id: The ID of the user.
     :type user_id: int
@@ -128,15 +267,40 @@ def check_user_in_conversation(user_id: int, conversation_id: str) -> bool:
     :return: True if the user is a member of the conversation, False otherwise.
     :rtype: bool
     """
+    key = (user_id, conversation_id)
+    is_member = _membership_cache.get(key)
+    if is_member is None:
+        # A membership row can only exist if both the user and the conversation do
+        is_member = db.session.execute(
+            select(ConversationMember.id)
+            .where(ConversationMember.user_id == user_id, ConversationMember.conversation_id == conversation_id)
+            .limit(1)
+        ).first() is not None
+        _membership_cache.set(key, is_member)
 
-    # Retrieve the User and Conversation objects
-    user = User.get_by_id(user_id)
-    conversation = Conversation.get_by_id(conversation_id)
+    return is_member
+
+
+def cache_memberships(conversation_id: str, user_ids: List[int]):
+    """
+    Record the members of a conversation in the membership cache, replacing any stale negative entries.
+
+    :param conversation_id: The ID of the conversation.
+    :type conversation_id: str
+    :param user_ids: The IDs of the members of the conversation.
+    :type user_ids: List[int]
+    """
+    for user_id in user_ids:
+        _membership_cache.set((user_id, conversation_id), True)
 
-    if user is None or conversation is None:
-        # User or Conversation not found
-        return False
 
-    # Check if the user is a member of the conversation
-    member = ConversationMember.query.filter_by(user_id=user_id, conversation_id=conversation_id).first()
-    return member is not None
+def invalidate_membership(user_id: int, conversation_id: str):
+    """
+    Drop the cached membership of a user in a conversation, for instance after the user left it.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param conversation_id: The ID of the conversation.
+    :type conversation_id: str
+    """
+    _membership_cache.delete((user_id, conversation_id))
@@ -1,8 +1,11 @@
-from sqlalchemy import func, or_, desc
+from typing import List
+
+from sqlalchemy import func, or_, desc, update
 from sqlalchemy.orm import joinedload
 
 from app import db
-from app.models import Message, User, ReadMessage
+from app.conversations import conversation_services
+from app.models import Message, User, Conversation
 
 
 def create_message(sender_id: int, conversation_id: str, content: str) -> Message:
@@ -19,28 +22,53 @@ def create_message(sender_id: int, conversation_id: str, content: str) -> Messag
     :rtype: Message
     """
     message = Message(sender_id=sender_id, conversation_id=conversation_id, content=content)
-    message.save()
+    db.session.add(message)
+    db.session.flush()
+
+    db.session.execute(
+        update(Conversation).where(Conversation.id == conversation_id)
+        .values(last_message_at=message.timestamp, last_message_id=message.id),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
     return message
 
 
-def read_message(message_id: int, user_id: int) -> ReadMessage:
+def delete_message(message: Message):
+    """
+    Delete a message, pointing its conversation at the previous message if it was the latest one.
+
+    :param message: The message to delete.
+    :type message: Message
+    """
+    conversation = message.conversation
+    db.session.delete(message)
+    db.session.flush()
+
+    if conversation.last_message_id == message.id:
+        previous = conversation.messages.order_by(Message.id.desc()).first()
+        conversation.last_message_id = previous.id if previous else None
+        conversation.last_message_at = previous.timestamp if previous else conversation.date_created
+
+    db.session.commit()
+
+
+def read_message(message_id: int, user_id: int) -> List[int]:
     """
     Read a message for a specific user.
 
-    If the message has already been read by the user, return the existing ReadMessage object.
-    If the message has not been read by the user, create a new ReadMessage object and save it.
+    Advances the user's read watermark in the message's conversation up to the message,
+    which also marks any earlier messages as read.
 
     :param message_id: The ID of the message to read.
     :type message_id: int
     :param user_id: The ID of the user who reads the message.
     :type user_id: int
-    :return: The ReadMessage object representing the message read by the user.
-    :rtype: ReadMessage
+    :return: IDs of the messages that have now been read by every member of the conversation.
+    :rtype: List[int]
     """
-    read_message_data = ReadMessage.query.filter_by(message_id=message_id, user_id=user_id).first()
-    if read_message_data is not None:
-        return read_message_data
+    message = Message.get_by_id(message_id)
+    if message is None:
+        return []
 
-    read_message_data = ReadMessage(message_id=message_id, user_id=user_id)
-    read_message_data.save()
-    return read_message_data
+    return conversation_services.advance_read_watermark(user_id, message.conversation_id, message.id)
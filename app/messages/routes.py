@@ -1,4 +1,4 @@
-from typing import Type
+from typing import List, Type
 import bleach
 
 from flask import render_template
@@ -9,7 +9,9 @@ from app import socketio
 from app.conversations import conversation_services
 from app.exceptions import APIException, Unauthorized, BadRequest, Conflict
 from app.messages import messages_blueprint, messages_service
-from app.models import Conversation, Message, User
+from app.models import Message, User
+
+NAMESPACE = '/messages/socket'
 
 
 @messages_blueprint.route("/messages")
@@ -24,7 +26,7 @@ def messages():
     return render_template("messages.html")
 
 
-@socketio.on_error(namespace='/messages/socket')
+@socketio.on_error(namespace=NAMESPACE)
 @login_required
 def error_handler(error: Type[Exception]):
     """
@@ -39,19 +41,22 @@ def error_handler(error: Type[Exception]):
     emit('error', error.to_dict(), room=current_user.id, json=True)
 
 
-@socketio.on('connect', namespace="/messages/socket")
+@socketio.on('connect', namespace=NAMESPACE)
 @login_required
 def handle_connect():
     """
     Handle the user connection event.
 
-    Join a room based on the user's ID.
+    Join a room based on the user's ID, and the room of every conversation the user is a member of
+    so that conversation events are broadcast with a single emit.
     """
     user_id = current_user.id
     join_room(user_id)
+    for conversation_id in conversation_services.get_user_conversation_ids(user_id):
+        join_room(conversation_id)
 
 
-@socketio.on('disconnect', namespace="/messages/socket")
+@socketio.on('disconnect', namespace=NAMESPACE)
 @login_required
 def handle_disconnect():
     """
@@ -63,7 +68,45 @@ def handle_disconnect():
     leave_room(user_id)
 
 
-@socketio.on('message', namespace="/messages/socket")
+def join_conversation_room(conversation_id: str, user_ids: List[int]):
+    """
+    Subscribe the sockets of the given users connected to this worker to the room of a conversation.
+    Sockets connected to other workers join it once their client receives the new_conversation event.
+
+    :param conversation_id: The ID of the conversation.
+    :type conversation_id: str
+    :param user_ids: The IDs of the users who joined the conversation.
+    :type user_ids: List[int]
+    """
+    manager = socketio.server.manager
+    for user_id in user_ids:
+        for sid, _ in list(manager.get_participants(NAMESPACE, user_id)):
+            socketio.server.enter_room(sid, conversation_id, namespace=NAMESPACE)
+
+
+@socketio.on('join_conversation', namespace=NAMESPACE)
+@login_required
+def handle_join_conversation(payload):
+    """
+    Handle the join conversation event.
+
+    Subscribe the socket to the room of a conversation the user has just been added to.
+
+    :param payload: The join conversation payload containing the conversation ID.
+    :type payload: dict
+    """
+    conversation_id = payload['conversation_id']
+
+    if not conversation_id:
+        raise BadRequest(message='conversation_id is not specified in payload')
+
+    if not conversation_services.check_user_in_conversation(current_user.id, conversation_id):
+        raise Unauthorized(message='User cannot join a conversation it is not part of')
+
+    join_room(conversation_id)
+
+
+@socketio.on('message', namespace=NAMESPACE)
 @login_required
 def handle_message(payload):
     """
@@ -83,21 +126,21 @@ def handle_message(payload):
     if not content:
         raise BadRequest(message='content is not specified in payload')
 
-    message = messages_service.create_message(current_user.id, conversation_id, bleach.clean(content))
-    conversation = Conversation.get_by_id(conversation_id)
+    if not conversation_services.check_user_in_conversation(current_user.id, conversation_id):
+        raise Unauthorized(message='User cannot send messages to a conversation it is not part of')
 
-    for user in conversation.users:
-        emit('new_message', message.serialized, room=user.id, json=True)
+    message = messages_service.create_message(current_user.id, conversation_id, bleach.clean(content))
+    emit('new_message', message.serialized, room=conversation_id, json=True)
 
 
-@socketio.on('read_message', namespace='/messages/socket')
+@socketio.on('read_message', namespace=NAMESPACE)
 @login_required
 def handle_read_message(payload):
     """
     Handle the read message event.
 
     Mark a message as read by the current user and emit the bluetick event
-    to the conversation users if all members have read the message.
+    to the conversation users for the messages that all members have now read.
 
     :param payload: The read message payload containing the message ID.
     :type payload: dict
@@ -108,16 +151,15 @@ def handle_read_message(payload):
         raise BadRequest(message='message_id is not specified in payload')
 
     message = Message.get_by_id(message_id)
-    read_message_data = messages_service.read_message(message_id, current_user.id)
+    emit_data = messages_service.read_message(message_id, current_user.id)
 
-    if not read_message_data.message.read_by_all:
+    if not emit_data:
         return
 
-    for user in message.conversation.users:
-        emit('bluetick', [read_message_data.message.id], room=user.id, json=True)
+    emit('bluetick', emit_data, room=message.conversation_id, json=True)
 
 
-@socketio.on('create_private_conversation', namespace='/messages/socket')
+@socketio.on('create_private_conversation', namespace=NAMESPACE)
 @login_required
 def handle_create_private_conversation(payload):
     """
@@ -145,11 +187,12 @@ def handle_create_private_conversation(payload):
     if not conversation:
         raise Conflict(message='A conversation already exists between the users')
 
+    join_conversation_room(conversation.id, [current_user.id, target.id])
     emit('new_conversation', conversation.serialized, room=current_user.id, json=True)
     emit('new_conversation', conversation.serialized, room=target.id, json=True)
 
 
-@socketio.on('create_group_conversation', namespace='/messages/socket')
+@socketio.on('create_group_conversation', namespace=NAMESPACE)
 @login_required
 def handle_create_group_conversation(payload):
     """
@@ -177,12 +220,13 @@ def handle_create_group_conversation(payload):
         raise BadRequest(message='One of more of the provided user IDs was invalid')
 
     conversation = conversation_services.create_group_conversation(bleach.clean(group_name), user_ids, current_user.id)
+    join_conversation_room(conversation.id, user_ids)
 
     for user in users:
         emit('new_conversation', conversation.serialized, room=user.id, json=True)
 
 
-@socketio.on('read_conversation', namespace='/messages/socket')
+@socketio.on('read_conversation', namespace=NAMESPACE)
 @login_required
 def handle_read_conversation(payload):
     """
@@ -199,21 +243,18 @@ def handle_read_conversation(payload):
     if not conversation_id:
         raise BadRequest(message='conversation_id is not specified in payload')
 
-    conversation = Conversation.get_by_id(conversation_id)
-    if current_user not in conversation.users:
+    if not conversation_services.check_user_in_conversation(current_user.id, conversation_id):
         raise Unauthorized(message='User cannot read conversation it is not part of')
 
-    read_messages_data = conversation_services.read_conversation(current_user.id, conversation_id)
-    emit_data = [data.message.id for data in read_messages_data if data.message.read_by_all]
+    emit_data = conversation_services.read_conversation(current_user.id, conversation_id)
 
     if not emit_data:
         return
 
-    for user in conversation.users:
-        emit('bluetick', emit_data, room=user.id, json=True)
+    emit('bluetick', emit_data, room=conversation_id, json=True)
 
 
-@socketio.on('edit_message', namespace='/messages/socket')
+@socketio.on('edit_message', namespace=NAMESPACE)
 @login_required
 def handle_edit_message(payload: dict):
     """
@@ -241,11 +282,10 @@ def handle_edit_message(payload: dict):
     message.content = new_content
     message.save()
 
-    for user in message.conversation.users:
-        emit('edit', {'id': message.id, 'content': message.content}, room=user.id, json=True)
+    emit('edit', {'id': message.id, 'content': message.content}, room=message.conversation_id, json=True)
 
 
-@socketio.on('delete_message', namespace='/messages/socket')
+@socketio.on('delete_message', namespace=NAMESPACE)
 @login_required
 def handle_delete_message(payload: dict):
     """
@@ -265,7 +305,7 @@ def handle_delete_message(payload: dict):
     if message.sender_id != current_user.id:
         raise Unauthorized(message='User cannot delete messages of other users')
 
-    message.delete()
+    conversation_id = message.conversation_id
+    messages_service.delete_message(message)
 
-    for user in message.conversation.users:
-        emit('delete', {'id': message_id}, room=user.id, json=True)
+    emit('delete', {'id': message_id}, room=conversation_id, json=True)
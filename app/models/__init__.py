@@ -6,4 +6,7 @@ from app.models.post_vote import PostVote
 from app.models.reply import Reply
 from app.models.reply_vote import ReplyVote
 from app.models.user import User
-from app.models.essay import EssayGrade, Essay, EssaySuggestion
+from app.models.essay import EssayGrade, Essay, EssaySuggestion, EssayJob, EssayJobStatus
+from app.models.qna_cache import QnaEmbedding, QnaAnswer, QnaCacheMetric
+from app.models.upload import Upload
+from app.models.stored_file import StoredFile
@@ -1,7 +1,13 @@
 import datetime
 import uuid
+from typing import List
+
+from sqlalchemy import and_, func, select
 
 from app import db
+from app.models.conversation_member import ConversationMember
+from app.models.message import Message
+from app.models.user import User
 
 
 class Conversation(db.Model):
@@ -9,12 +15,18 @@ class Conversation(db.Model):
     Model that represents a conversation
     """
     __tablename__ = "conversations"
+    __table_args__ = (
+        db.Index('ix_conversations_last_message_at_id', 'last_message_at', 'id'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(36), nullable=True)
     description = db.Column(db.String(1024), nullable=True)
     date_created = db.Column(db.DateTime, index=True, nullable=False, default=datetime.datetime.utcnow)
     is_group = db.Column(db.Boolean, nullable=False)
+    # Time of the latest activity, which is the creation time until the first message is sent
+    last_message_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_message_id = db.Column(db.Integer, nullable=True)
 
     users = db.relationship('User', secondary='conversation_members', back_populates='conversations', lazy='dynamic')
     messages = db.relationship('Message', foreign_keys='Message.conversation_id', back_populates='conversation', lazy='dynamic')
@@ -30,6 +42,7 @@ class Conversation(db.Model):
         self.name = name
         self.description = description
         self.is_group = is_group
+        self.last_message_at = datetime.datetime.utcnow()
 
     def save(self):
         """
@@ -40,13 +53,73 @@ class Conversation(db.Model):
 
     @property
     def serialized(self):
+        return {
+            **self.serialized_min,
+            "userIds": [user.id for user in self.users]
+        }
+
+    @staticmethod
+    def serialize_all(conversations: List['Conversation'], user_id: int) -> List[dict]:
+        """
+        Serialize a batch of conversations for the conversation list of a user.
+        Members, last message previews and unread counts are each fetched with a single query,
+        regardless of the number of conversations.
+
+        :param conversations: The conversations to serialize
+        :param user_id: The ID of the user viewing the conversations, used to count unread messages
+        :return: List of serialized conversations, in the same order as the input
+        """
+        if not conversations:
+            return []
+
+        conversation_ids = [conversation.id for conversation in conversations]
+
+        members = {conversation_id: [] for conversation_id in conversation_ids}
+        rows = db.session.query(ConversationMember.conversation_id, User) \
+            .join(User, User.id == ConversationMember.user_id) \
+            .filter(ConversationMember.conversation_id.in_(conversation_ids))
+        for conversation_id, user in rows:
+            members[conversation_id].append(user)
+
+        last_message_ids = [conversation.last_message_id for conversation in conversations if conversation.last_message_id]
+        last_messages = {message.id: message for message in Message.query.filter(Message.id.in_(last_message_ids))}
+
+        viewer = ConversationMember.__table__.alias('viewer')
+        unread_counts = dict(db.session.execute(
+            select(Message.conversation_id, func.count(Message.id))
+            .join(viewer, and_(viewer.c.conversation_id == Message.conversation_id, viewer.c.user_id == user_id))
+            .where(Message.conversation_id.in_(conversation_ids))
+            .where(Message.id > func.coalesce(viewer.c.last_read_message_id, 0))
+            .where(Message.sender_id != user_id)
+            .group_by(Message.conversation_id)
+        ).all())
+
+        serialized = []
+        for conversation in conversations:
+            last_message = last_messages.get(conversation.last_message_id)
+            serialized.append({
+                **conversation.serialized_min,
+                'userIds': [user.id for user in members[conversation.id]],
+                'users': [user.serialized_min for user in members[conversation.id]],
+                'lastMessageAt': conversation.last_message_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'lastMessage': {
+                    'id': last_message.id,
+                    'senderId': last_message.sender_id,
+                    'content': last_message.content,
+                    'timestamp': last_message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+                } if last_message else None,
+                'unreadCount': unread_counts.get(conversation.id, 0)
+            })
+        return serialized
+
+    @property
+    def serialized_min(self):
         return {
             "id": self.id,
             "name": self.name,
             "description": self.description,
             "isGroup": self.is_group,
-            "dateCreated": self.date_created.strftime('%Y-%m-%d %H:%M:%S'),
-            "userIds": [user.id for user in self.users]
+            "dateCreated": self.date_created.strftime('%Y-%m-%d %H:%M:%S')
         }
 
     @staticmethod
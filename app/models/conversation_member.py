@@ -1,5 +1,4 @@
-import datetime
-import uuid
+from typing import Dict, List
 
 from app import db
 
@@ -9,11 +8,18 @@ class ConversationMember(db.Model):
     Model that represents a conversation member
     """
     __tablename__ = "conversation_members"
+    __table_args__ = (
+        db.Index('ix_conversation_members_conversation_id_user_id', 'conversation_id', 'user_id'),
+        db.Index('ix_conversation_members_user_id_conversation_id', 'user_id', 'conversation_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     conversation_id = db.Column(db.String(36), db.ForeignKey('conversations.id'), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # ID of the latest message in the conversation this member has read. Message IDs increase monotonically,
+    # so every message up to and including it counts as read by the member.
+    last_read_message_id = db.Column(db.Integer, nullable=True)
 
     def __repr__(self):
         return f"<ConversationMember (id='{self.id}', user='{self.user_id}', conversation='{self.conversation_id}')>"
@@ -39,3 +45,19 @@ class ConversationMember(db.Model):
         :return: Conversation Member or None
         """
         return ConversationMember.query.filter_by(id=conversation_member_id).first()
+
+    @staticmethod
+    def read_watermarks(conversation_ids: List[str]) -> Dict[str, Dict[int, int]]:
+        """
+        Fetch the read watermark of every member of the given conversations in a single query
+        :param conversation_ids: IDs of the conversations
+        :return: Mapping of conversation ID to a mapping of user ID to the last read message ID (0 if none)
+        """
+        watermarks = {conversation_id: {} for conversation_id in conversation_ids}
+        rows = db.session.query(
+            ConversationMember.conversation_id, ConversationMember.user_id, ConversationMember.last_read_message_id
+        ).filter(ConversationMember.conversation_id.in_(conversation_ids))
+
+        for conversation_id, user_id, last_read_message_id in rows:
+            watermarks[conversation_id][user_id] = last_read_message_id or 0
+        return watermarks
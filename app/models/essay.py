@@ -1,4 +1,5 @@
 import datetime
+import uuid
 
 from app import db
 from enum import Enum
@@ -49,6 +50,9 @@ class Essay(db.Model):
     Model that represents a graded essay
     """
     __tablename__ = "essays"
+    __table_args__ = (
+        db.Index('ix_essays_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     topic = db.Column(db.Text, nullable=False)
@@ -58,7 +62,8 @@ class Essay(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    suggestions = db.relationship(EssaySuggestion, backref='essay', lazy="dynamic", cascade="all, delete-orphan")
+    suggestions = db.relationship(EssaySuggestion, backref='essay', cascade="all, delete-orphan",
+                                  order_by=EssaySuggestion.id)
 
     def __repr__(self):
         return f"<Essay (id='{self.id}', topic='{self.topic}', user_id='{self.user_id}')>"
@@ -91,6 +96,20 @@ class Essay(db.Model):
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         }
 
+    @property
+    def serialized_summary(self):
+        """
+        Serialize the essay without its content and suggestions, for listing essays
+        """
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'userId': self.user_id,
+            'comment': self.comment,
+            'grade': self.grade.name,
+            'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
     @staticmethod
     def get_by_id(essay_id):
         """
@@ -99,3 +118,67 @@ class Essay(db.Model):
         :return: Reply or None
         """
         return Essay.query.filter_by(id=essay_id).first()
+
+
+class EssayJobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class EssayJob(db.Model):
+    """
+    Model that represents an essay waiting to be graded, or being graded, in the background
+    """
+    __tablename__ = "essay_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    topic = db.Column(db.Text, nullable=False)
+    essay = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum(EssayJobStatus), nullable=False, default=EssayJobStatus.QUEUED, index=True)
+    error = db.Column(db.Text, nullable=True)
+    # Whether a credit was charged for the job, which is refunded if grading fails
+    charged = db.Column(db.Boolean, nullable=False, default=False)
+    essay_id = db.Column(db.Integer, db.ForeignKey('essays.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    date_updated = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EssayJob (id='{self.id}', status='{self.status}', user_id='{self.user_id}')>"
+
+    def __init__(self, topic: str, essay: str, user_id: int, charged: bool = False):
+        self.id = str(uuid.uuid4())
+        self.topic = topic
+        self.essay = essay
+        self.user_id = user_id
+        self.charged = charged
+        self.status = EssayJobStatus.QUEUED
+
+    def save(self):
+        """
+        Persist the essay job in the database
+        :return
+        """
+        db.session.add(self)
+        db.session.commit()
+
+    @property
+    def serialized(self):
+        return {
+            'id': self.id,
+            'status': self.status.name,
+            'essayId': self.essay_id,
+            'error': self.error,
+            'dateCreated': self.date_created.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    @staticmethod
+    def get_by_id(job_id):
+        """
+        Filter an essay job by id
+        :param job_id
+        :return: Essay job or None
+        """
+        return EssayJob.query.filter_by(id=job_id).first()
@@ -1,6 +1,8 @@
 import datetime
+from typing import Dict, List
 
 from app import db
+from app.models.conversation_member import ConversationMember
 
 
 class Message(db.Model):
@@ -8,6 +10,9 @@ class Message(db.Model):
     Model that represents a message
     """
     __tablename__ = "messages"
+    __table_args__ = (
+        db.Index('ix_messages_conversation_id_timestamp_id', 'conversation_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -49,31 +54,64 @@ class Message(db.Model):
         :return: True if the message has been read by all users, False otherwise.
         :rtype: bool
         """
-        conversation_users = set(user.id for user in self.conversation.users)
-        read_users = set(read_user.user_id for read_user in self.read_users)
+        watermarks = ConversationMember.read_watermarks([self.conversation_id])[self.conversation_id]
+        return min(watermarks.values(), default=0) >= self.id
 
-        return conversation_users == read_users
+    def read_user_ids(self, watermarks: Dict[int, int]) -> List[int]:
+        """
+        Get the IDs of the users who have read the message.
+
+        :param watermarks: Mapping of user ID to the last message ID read by that user in the conversation.
+        :type watermarks: Dict[int, int]
+        :return: IDs of the users whose read watermark has reached this message.
+        :rtype: List[int]
+        """
+        return [user_id for user_id, last_read_message_id in watermarks.items() if last_read_message_id >= self.id]
 
     @property
     def serialized(self):
-        return {
-            'id': self.id,
-            'senderId': self.sender_id,
-            'conversationId': self.conversation_id,
-            'content': self.content,
-            'readUserIds': [data.user.id for data in self.read_users],
-            'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return Message.serialize_all([self])[0]
 
     @property
     def serialized_min(self):
-        return {
-            'id': self.id,
-            'senderId': self.sender_id,
-            'content': self.content,
-            'readUserIds': [data.user.id for data in self.read_users],
-            'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return Message.serialize_all_min([self])[0]
+
+    @staticmethod
+    def serialize_all(messages: List['Message']) -> List[dict]:
+        """
+        Serialize a batch of messages, loading read receipts with a single query.
+
+        :param messages: The messages to serialize.
+        :type messages: List[Message]
+        :return: List of serialized messages, in the same order as the input.
+        :rtype: List[dict]
+        """
+        serialized = Message.serialize_all_min(messages)
+        for message, data in zip(messages, serialized):
+            data['conversationId'] = message.conversation_id
+        return serialized
+
+    @staticmethod
+    def serialize_all_min(messages: List['Message']) -> List[dict]:
+        """
+        Serialize a batch of messages without their conversation ID, loading read receipts with a single query.
+
+        :param messages: The messages to serialize.
+        :type messages: List[Message]
+        :return: List of serialized messages, in the same order as the input.
+        :rtype: List[dict]
+        """
+        if not messages:
+            return []
+
+        watermarks = ConversationMember.read_watermarks(list({message.conversation_id for message in messages}))
+        return [{
+            'id': message.id,
+            'senderId': message.sender_id,
+            'content': message.content,
+            'readUserIds': message.read_user_ids(watermarks[message.conversation_id]),
+            'timestamp': message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        } for message in messages]
 
     @staticmethod
     def get_by_id(message_id):
@@ -87,7 +125,9 @@ class Message(db.Model):
 
 class ReadMessage(db.Model):
     """
-    Model that represents a read message
+    Model that represents a read message.
+    Read state is now tracked by the read watermark of each conversation member;
+    these rows are only kept to backfill the watermarks of existing conversations.
     """
     __tablename__ = "read_messages"
 
@@ -1,4 +1,9 @@
 import datetime
+from typing import List
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import func, select, update
 
 from app import db
 
@@ -32,6 +37,11 @@ class Post(db.Model):
     Model that represents a post
     """
     __tablename__ = "posts"
+    __table_args__ = (
+        db.Index('ix_posts_date_created_id', 'date_created', 'id'),
+        db.Index('ix_posts_user_id_date_created_id', 'user_id', 'date_created', 'id'),
+        db.Index('ft_posts_title_post', 'title', 'post', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -39,8 +49,13 @@ class Post(db.Model):
     subject = db.Column(db.Enum(Subject), nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     attachment_name = db.Column(db.String(255), nullable=True)
+    # Whether the attachment is still being uploaded to S3 in the background
+    attachment_pending = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     resolved_by_id = db.Column(db.Integer, db.ForeignKey('replies.id'), nullable=True)
+    upvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    downvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    score = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     replies = db.relationship("Reply", backref="post", foreign_keys="Reply.post_id", lazy="dynamic", cascade="all, delete-orphan")
     post_votes = db.relationship("PostVote", backref="post", lazy="dynamic", cascade="all, delete-orphan")
@@ -49,12 +64,14 @@ class Post(db.Model):
     def __repr__(self):
         return f"<Post (id='{self.id}', title='{self.title}', post='{self.post}', subject='{self.subject.name}', date_created='{self.date_created}')>"
 
-    def __init__(self, title: str, post: str, subject: Subject, user_id: int, attachment_name: str = None):
+    def __init__(self, title: str, post: str, subject: Subject, user_id: int, attachment_name: str = None,
+                 attachment_pending: bool = False):
         self.title = title
         self.post = post
         self.subject = subject
         self.user_id = user_id
         self.attachment_name = attachment_name
+        self.attachment_pending = attachment_pending
 
     def save(self):
         """
@@ -66,30 +83,101 @@ class Post(db.Model):
 
     @property
     def post_score(self):
-        upvotes = sum(vote.vote for vote in self.post_votes if vote.vote == 1)
-        downvotes = sum(vote.vote for vote in self.post_votes if vote.vote == -1)
-        return upvotes - downvotes
+        return self.score
+
+    def update_vote_tally(self, old_vote: int, new_vote: int):
+        """
+        Adjust the vote counters for a single user's vote changing from old_vote to new_vote.
+        The counters are incremented in SQL so concurrent voters do not overwrite each other;
+        the caller is responsible for committing the session.
+
+        :param old_vote: The previous vote of the user (-1, 0 or 1)
+        :param new_vote: The new vote of the user (-1, 0 or 1)
+        """
+        upvotes = (new_vote == 1) - (old_vote == 1)
+        downvotes = (new_vote == -1) - (old_vote == -1)
+        db.session.execute(
+            update(Post).where(Post.id == self.id).values(
+                upvotes=Post.upvotes + upvotes,
+                downvotes=Post.downvotes + downvotes,
+                score=Post.score + upvotes - downvotes
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.expire(self, ['upvotes', 'downvotes', 'score'])
+
+    @staticmethod
+    def reconcile_vote_tallies() -> int:
+        """
+        Recompute the vote counters of every post from the post_votes table.
+
+        :return: The number of posts updated
+        """
+        upvotes = select(func.count(PostVote.id)).where(PostVote.post_id == Post.id, PostVote.vote == 1).scalar_subquery()
+        downvotes = select(func.count(PostVote.id)).where(PostVote.post_id == Post.id, PostVote.vote == -1).scalar_subquery()
+        result = db.session.execute(
+            update(Post).values(upvotes=upvotes, downvotes=downvotes, score=upvotes - downvotes),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return result.rowcount
 
     @property
     def attachment(self):
-        if not self.attachment_name:
+        if not self.attachment_name or self.attachment_pending:
             return None
         return File.get(self.attachment_name, FilePurpose.POST_ATTACHMENT, self.user_id)
 
     @property
     def serialized(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'body': self.post,
-            'subject': self.subject.name,
-            'authorId': self.user_id,
-            'timestamp': self.date_created.strftime('%Y-%m-%d %H:%M:%S'),
-            'votes': [vote.serialized for vote in self.post_votes],
-            'replyCount': len(list(self.replies)),
-            'attachment': self.attachment,
-            'resolvedById': self.resolved_by_id
-        }
+        return Post.serialize_all([self])[0]
+
+    @staticmethod
+    def serialize_all(posts: List['Post']) -> List[dict]:
+        """
+        Serialize a batch of posts using a fixed number of queries regardless of the batch size.
+        Reply counts, the current user's votes and the post authors are each fetched with a single grouped query.
+
+        :param posts: The posts to serialize
+        :return: List of serialized posts, in the same order as the input
+        """
+        # Imported here as the user model itself depends on this module
+        from app.models.user import User
+
+        if not posts:
+            return []
+
+        post_ids = [post.id for post in posts]
+        reply_counts = dict(db.session.execute(
+            select(Reply.post_id, func.count(Reply.id)).where(Reply.post_id.in_(post_ids)).group_by(Reply.post_id)
+        ).all())
+
+        user_votes = {}
+        if has_request_context() and current_user.is_authenticated:
+            user_votes = dict(db.session.execute(
+                select(PostVote.post_id, PostVote.vote).where(PostVote.user_id == current_user.id, PostVote.post_id.in_(post_ids))
+            ).all())
+
+        author_ids = {post.user_id for post in posts}
+        authors = {user.id: user for user in User.query.filter(User.id.in_(author_ids))}
+
+        return [{
+            'id': post.id,
+            'title': post.title,
+            'body': post.post,
+            'subject': post.subject.name,
+            'authorId': post.user_id,
+            'author': authors[post.user_id].serialized_min,
+            'timestamp': post.date_created.strftime('%Y-%m-%d %H:%M:%S'),
+            'score': post.score,
+            'upvotes': post.upvotes,
+            'downvotes': post.downvotes,
+            'userVote': user_votes.get(post.id, 0),
+            'replyCount': reply_counts.get(post.id, 0),
+            'attachment': post.attachment,
+            'attachmentPending': post.attachment_pending,
+            'resolvedById': post.resolved_by_id
+        } for post in posts]
 
     @staticmethod
     def get_by_id(post_id):
@@ -0,0 +1,51 @@
+import datetime
+
+from app import db
+
+
+class QnaEmbedding(db.Model):
+    """
+    Model that represents a cached embedding of a normalised QnA question
+    """
+    __tablename__ = "qna_embeddings"
+
+    # SHA-256 of the embedder name and the normalised question
+    key = db.Column(db.String(64), primary_key=True)
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_used = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<QnaEmbedding (key='{self.key}')>"
+
+
+class QnaAnswer(db.Model):
+    """
+    Model that represents a cached answer to a QnA question, looked up by the similarity of the question embeddings
+    """
+    __tablename__ = "qna_answers"
+
+    id = db.Column(db.Integer, primary_key=True)
+    embedder = db.Column(db.String(64), nullable=False)
+    question = db.Column(db.Text, nullable=False)
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_used = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<QnaAnswer (id='{self.id}', question='{self.question}')>"
+
+
+class QnaCacheMetric(db.Model):
+    """
+    Model that represents a counter of the QnA cache, such as the number of answer cache hits
+    """
+    __tablename__ = "qna_cache_metrics"
+
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f"<QnaCacheMetric (name='{self.name}', value='{self.value}')>"
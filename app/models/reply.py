@@ -1,4 +1,9 @@
 import datetime
+from typing import List
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import func, select, update
 
 from app import db
 
@@ -9,12 +14,18 @@ class Reply(db.Model):
     Model that represents a reply
     """
     __tablename__ = "replies"
+    __table_args__ = (
+        db.Index('ix_replies_post_id_date_created_id', 'post_id', 'date_created', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     reply = db.Column(db.Text, nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
+    upvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    downvotes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    score = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     reply_votes = db.relationship("ReplyVote", backref="reply", lazy="dynamic", cascade="all, delete-orphan")
 
@@ -34,16 +45,84 @@ class Reply(db.Model):
         db.session.add(self)
         db.session.commit()
 
+    def update_vote_tally(self, old_vote: int, new_vote: int):
+        """
+        Adjust the vote counters for a single user's vote changing from old_vote to new_vote.
+        The counters are incremented in SQL so concurrent voters do not overwrite each other;
+        the caller is responsible for committing the session.
+
+        :param old_vote: The previous vote of the user (-1, 0 or 1)
+        :param new_vote: The new vote of the user (-1, 0 or 1)
+        """
+        upvotes = (new_vote == 1) - (old_vote == 1)
+        downvotes = (new_vote == -1) - (old_vote == -1)
+        db.session.execute(
+            update(Reply).where(Reply.id == self.id).values(
+                upvotes=Reply.upvotes + upvotes,
+                downvotes=Reply.downvotes + downvotes,
+                score=Reply.score + upvotes - downvotes
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.expire(self, ['upvotes', 'downvotes', 'score'])
+
+    @staticmethod
+    def reconcile_vote_tallies() -> int:
+        """
+        Recompute the vote counters of every reply from the reply_votes table.
+
+        :return: The number of replies updated
+        """
+        upvotes = select(func.count(ReplyVote.id)).where(ReplyVote.reply_id == Reply.id, ReplyVote.vote == 1).scalar_subquery()
+        downvotes = select(func.count(ReplyVote.id)).where(ReplyVote.reply_id == Reply.id, ReplyVote.vote == -1).scalar_subquery()
+        result = db.session.execute(
+            update(Reply).values(upvotes=upvotes, downvotes=downvotes, score=upvotes - downvotes),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return result.rowcount
+
     @property
     def serialized(self):
-        return {
-            'id': self.id,
-            'text': self.reply,
-            'authorId': self.user_id,
-            'postId': self.post_id,
-            'timestamp': self.date_created.strftime('%Y-%m-%d %H:%M:%S'),
-            'votes': [vote.serialized for vote in self.reply_votes]
-        }
+        return Reply.serialize_all([self])[0]
+
+    @staticmethod
+    def serialize_all(replies: List['Reply']) -> List[dict]:
+        """
+        Serialize a batch of replies using a fixed number of queries regardless of the batch size.
+        The current user's votes and the reply authors are each fetched with a single grouped query.
+
+        :param replies: The replies to serialize
+        :return: List of serialized replies, in the same order as the input
+        """
+        # Imported here as the user model itself depends on this module
+        from app.models.user import User
+
+        if not replies:
+            return []
+
+        reply_ids = [reply.id for reply in replies]
+        user_votes = {}
+        if has_request_context() and current_user.is_authenticated:
+            user_votes = dict(db.session.execute(
+                select(ReplyVote.reply_id, ReplyVote.vote).where(ReplyVote.user_id == current_user.id, ReplyVote.reply_id.in_(reply_ids))
+            ).all())
+
+        author_ids = {reply.user_id for reply in replies}
+        authors = {user.id: user for user in User.query.filter(User.id.in_(author_ids))}
+
+        return [{
+            'id': reply.id,
+            'text': reply.reply,
+            'authorId': reply.user_id,
+            'author': authors[reply.user_id].serialized_min,
+            'postId': reply.post_id,
+            'timestamp': reply.date_created.strftime('%Y-%m-%d %H:%M:%S'),
+            'score': reply.score,
+            'upvotes': reply.upvotes,
+            'downvotes': reply.downvotes,
+            'userVote': user_votes.get(reply.id, 0)
+        } for reply in replies]
 
     @staticmethod
     def get_by_id(reply_id):
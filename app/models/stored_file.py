@@ -0,0 +1,67 @@
+import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+
+class StoredFile(db.Model):
+    """
+    Model that represents a content-addressed object in S3, with the number of files referencing it.
+    The object is uploaded once for the first reference, and deleted with the last one.
+    """
+    __tablename__ = "stored_files"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(255), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=1)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StoredFile (id='{self.id}', key='{self.key}', ref_count='{self.ref_count}')>"
+
+    def __init__(self, key: str, size: int, content_type: str = None):
+        self.key = key
+        self.size = size
+        self.content_type = content_type
+
+    @staticmethod
+    def add_reference(key: str) -> bool:
+        """
+        Reference the object stored under a key, if any.
+        :param key
+        :return: True if the object is stored, False if it must be uploaded first
+        """
+        result = db.session.execute(update(StoredFile).where(StoredFile.key == key)
+                                    .values(ref_count=StoredFile.ref_count + 1),
+                                    execution_options={'synchronize_session': False})
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def create(key: str, size: int, content_type: str = None):
+        """
+        Record the first reference to a newly uploaded object. If the same content was recorded
+        concurrently, it is referenced instead.
+        :param key
+        :param size
+        :param content_type
+        """
+        db.session.add(StoredFile(key, size, content_type))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            StoredFile.add_reference(key)
+
+    @staticmethod
+    def get_by_key(key):
+        """
+        Filter a stored file by S3 key
+        :param key
+        :return: StoredFile or None
+        """
+        return StoredFile.query.filter_by(key=key).first()
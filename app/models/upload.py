@@ -0,0 +1,63 @@
+import datetime
+
+from app import db
+from app.upload.files import File, FilePurpose
+
+
+class Upload(db.Model):
+    """
+    Model that represents a file uploaded directly to S3 with a presigned request, recorded once completed
+    """
+    __tablename__ = "uploads"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False, unique=True)
+    purpose = db.Column(db.Enum(FilePurpose), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(255), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Upload (id='{self.id}', key='{self.key}')>"
+
+    def __init__(self, key: str, purpose: FilePurpose, filename: str, size: int, content_type: str, user_id: int):
+        self.key = key
+        self.purpose = purpose
+        self.filename = filename
+        self.size = size
+        self.content_type = content_type
+        self.user_id = user_id
+
+    def save(self):
+        """
+        Persist the upload in the database
+        :return
+        """
+        db.session.add(self)
+        db.session.commit()
+
+    @property
+    def url(self):
+        return File.get(self.filename, self.purpose, self.user_id)
+
+    @property
+    def serialized(self):
+        return {
+            'key': self.key,
+            'purpose': self.purpose.value,
+            'filename': self.filename,
+            'size': self.size,
+            'contentType': self.content_type,
+            'url': self.url
+        }
+
+    @staticmethod
+    def get_by_key(key):
+        """
+        Filter an upload by S3 key
+        :param key
+        :return: Upload or None
+        """
+        return Upload.query.filter_by(key=key).first()
@@ -3,7 +3,8 @@ from typing import Union
 
 from flask_login import UserMixin
 from passlib.hash import bcrypt
-from sqlalchemy import func
+from sqlalchemy import func, update
+from sqlalchemy.orm import validates
 
 from app import db, login_manager
 from app.models.post import Post
@@ -12,6 +13,7 @@ from app.models.post_vote import PostVote
 from app.models.reply import ReplyVote
 from app.models.message import Message
 from app.upload.files import ProfileFile, FilePurpose
+from app.upload.images import PFP_FORMAT, PFP_SIZES
 
 
 class User(db.Model, UserMixin):
@@ -23,6 +25,7 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     username = db.Column(db.String(255), unique=True, nullable=False)
+    username_lower = db.Column(db.String(255), index=True, nullable=True)
     password = db.Column(db.String(255), nullable=True)
     answered = db.Column(db.Integer, nullable=False, default=0)
     credits = db.Column(db.Integer, nullable=False, default=10)
@@ -50,6 +53,14 @@ class User(db.Model, UserMixin):
         self.password = password
         self.verified = verified
 
+    @validates('username')
+    def validate_username(self, key, username):
+        """
+        Keep the normalized username used for case-insensitive lookups in sync with the username
+        """
+        self.username_lower = username.lower() if username else None
+        return username
+
     def save(self):
         """
         Persist the user in the database
@@ -60,9 +71,19 @@ class User(db.Model, UserMixin):
 
     @property
     def pfp(self):
+        return self.pfp_variants[max(PFP_SIZES)]
+
+    @property
+    def pfp_variants(self):
+        """
+        URLs of the profile picture by size in pixels. Profile pictures uploaded before variants
+        were introduced, and the default one, have the same URL at every size.
+        """
         if not self.pfp_file_name:
-            return '/static/assets/default-pfp.jpg'
-        return ProfileFile.get(self.pfp_file_name, FilePurpose.PROFILE_PICTURE, self.id)
+            return dict.fromkeys(PFP_SIZES, '/static/assets/default-pfp.jpg')
+        if not self.pfp_file_name.endswith(f'.{PFP_FORMAT.lower()}'):
+            return dict.fromkeys(PFP_SIZES, ProfileFile.get(self.pfp_file_name, FilePurpose.PROFILE_PICTURE, self.id))
+        return ProfileFile.get_variants(self.pfp_file_name, self.id)
 
     @property
     def serialized(self):
@@ -73,7 +94,17 @@ class User(db.Model, UserMixin):
             "dateCreated": self.date_created.strftime('%Y-%m-%d %H:%M:%S'),
             'answered': self.answered,
             'credits': self.credits,
-            'pfp': self.pfp
+            'pfp': self.pfp,
+            'pfpVariants': self.pfp_variants
+        }
+
+    @property
+    def serialized_min(self):
+        return {
+            "id": self.id,
+            "username": self.username,
+            'pfp': self.pfp,
+            'pfpVariants': self.pfp_variants
         }
 
     @staticmethod
@@ -83,7 +114,7 @@ class User(db.Model, UserMixin):
         Loader used to reload the user object from the user ID stored in the session.
         https://flask-login.readthedocs.io/en/latest/#how-it-works
         """
-        return User.query.get(user_id)
+        return db.session.get(User, int(user_id))
 
     @staticmethod
     def get_by_id(user_id):
@@ -92,7 +123,8 @@ class User(db.Model, UserMixin):
         :param user_id
         :return: User or None
         """
-        return User.query.filter_by(id=user_id).first()
+        # Looked up through the identity map, so the user loaded for the request is not queried again
+        return db.session.get(User, user_id)
 
     @staticmethod
     def get_by_email(email):
@@ -110,7 +142,36 @@ class User(db.Model, UserMixin):
         :param username:
         :return: User or None
         """
-        return User.query.filter(func.lower(User.username) == func.lower(username)).first()
+        return User.query.filter_by(username_lower=username.lower()).first()
+
+    @staticmethod
+    def autocomplete(prefix, limit):
+        """
+        Find users whose username starts with the prefix, ignoring case.
+        Written as a range over the normalized username so it is served by its index.
+        :param prefix: The start of the username
+        :param limit: The maximum number of users to return
+        :return: List of users ordered by username
+        """
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return User.query.filter(User.username_lower >= prefix, User.username_lower < upper_bound) \
+            .order_by(User.username_lower).limit(limit).all()
+
+    @staticmethod
+    def backfill_username_lower():
+        """
+        Populate the normalized username of users created before it was maintained
+        :return: The number of users updated
+        """
+        result = db.session.execute(
+            update(User).where(User.username_lower.is_(None)).values(username_lower=func.lower(User.username)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return result.rowcount
 
     def reset_password(self, new_password):
         """
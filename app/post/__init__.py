@@ -1,6 +1,6 @@
 from flask import Blueprint
 
 post_blueprint = Blueprint("post", __name__)
-post_api_blueprint = Blueprint('post_api', __name__, url_prefix='/api/v1/posts')
+post_api_blueprint = Blueprint('post_api', __name__, url_prefix='/api/v1/posts', cli_group='posts')
 
-from app.post import routes, api
+from app.post import routes, api, commands
@@ -1,15 +1,17 @@
 from datetime import datetime
 from typing import List, Tuple
 
-from flask import jsonify, Response, request
+from flask import current_app, jsonify, Response, request
 from flask_login import current_user, login_required
 from sqlalchemy import desc, func
 
 from app import db
 from app.exceptions import Unauthorized, NotFound, BadRequest
-from app.models import Post, PostVote, Subject, Reply
-from app.post import post_api_blueprint
-from app.upload.files import PostAttachment
+from app.models import Post, PostVote, Subject, Reply, Upload
+from app.post import post_api_blueprint, search_service
+from app.shared.pagination import keyset_page, page_size
+from app.upload import tasks, upload_services
+from app.upload.files import File, FilePurpose, PostAttachment
 
 
 @post_api_blueprint.route('/create', methods=['POST', 'GET'])
@@ -19,7 +21,7 @@ def create_post() -> Response:
     Create a new post.
 
     :return: JSON representation of the created post data.
-    :raises BadRequest: If the request does not contain title or body.
+    :raises BadRequest: If the request does not contain title or body, or the attachment could not be uploaded.
     """
     title = request.form.get('title')
     if not title:
@@ -34,24 +36,63 @@ def create_post() -> Response:
         raise BadRequest(message='Invalid post subject')
 
     attachment = request.files.get('file', None)
+    attachment_key = request.form.get('attachmentKey')
     filename = None
-    if attachment:
+    pending = False
+    stored = False
+    if attachment_key:
+        # The attachment was uploaded directly to S3 with a presigned request
+        upload = Upload.get_by_key(attachment_key)
+        if not upload or upload.user_id != current_user.id or upload.purpose != FilePurpose.POST_ATTACHMENT:
+            raise BadRequest(message='Invalid attachment upload')
+        # The upload is deleted with its post, so it cannot be shared by several posts
+        if Post.query.filter_by(attachment_name=upload.filename).first():
+            raise BadRequest(message='Attachment upload is already used')
+        filename = upload.filename
+    elif attachment:
         image = PostAttachment(attachment, current_user.id)
-        image.upload()
         filename = image.filename
-
-    post = Post(title=title, post=body, subject=Subject(subject), user_id=current_user.id, attachment_name=filename)
-    post.save()
+        pending = current_app.config['UPLOAD_IN_BACKGROUND']
+        if pending:
+            path = tasks.spool(image)
+        elif image.upload():
+            stored = True
+        else:
+            raise BadRequest(message='Could not upload the attachment')
+
+    post = Post(title=title, post=body, subject=Subject(subject), user_id=current_user.id, attachment_name=filename,
+                attachment_pending=pending)
+    try:
+        post.save()
+    except Exception:
+        db.session.rollback()
+        if stored:
+            # The stored attachment took a reference which no post holds
+            File.release(filename, FilePurpose.POST_ATTACHMENT)
+        raise
+    if pending:
+        tasks.upload_post_attachment_later(post.id, path, image.file_data.content_type)
 
     return jsonify(post.serialized)
 
 
 @post_api_blueprint.route('/search')
 def search_post() -> Response:
+    """
+    Full-text search over post titles and bodies, ranked by relevance.
+
+    :return: JSON containing a page of matching posts and the cursor of the next page.
+    """
     query = request.args.get('query')
-    limit = request.args.get('limit', type=int, default=5)
-    posts: List[Post] = Post.query.filter(Post.title.ilike(f'%{query}%')).limit(limit).all()
-    return jsonify([post.serialized for post in posts])
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int), default=5)
+    subjects = request.args.get('subjects')
+
+    if subjects:
+        subjects = [subject for subject in map(str.upper, subjects.split(',')) if Subject.has_key(subject)]
+
+    posts, next_cursor = search_service.search_posts(query, limit, subjects, cursor)
+    return jsonify({'posts': Post.serialize_all(posts), 'nextCursor': next_cursor})
 
 
 @post_api_blueprint.route('/<int:post_id>')
@@ -81,7 +122,45 @@ def get_post_replies(post_id: int) -> Response:
     if not post:
         raise NotFound(message='Post not found')
 
-    return jsonify([reply.serialized for reply in post.replies])
+    return jsonify(Reply.serialize_all(post.replies.all()))
+
+
+@post_api_blueprint.route('/<int:post_id>/thread')
+def get_post_thread(post_id: int) -> Response:
+    """
+    Get a post with a page of its replies, newest first, and the reply which resolved it, in one response.
+    Authors are embedded and votes are fetched with grouped queries. The response carries an ETag,
+    so clients revalidating an unchanged thread get an empty 304 response.
+
+    :param post_id: The ID of the post to retrieve.
+    :return: JSON containing the post, a page of replies, the resolving reply and the cursor of the next page.
+    :raises NotFound: If the post does not exist.
+    """
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int), default=20)
+
+    post = Post.get_by_id(post_id)
+    if not post:
+        raise NotFound(message='Post not found')
+
+    replies, next_cursor = keyset_page(post.replies, Reply.date_created, Reply.id, cursor, limit)
+    # The resolving reply is serialized with the page, even when it is not on the page
+    extra_replies = []
+    if post.resolved_by_id and post.resolved_by_id not in {reply.id for reply in replies}:
+        extra_replies = [reply for reply in [Reply.get_by_id(post.resolved_by_id)] if reply]
+
+    serialized = Reply.serialize_all(replies + extra_replies)
+    response = jsonify({
+        'post': post.serialized,
+        'replies': serialized[:len(replies)],
+        'resolvedReply': next((reply for reply in serialized if reply['id'] == post.resolved_by_id), None),
+        'nextCursor': next_cursor
+    })
+    # Votes of the current user are part of the thread, so shared caches must not store it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @post_api_blueprint.route('/<int:post_id>/upvote', methods=['POST', 'GET'])
@@ -98,13 +177,16 @@ def upvote_post(post_id: int) -> Response:
         raise NotFound(message='Post not found')
 
     post_vote = PostVote.query.filter_by(user_id=current_user.id, post_id=post_id).first()
+    old_vote = 0
     if post_vote is None:
         post_vote = PostVote(vote=1, user_id=current_user.id, post_id=post_id)
-    elif post_vote.vote == -1 or post_vote.vote == 0:
-        post_vote.vote = 1
     else:
-        post_vote.vote = 0
-    post_vote.save()
+        old_vote = post_vote.vote
+        post_vote.vote = 0 if old_vote == 1 else 1
+
+    db.session.add(post_vote)
+    post.update_vote_tally(old_vote, post_vote.vote)
+    db.session.commit()
 
     return jsonify(post.serialized)
 
@@ -123,13 +205,16 @@ def downvote_post(post_id: int) -> Response:
         raise NotFound(message='Post not found')
 
     post_vote = PostVote.query.filter_by(user_id=current_user.id, post_id=post_id).first()
+    old_vote = 0
     if post_vote is None:
         post_vote = PostVote(vote=-1, user_id=current_user.id, post_id=post_id)
-    elif post_vote.vote == 1 or post_vote.vote == 0:
-        post_vote.vote = -1
     else:
-        post_vote.vote = 0
-    post_vote.save()
+        old_vote = post_vote.vote
+        post_vote.vote = 0 if old_vote == -1 else -1
+
+    db.session.add(post_vote)
+    post.update_vote_tally(old_vote, post_vote.vote)
+    db.session.commit()
 
     return jsonify(post.serialized)
 
@@ -149,23 +234,33 @@ def delete_post(post_id: int) -> tuple[Response, int]:
     if post.user_id != current_user.id:
         raise Unauthorized(message="Cannot delete other people's posts")
 
+    # A pending attachment is released by its upload task, which finds the post deleted
+    attachment_name = None if post.attachment_pending else post.attachment_name
+    user_id = post.user_id
     db.session.delete(post)
     db.session.commit()
+    # Content-addressed attachments are released, and attachments uploaded with a presigned request deleted
+    File.release(attachment_name, FilePurpose.POST_ATTACHMENT)
+    upload_services.delete_upload(FilePurpose.POST_ATTACHMENT, user_id, attachment_name)
 
     return jsonify({'message': 'Post deleted'}), 200
 
 @post_api_blueprint.route('/user', methods=['GET'])
 def get_user_posts():
-    page = int(request.args.get('page', 1))
-    limit = int(request.args.get('limit', 10))
-    user_id = int(request.args.get('id'))
+    """
+    Get the posts of a user, newest first, using cursor pagination.
 
-    start_index = (page - 1) * limit
-    end_index = start_index + limit
+    :return: JSON containing a page of posts and the cursor of the next page.
+    """
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int))
+    user_id = request.args.get('id', type=int)
+    if not user_id:
+        raise BadRequest(message='User ID not specified')
 
-    posts = Post.query.filter_by(user_id=user_id).order_by(Post.date_created.desc()).slice(start_index, end_index).all()
-    serialized_posts = [post.serialized for post in posts]
-    return jsonify(serialized_posts), 200
+    query = Post.query.filter_by(user_id=user_id)
+    posts, next_cursor = keyset_page(query, Post.date_created, Post.id, cursor, limit)
+    return jsonify({'posts': Post.serialize_all(posts), 'nextCursor': next_cursor}), 200
 
 
 @post_api_blueprint.route('<int:post_id>/resolve', methods=['POST', 'GET'])
@@ -199,11 +294,15 @@ def resolve(post_id: int):
 
 @post_api_blueprint.route('/all', methods=['GET'])
 def get_posts():
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
+    """
+    Get the latest posts, optionally filtered by subjects, using cursor pagination.
+
+    :return: JSON containing a page of posts and the cursor of the next page.
+    """
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int))
     before = request.args.get('before', type=int)
     subjects = request.args.get('subjects')
-    sort_by = request.args.get('sort', 'latest').lower()
 
     if subjects:
         subjects = list(map(str.upper, subjects.split(',')))
@@ -217,9 +316,5 @@ def get_posts():
     if before:
         query = query.filter(Post.date_created < datetime.fromtimestamp(before))
 
-    if sort_by == 'latest':
-        query = query.order_by(Post.date_created.desc())
-
-    posts = query.paginate(page=page, per_page=limit).items
-    serialized_posts = [post.serialized for post in posts]
-    return jsonify(serialized_posts), 200
+    posts, next_cursor = keyset_page(query, Post.date_created, Post.id, cursor, limit)
+    return jsonify({'posts': Post.serialize_all(posts), 'nextCursor': next_cursor}), 200
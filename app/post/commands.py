@@ -0,0 +1,37 @@
+import click
+from flask import current_app
+
+from app.models import Post, Reply
+from app.post import post_api_blueprint, search_service
+from app.upload import tasks
+
+
+@post_api_blueprint.cli.command('reconcile-votes')
+def reconcile_votes():
+    """
+    Recompute the stored vote tallies of all posts and replies from their vote rows.
+    Used to backfill the counters and to repair any drift.
+    """
+    posts = Post.reconcile_vote_tallies()
+    replies = Reply.reconcile_vote_tallies()
+    click.echo(f'Reconciled vote tallies for {posts} posts and {replies} replies')
+
+
+@post_api_blueprint.cli.command('reindex-search')
+def reindex_search():
+    """
+    Create the post full-text search index if needed and rebuild it from the posts table.
+    """
+    search_service.rebuild_index()
+    click.echo('Rebuilt the post search index')
+
+
+@post_api_blueprint.cli.command('recover-attachments')
+def recover_attachments():
+    """
+    Resume the background attachment uploads interrupted by stopped workers, and drop the attachments
+    which cannot be resumed. Run when starting the workers, such as when deploying.
+    """
+    resumed, dropped = tasks.recover_pending_attachments(current_app._get_current_object(),
+                                                         current_app.config['UPLOAD_SPOOL_MAX_AGE'])
+    click.echo(f'Resumed {resumed} attachment uploads and dropped {dropped} attachments')
@@ -1,10 +1,11 @@
 import bleach
-from flask import render_template, url_for, redirect
+from flask import current_app, render_template, url_for, redirect
 from flask_login import login_required, current_user
 
 from app.models import Post, Subject
 from app.post import post_blueprint
 from app.post.forms import CreatePostForm
+from app.upload import tasks
 from app.upload.files import PostAttachment
 
 
@@ -27,13 +28,21 @@ def create_post():
         attachment = form.attachment.data
 
         filename = None
+        pending = False
         if attachment:
             image = PostAttachment(attachment, current_user.id)
-            image.upload()
             filename = image.filename
-
-        post = Post(title=title, post=body, subject=Subject(subject), user_id=current_user.id, attachment_name=filename)
+            pending = current_app.config['UPLOAD_IN_BACKGROUND']
+            if pending:
+                path = tasks.spool(image)
+            else:
+                image.upload()
+
+        post = Post(title=title, post=body, subject=Subject(subject), user_id=current_user.id, attachment_name=filename,
+                    attachment_pending=pending)
         post.save()
+        if pending:
+            tasks.upload_post_attachment_later(post.id, path, image.file_data.content_type)
 
         return redirect(url_for('post.view_post', post_id=post.id))
 
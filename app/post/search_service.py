@@ -0,0 +1,123 @@
+import re
+from typing import List, Tuple, Union
+
+from sqlalchemy import DDL, and_, event, func, literal_column, or_, select, table, column, text
+from sqlalchemy.dialects.mysql import match as mysql_match
+
+from app import db
+from app.models import Post
+from app.shared.pagination import decode_rank_cursor, encode_rank_cursor
+
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# SQLite keeps the full-text index in an external content FTS5 table which mirrors the title and body
+# columns of the posts table. Triggers keep it in sync as posts are created, edited and deleted.
+# MySQL uses a native FULLTEXT index declared on the Post model instead, which InnoDB maintains itself.
+SQLITE_CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+    "title, post, content='posts', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, title, post) VALUES (new.id, new.title, new.post); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, post) VALUES ('delete', old.id, old.title, old.post); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, post ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, post) VALUES ('delete', old.id, old.title, old.post); "
+    "INSERT INTO posts_fts(rowid, title, post) VALUES (new.id, new.title, new.post); END",
+]
+SQLITE_DROP_INDEX = "DROP TABLE IF EXISTS posts_fts"
+
+for statement in SQLITE_CREATE_INDEX:
+    event.listen(Post.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Post.__table__, 'before_drop', DDL(SQLITE_DROP_INDEX).execute_if(dialect='sqlite'))
+
+posts_fts = table('posts_fts', column('rowid'))
+
+
+def rebuild_index() -> None:
+    """
+    Create the full-text index if it is missing and rebuild its contents from the posts table.
+    Used to index posts created before the search index existed.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        for statement in SQLITE_CREATE_INDEX:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    elif db.engine.dialect.name == 'mysql':
+        index_exists = db.session.execute(
+            text("SHOW INDEX FROM posts WHERE Key_name = 'ft_posts_title_post'")
+        ).first()
+        if not index_exists:
+            db.session.execute(text("ALTER TABLE posts ADD FULLTEXT INDEX ft_posts_title_post (title, post)"))
+    db.session.commit()
+
+
+def _tokenize(query: str) -> List[str]:
+    return re.findall(r'\w+', query.lower())
+
+
+def _ranked_matches(terms: List[str]):
+    """
+    Build a query selecting the ID and rank of every post matching all the search terms.
+    A lower rank is a better match, regardless of the database backend.
+    """
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        # Quote every term so user input cannot inject FTS5 syntax, and prefix match them for search-as-you-type
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column('posts_fts'), TITLE_WEIGHT, BODY_WEIGHT)
+        return select(Post.id.label('id'), rank.label('rank')) \
+            .select_from(posts_fts.join(Post.__table__, posts_fts.c.rowid == Post.id)) \
+            .where(literal_column('posts_fts').op('MATCH')(match))
+
+    if dialect == 'mysql':
+        match = ' '.join(f'+{term}*' for term in terms)
+        relevance = mysql_match(Post.title, Post.post, against=match).in_boolean_mode()
+        return select(Post.id.label('id'), (-relevance).label('rank')).where(relevance > 0)
+
+    # Backends without a full-text index fall back to substring matching ordered by recency
+    conditions = [or_(Post.title.ilike(f'%{term}%'), Post.post.ilike(f'%{term}%')) for term in terms]
+    return select(Post.id.label('id'), (-Post.id).label('rank')).where(and_(*conditions))
+
+
+def search_posts(query: str, limit: int, subjects: List[str] = None,
+                 cursor: str = None) -> Tuple[List[Post], Union[str, None]]:
+    """
+    Search posts by title and body, best matches first.
+
+    :param query: The search query entered by the user.
+    :type query: str
+    :param limit: The maximum number of posts to return.
+    :type limit: int
+    :param subjects: Only return posts of these subject names if specified.
+    :type subjects: List[str]
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :return: The matching posts of the page and the cursor of the next page, or None if there are no more matches.
+    :rtype: Tuple[List[Post], str | None]
+    """
+    terms = _tokenize(query or '')
+    if not terms:
+        return [], None
+
+    matches = _ranked_matches(terms)
+    if subjects:
+        matches = matches.where(Post.subject.in_(subjects))
+    matches = matches.subquery()
+
+    statement = select(Post, matches.c.rank).join(matches, matches.c.id == Post.id)
+    if cursor:
+        rank, post_id = decode_rank_cursor(cursor)
+        statement = statement.where(or_(
+            matches.c.rank > rank,
+            and_(matches.c.rank == rank, matches.c.id > post_id)
+        ))
+
+    rows = db.session.execute(statement.order_by(matches.c.rank, matches.c.id).limit(limit + 1)).all()
+    posts = [post for post, _ in rows[:limit]]
+    if len(rows) <= limit:
+        return posts, None
+
+    last_post, last_rank = rows[limit - 1]
+    return posts, encode_rank_cursor(last_rank, last_post.id)
@@ -64,13 +64,16 @@ def upvote_reply(reply_id: int) -> Response:
         raise NotFound(message='Reply not found')
 
     reply_vote = ReplyVote.query.filter_by(user_id=current_user.id, reply_id=reply_id).first()
+    old_vote = 0
     if reply_vote is None:
         reply_vote = ReplyVote(vote=1, user_id=current_user.id, reply_id=reply_id)
-    elif reply_vote.vote == -1 or reply_vote.vote == 0:
-        reply_vote.vote = 1
     else:
-        reply_vote.vote = 0
-    reply_vote.save()
+        old_vote = reply_vote.vote
+        reply_vote.vote = 0 if old_vote == 1 else 1
+
+    db.session.add(reply_vote)
+    reply.update_vote_tally(old_vote, reply_vote.vote)
+    db.session.commit()
 
     return jsonify(reply.serialized)
 
@@ -89,13 +92,16 @@ def downvote_reply(reply_id: int) -> Response:
         raise NotFound(message='Reply not found')
 
     reply_vote = ReplyVote.query.filter_by(user_id=current_user.id, reply_id=reply_id).first()
+    old_vote = 0
     if reply_vote is None:
         reply_vote = ReplyVote(vote=-1, user_id=current_user.id, reply_id=reply_id)
-    elif reply_vote.vote == 1 or reply_vote.vote == 0:
-        reply_vote.vote = -1
     else:
-        reply_vote.vote = 0
-    reply_vote.save()
+        old_vote = reply_vote.vote
+        reply_vote.vote = 0 if old_vote == -1 else -1
+
+    db.session.add(reply_vote)
+    reply.update_vote_tally(old_vote, reply_vote.vote)
+    db.session.commit()
 
     return jsonify(reply.serialized)
 
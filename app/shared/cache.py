@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    Thread safe in-process cache which evicts entries once they are older than the TTL,
+    or the least recently used entry once it holds more than maxsize entries.
+
+    Every worker process has its own cache, so the TTL bounds how long a worker may serve
+    a value that was changed by another worker.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the value cached for a key.
+
+        :param key: The key of the entry.
+        :type key: Hashable
+        :param default: The value returned if the key is not cached or has expired.
+        :type default: Any
+        :return: The cached value, or the default.
+        :rtype: Any
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at <= self.timer():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Cache a value for a key, evicting the least recently used entry if the cache is full.
+
+        :param key: The key of the entry.
+        :type key: Hashable
+        :param value: The value to cache.
+        :type value: Any
+        """
+        with self._lock:
+            self._entries[key] = (value, self.timer() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """
+        Remove the entry of a key if it is cached.
+
+        :param key: The key of the entry.
+        :type key: Hashable
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
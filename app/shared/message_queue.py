@@ -0,0 +1,73 @@
+import queue
+import threading
+from collections import defaultdict
+from typing import Union
+
+import socketio
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager which fans events out between servers living in the same process.
+
+    Every manager subscribed to a channel receives the events published on it by the others,
+    exactly like the Redis backend does across processes. This makes it a stand-in for tests
+    and single process deployments running several Socket.IO servers side by side.
+    """
+    name = 'local'
+
+    _lock = threading.Lock()
+    _subscribers = defaultdict(list)
+
+    def __init__(self, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = queue.Queue()
+        if not write_only:
+            with LocalPubSubManager._lock:
+                LocalPubSubManager._subscribers[channel].append(self.queue)
+
+    def _publish(self, data):
+        with LocalPubSubManager._lock:
+            subscribers = list(LocalPubSubManager._subscribers[self.channel])
+        for subscriber in subscribers:
+            subscriber.put(data)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+    def close(self):
+        """
+        Stop receiving the events published on the channel.
+        """
+        with LocalPubSubManager._lock:
+            subscribers = LocalPubSubManager._subscribers[self.channel]
+            if self.queue in subscribers:
+                subscribers.remove(self.queue)
+
+
+def create_client_manager(url: Union[str, None], channel: str,
+                          write_only: bool = False) -> Union[socketio.Manager, None]:
+    """
+    Create the Socket.IO client manager used to share events between workers.
+
+    :param url: The message queue URL, for instance redis://localhost:6379/0 or local://.
+                Any other scheme is handed to Kombu, which supports AMQP brokers among others.
+    :type url: str | None
+    :param channel: The name of the channel the workers publish their events on.
+    :type channel: str
+    :param write_only: Only emit events, used by processes that do not serve Socket.IO clients.
+    :type write_only: bool
+    :return: The client manager, or None to keep the default manager of a single worker.
+    :rtype: socketio.Manager | None
+    """
+    if not url:
+        return None
+
+    if url.startswith('local://'):
+        return LocalPubSubManager(channel=channel, write_only=write_only)
+
+    if url.startswith(('redis://', 'rediss://')):
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+
+    return socketio.KombuManager(url, channel=channel, write_only=write_only)
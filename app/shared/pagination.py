@@ -0,0 +1,138 @@
+import base64
+import binascii
+import datetime
+from typing import Tuple, Union, List
+
+from sqlalchemy import and_, or_
+
+from app.exceptions import BadRequest
+
+MAX_PAGE_SIZE = 100
+
+
+def _pack(value: str, row_id: int) -> str:
+    raw = f'{value}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unpack(cursor: str, id_type: type = int) -> Tuple[str, Union[int, str]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, row_id = raw.rsplit('|', 1)
+        return value, id_type(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest(message='Invalid cursor')
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: Union[int, str]) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor string.
+
+    :param timestamp: The timestamp of the last row.
+    :type timestamp: datetime.datetime
+    :param row_id: The ID of the last row, used to break ties between equal timestamps.
+    :type row_id: int | str
+    :return: URL safe cursor string.
+    :rtype: str
+    """
+    return _pack(timestamp.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str, id_type: type = int) -> Tuple[datetime.datetime, Union[int, str]]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    :param cursor: The cursor string.
+    :type cursor: str
+    :param id_type: The Python type of the IDs of the paginated table.
+    :type id_type: type
+    :return: The timestamp and ID the cursor points at.
+    :rtype: Tuple[datetime.datetime, int | str]
+    :raises BadRequest: If the cursor is malformed.
+    """
+    timestamp, row_id = _unpack(cursor, id_type)
+    try:
+        return datetime.datetime.fromisoformat(timestamp), row_id
+    except ValueError:
+        raise BadRequest(message='Invalid cursor')
+
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """
+    Encode the relevance rank and ID of the last row of a ranked page into an opaque cursor string.
+
+    :param rank: The rank of the last row.
+    :type rank: float
+    :param row_id: The ID of the last row, used to break ties between equal ranks.
+    :type row_id: int
+    :return: URL safe cursor string.
+    :rtype: str
+    """
+    return _pack(repr(float(rank)), row_id)
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    Decode a cursor produced by encode_rank_cursor.
+
+    :param cursor: The cursor string.
+    :type cursor: str
+    :return: The rank and ID the cursor points at.
+    :rtype: Tuple[float, int]
+    :raises BadRequest: If the cursor is malformed.
+    """
+    rank, row_id = _unpack(cursor)
+    try:
+        return float(rank), row_id
+    except ValueError:
+        raise BadRequest(message='Invalid cursor')
+
+
+def page_size(limit: int, default: int = 10, maximum: int = MAX_PAGE_SIZE) -> int:
+    """
+    Clamp a requested page size to a sane range.
+
+    :param limit: The requested page size, or None.
+    :type limit: int
+    :param default: The page size used when none was requested, or a page size below 1 was.
+    :type default: int
+    :param maximum: The largest page size allowed.
+    :type maximum: int
+    :return: The page size to use.
+    :rtype: int
+    """
+    if not limit or limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def keyset_page(query, timestamp_column, id_column, cursor: Union[str, None], limit: int) -> Tuple[List, Union[str, None]]:
+    """
+    Fetch one page of a query in descending (timestamp, id) order using keyset pagination.
+    Rows are located by seeking past the cursor instead of using OFFSET, so every page
+    costs the same as the first one given an index on (timestamp, id).
+
+    :param query: The query to paginate, without any ordering applied.
+    :param timestamp_column: The timestamp column to sort on.
+    :param id_column: The primary key column used as a tie-breaker.
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of rows to return.
+    :type limit: int
+    :return: The rows of the page and the cursor of the next page, or None if there are no more rows.
+    :rtype: Tuple[List, str | None]
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor, id_column.type.python_type)
+        query = query.filter(or_(
+            timestamp_column < timestamp,
+            and_(timestamp_column == timestamp, id_column < row_id)
+        ))
+
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
@@ -13,12 +13,40 @@ $(document).ready(async function () {
     const essays = await Essay.getEssays();
     essays.sort((a, b) => b.timestamp - a.timestamp).forEach(essay => renderEssay(essay));
 
-    document.getElementById('essay-form').onsubmit = () => {
-        document.getElementById('grade-button').classList.add('d-none');
-        document.getElementById('grade-button-loading').classList.remove('d-none');
-    }
+    document.getElementById('essay-form').onsubmit = () => showLoading(true);
+
+    const jobId = new URLSearchParams(window.location.search).get('job');
+    if (jobId) waitForJob(jobId);
 });
 
+function showLoading(loading) {
+    document.getElementById('grade-button').classList.toggle('d-none', loading);
+    document.getElementById('grade-button-loading').classList.toggle('d-none', !loading);
+}
+
+// The essay is graded in the background, so wait for the essay_graded event and poll in case it is missed
+function waitForJob(jobId) {
+    showLoading(true);
+
+    const socket = io.connect(`/essay/socket`, { rememberTransport: false });
+    let poller;
+
+    const onUpdate = job => {
+        if (!job || job.id !== jobId) return;
+        if (job.status === 'DONE') {
+            window.location.href = `/ai/essay/${job.essayId}`;
+        } else if (job.status === 'FAILED') {
+            clearInterval(poller);
+            socket.disconnect();
+            showLoading(false);
+            alert(job.error);
+        }
+    };
+
+    socket.on('essay_graded', onUpdate);
+    poller = setInterval(async () => onUpdate(await Essay.getJob(jobId)), 5000);
+}
+
 function renderEssay(essay) {
     const element = document.createElement('a');
     element.href = `/ai/essay/${essay.id}`;
@@ -20,7 +20,7 @@ const subjects = [
 const selectedSubjects = new Set();
 selectedSubjects.add('all subjects');
 
-let currentPage = 1;
+let nextCursor = null;
 const postsPerPage = 2;
 let loading = false, reachedEnd = false, timestamp = moment();
 
@@ -35,15 +35,16 @@ async function fetchPosts() {
     loading = true;
     document.getElementById('loading-spinner').classList.remove('d-none');
 
-    const posts = await Post.getPosts(currentPage, postsPerPage, timestamp, selectedSubjects);
+    const page = await Post.getPosts(nextCursor, postsPerPage, timestamp, selectedSubjects);
     const postsContainer = document.getElementById('posts-container');
 
-    if (posts.length > 0) {
-        posts.forEach(post => {
-            const postElement = createPostCard(post);
-            postsContainer.appendChild(postElement);
-        });
-    } else reachedEnd = true;
+    page.posts.forEach(post => {
+        const postElement = createPostCard(post);
+        postsContainer.appendChild(postElement);
+    });
+
+    nextCursor = page.nextCursor;
+    if (!nextCursor) reachedEnd = true;
 
     loading = false;
     document.getElementById('loading-spinner').classList.add('d-none');
@@ -54,7 +55,7 @@ function createPostCard(post) {
     postCard.className = `card post-card w-100 shadow-xss rounded-xxl border-0 p-4 mb-3`;
     postCard.innerHTML = DOMPurify.sanitize(
         `<div class="card-body p-0 d-flex">
-            <a href="/users/${post.author.username}"><figure class="avatar me-3"><img src=${post.author.pfp} alt="avater" class="shadow-sm rounded-circle w45"></figure></a>
+            <a href="/users/${post.author.username}"><figure class="avatar me-3"><img src=${post.author.avatar(64)} alt="avater" class="shadow-sm rounded-circle w45"></figure></a>
             <div><h4 class="fw-700 text-grey-900 font-xssss mt-1"> ${post.author.username} <span class="d-block font-xssss fw-500 mt-1 lh-3 text-grey-500"> ${post.timestamp.fromNow()}</span></h4></div>
             <div class="ms-auto pointer d-flex align-items-center">
                 ${post.resolvedBy ? `<div class="rounded-pill bg-success text-white px-4 py-2 me-3 font-xssss">Solved</div>` : ``}
@@ -118,7 +119,6 @@ function createPostCard(post) {
 async function handleScroll() {
     const {scrollTop, scrollHeight, clientHeight} = document.documentElement;
     if (!loading && !reachedEnd && scrollTop + clientHeight >= scrollHeight - 200) {
-        currentPage += 1;
         await fetchPosts();
     }
 }
@@ -150,7 +150,7 @@ function createSubjectButtons() {
             else selectedSubjects.delete(subjectName);
 
             document.getElementById('posts-container').innerHTML = '';
-            currentPage = 1;
+            nextCursor = null;
             timestamp = moment();
             reachedEnd = false;
             await fetchPosts();
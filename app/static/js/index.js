@@ -31,7 +31,7 @@ $(document).ready(async function () {
                     <div class="pt-3 pb-0">
                         <h4 class="fw-bold font-xs">${post.title}</h4>
                         <div class="card-body p-0 d-flex">
-                          <figure class="avatar me-3"><img src=${post.author.pfp} alt="avater" class="shadow-sm rounded-circle w25"></figure>
+                          <figure class="avatar me-3"><img src=${post.author.avatar(64)} alt="avater" class="shadow-sm rounded-circle w25"></figure>
                           <h3 class="fw-600 text-grey-900 font-xsss lh-28">${post.author.username}</h3>
                           <span class="fw-900 font-x mx-2">&#183;</span>
                           <span class="font-xsss fw-500 text-grey-500">${post.timestamp.fromNow()}</span>
@@ -12,23 +12,39 @@ const current = await User.getCurrent();
 
 $(document).ready(async function () {
     const messageInput = document.getElementById('message');
-    let selectedChatItem = null;
+    let selectedChatItem = null, selectedConversation = null, loadingHistory = false;
 
     const chatList = document.getElementById('chat-list');
 
-    const conversations = await Conversation.getAll();
-    for (const conversation of conversations) {
-        console.log(conversation);
-        await conversation.loadHistory();
-        displayConversation(conversation);
+    const conversationList = document.getElementById('conversations');
+    const conversationsPerPage = 20;
+    let conversationCursor = null, loadingConversations = false, reachedLastConversation = false;
+
+    // Conversations are listed from their latest message, so their history is only loaded once opened
+    async function fetchConversations() {
+        loadingConversations = true;
+        const page = await Conversation.getPage(conversationCursor, conversationsPerPage);
+        page.conversations.forEach(conversation => displayConversation(conversation));
+
+        conversationCursor = page.nextCursor;
+        if (!conversationCursor) reachedLastConversation = true;
+        loadingConversations = false;
     }
 
+    conversationList.addEventListener('scroll', async function () {
+        if (!loadingConversations && !reachedLastConversation && this.scrollTop + this.clientHeight >= this.scrollHeight - 100) {
+            await fetchConversations();
+        }
+    });
+
+    await fetchConversations();
+
     const search1 = document.getElementById("search-input1");
     const result1 = document.getElementById("searchResults1");
 
     search1.addEventListener("input", async function () {
         let limit = 0
-        let request = await User.search(search1.value);
+        let request = await User.autocomplete(search1.value);
         let results = []
         if (request === []) {
             return
@@ -65,7 +81,7 @@ $(document).ready(async function () {
     let selectedUsers = [current]
 
     searchGroup.addEventListener("input", async function () {
-        let results = await User.search(searchGroup.value);
+        let results = await User.autocomplete(searchGroup.value);
         results = results.filter(user => selectedUsers.find(u => u.id === user.id) === undefined);
         searchResultGroup.innerHTML = '';
 
@@ -134,6 +150,7 @@ $(document).ready(async function () {
                             <span class="d-block font-xssss fw-500 lh-3 text-grey-500">${latestMessage.content}</span>
                         </div>
                         <span class="ms-auto font-xssss fw-600 text-grey-700">${latestMessage.timestamp.calendar(null, timestampFormat)}</span>
+                        ${conversation.unreadCount ? `<span class="badge rounded-pill bg-primary ms-2 align-self-center">${conversation.unreadCount}</span>` : ``}
                     </div>
                 </div>` :
                 `<div class="card w-100 border-0 py-2 px-3">
@@ -153,6 +170,7 @@ $(document).ready(async function () {
             if (selectedChatItem) selectedChatItem.classList.remove('selected');
             this.classList.add('selected');
             selectedChatItem = this;
+            selectedConversation = conversation;
 
             document.getElementById('chat-pfp').src = conversation.image;
             document.getElementById('chat-username').innerText = conversation.name;
@@ -168,9 +186,24 @@ $(document).ready(async function () {
     function displayMessages(conversation) {
         const messagesDiv = document.getElementById('messages');
         messagesDiv.innerHTML = ``;
-        conversation.history.forEach(msg => messagesDiv.prepend(renderMessage(msg)))
+        conversation.history.forEach(msg => messagesDiv.appendChild(renderMessage(msg)))
     }
 
+    document.getElementById('chat-wrap').addEventListener('scroll', async function () {
+        if (loadingHistory || !selectedConversation || this.scrollTop > 0) return;
+
+        loadingHistory = true;
+        const conversation = selectedConversation;
+        const olderMessages = await conversation.loadMoreHistory();
+        if (conversation === selectedConversation && olderMessages.length > 0) {
+            const previousHeight = this.scrollHeight;
+            const messagesDiv = document.getElementById('messages');
+            olderMessages.slice().reverse().forEach(msg => messagesDiv.prepend(renderMessage(msg)));
+            this.scrollTop = this.scrollHeight - previousHeight;
+        }
+        loadingHistory = false;
+    });
+
     function renderMessage(message) {
         const div = document.createElement('div');
         div.classList = `message-item ${message.sender.id === current.id ? `outgoing-message` : ``}`;
@@ -246,6 +279,9 @@ $(document).ready(async function () {
 
     socket.on('error', data => console.log(data));
 
-    socket.on('new_conversation', async data => displayConversation(await Conversation.fromJson(data)));
+    socket.on('new_conversation', async data => {
+        socket.emit('join_conversation', {'conversation_id': data.id});
+        displayConversation(await Conversation.fromJson(data));
+    });
 
 });
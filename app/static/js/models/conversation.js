@@ -43,6 +43,7 @@ class Conversation {
         this.users = users;
         this.dateCreated = dateCreated;
         this.history = [];
+        this.historyCursor = null;
         Conversation.#cache.set(id, this);
     }
 
@@ -52,17 +53,22 @@ class Conversation {
      * @returns {Conversation|undefined} - The created Conversation object or undefined if JSON data is invalid
      */
     static async fromJson(json) {
-        const {id, name, description, isGroup, userIds, dateCreated} = json;
+        const {id, name, description, isGroup, userIds, dateCreated, lastMessage, unreadCount} = json;
 
         try {
-            // Get users participating in the conversation
-            const users = await Promise.all(userIds.map(async userId => await User.getById(userId)));
+            // Get users participating in the conversation, using the embedded profiles when available
+            const users = json.users ? json.users.map(user => User.fromJson(user)) :
+                await Promise.all(userIds.map(async userId => await User.getById(userId)));
 
             // Determine the real name based on the conversation type
-            const realName = isGroup ? name : (users[0] === await User.getCurrent() ? users[1].username : users[0].username);
+            const current = await User.getCurrent();
+            const realName = isGroup ? name : (users[0].id === current.id ? users[1].username : users[0].username);
 
             // Create and return a new Conversation object
-            return new Conversation(id, realName, description, isGroup, new Set(users), moment.utc(dateCreated));
+            const conversation = new Conversation(id, realName, description, isGroup, new Set(users), moment.utc(dateCreated));
+            if (lastMessage) conversation.latestMessage = {...lastMessage, timestamp: moment.utc(lastMessage.timestamp)};
+            if (unreadCount !== undefined) conversation.unreadCount = unreadCount;
+            return conversation;
         } catch (error) {
             console.error(`Cannot parse invalid Conversation JSON of ID: ${id}`);
             console.debug(json);
@@ -71,14 +77,24 @@ class Conversation {
     }
 
     /**
-     * Get all conversations
-     * @returns {Array<Conversation>} - An array of Conversation objects
+     * Get a page of conversations, most recently active first
+     * @param {string|null} cursor - The cursor returned with the previous page, or null for the first page
+     * @param {number} limit - The number of conversations to fetch per page
+     * @returns {Promise<{conversations: Array<Conversation>, nextCursor: string|null}>} - A Promise that resolves to
+     *                                                                                     the conversations and the cursor of the next page
      */
-    static async getAll() {
-        const response = await fetch(`/api/v1/conversations/all`);
-        const data = await response.json();
-        const conversations = await Promise.all(data.map(async conversationData => await Conversation.fromJson(conversationData)));
-        return conversations.filter(convo => convo !== undefined);
+    static async getPage(cursor = null, limit = 20) {
+        try {
+            let url = `/api/v1/conversations/all?limit=${limit}`;
+            if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+            const response = await fetch(url);
+            const data = await response.json();
+            const conversations = await Promise.all(data.conversations.map(async conversationData => await Conversation.fromJson(conversationData)));
+            return {conversations: conversations.filter(convo => convo !== undefined), nextCursor: data.nextCursor};
+        } catch (error) {
+            console.error(`Could not fetch conversations with pagination`, error);
+            return {conversations: [], nextCursor: null};
+        }
     }
 
     /**
@@ -117,13 +133,31 @@ class Conversation {
     }
 
     /**
-     * Load the conversation history
+     * Load the most recent page of the conversation history
      */
     async loadHistory() {
-        const response = await fetch(`/api/v1/conversations/history/${this.id}`);
-        const history = await response.json();
+        this.history = await this.#fetchHistory(null);
+    }
+
+    /**
+     * Load the page of messages preceding the loaded history
+     * @returns {Promise<Array<Message>>} - The older messages that were loaded, oldest first
+     */
+    async loadMoreHistory() {
+        if (!this.historyCursor) return [];
+        const messages = await this.#fetchHistory(this.historyCursor);
+        this.history = messages.concat(this.history);
+        return messages;
+    }
+
+    async #fetchHistory(cursor) {
+        let url = `/api/v1/conversations/history/${this.id}`;
+        if (cursor) url += `?cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(url);
+        const data = await response.json();
+        this.historyCursor = data.nextCursor;
 
-        this.history = await Promise.all(history.map(async message => {
+        return await Promise.all(data.messages.map(async message => {
             const {id, senderId, content, timestamp, readUserIds} = message;
             const sender = await User.getById(senderId);
             const readUsers = await Promise.all(readUserIds.map(async userId => await User.getById(userId)));
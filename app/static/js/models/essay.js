@@ -48,11 +48,22 @@ class Essay {
         }
     }
 
-    static async getEssays() {
+    static async getJob(jobId) {
         try {
-            const response = await fetch(`/api/v1/ai/essay/all`);
+            const response = await fetch(`/api/v1/ai/essay/jobs/${jobId}`);
+            return await response.json();
+        } catch (error) {
+            console.error(`Could not retrieve essay job by ID: ${jobId}`);
+            return undefined;
+        }
+    }
+
+    // Only the summary of the most recent essays is fetched, without their content and suggestions
+    static async getEssays(limit = 20) {
+        try {
+            const response = await fetch(`/api/v1/ai/essay/all?summary=true&limit=${limit}`);
             const essayData = await response.json();
-            return await Promise.all(essayData.map(async essay => await Essay.fromJson(essay)));
+            return await Promise.all(essayData.essays.map(async essay => await Essay.fromJson(essay)));
         } catch (error) {
             console.error(`Could not fetch recent essays`);
             return [];
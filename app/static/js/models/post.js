@@ -1,5 +1,6 @@
 import User from './user.js';
 import Reply from "./reply.js";
+import { uploadDirect } from "../utils.js";
 
 class Post {
     static #cache = new Map();
@@ -42,12 +43,20 @@ class Post {
         this._author = author;
     }
 
-    get votes() {
-        return this._votes;
+    get score() {
+        return this._score;
     }
 
-    set votes(votes) {
-        this._votes = votes;
+    set score(score) {
+        this._score = score;
+    }
+
+    get userVote() {
+        return this._userVote;
+    }
+
+    set userVote(userVote) {
+        this._userVote = userVote;
     }
 
     get replyCount() {
@@ -96,15 +105,16 @@ class Post {
      * @returns {Post} - The created Post object.
      */
     static async fromJson(json) {
-        const { id, title, body, subject, authorId, votes, replyCount, attachment, resolvedById, timestamp } = json;
-        const user = await User.getById(authorId);
+        const { id, title, body, subject, authorId, author, score, userVote, replyCount, attachment, resolvedById, timestamp } = json;
+        const user = author ? User.fromJson(author) : await User.getById(authorId);
 
         const post = new Post(id);
         post.title = title;
         post.body = body;
         post.subject = subject;
         post.author = user;
-        post.votes = votes;
+        post.score = score;
+        post.userVote = userVote;
         post.replyCount = replyCount;
         post.attachment = attachment;
         post.timestamp = moment.utc(timestamp);
@@ -126,7 +136,10 @@ class Post {
         formData.append('title', title);
         formData.append('body', body);
         formData.append('subject', subject);
-        if (attachment !== undefined) formData.append('file', attachment);
+        if (attachment !== undefined) {
+            const upload = await uploadDirect(attachment, 'post_attachment');
+            formData.append('attachmentKey', upload.key);
+        }
 
         const response = await fetch(`/api/v1/posts/create`, {
             method: 'POST',
@@ -157,31 +170,61 @@ class Post {
     }
 
     /**
-     * Get a list of posts with pagination and before timestamp.
-     * @param {number} page - The page number to fetch.
+     * Retrieve a post with a page of its replies, newest first, in a single request.
+     * @param {number} postId - The ID of the post to retrieve.
+     * @param {string|null} cursor - The cursor returned with the previous page of replies, or null for the first page.
+     * @param {number} limit - The number of replies to fetch per page.
+     * @returns {Promise<{post: Post, replies: Array<Reply>, resolvedReply: Reply|null, nextCursor: string|null}|undefined>}
+     *          - A Promise that resolves to the post, the page of replies, the reply which resolved the post and the
+     *          cursor of the next page, or undefined if the thread could not be retrieved.
+     */
+    static async getThread(postId, cursor = null, limit = 20) {
+        try {
+            let url = `/api/v1/posts/${postId}/thread?limit=${limit}`;
+            if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+            const response = await fetch(url);
+            const data = await response.json();
+
+            // Replies are cached before the post, so the resolving reply is not fetched again
+            const replies = await Promise.all(data.replies.map(async reply => await Reply.fromJson(reply)));
+            const resolvedReply = data.resolvedReply ? await Reply.fromJson(data.resolvedReply) : null;
+            const post = await Post.fromJson(data.post);
+            return {post: post, replies: replies, resolvedReply: resolvedReply, nextCursor: data.nextCursor};
+        } catch (error) {
+            console.error(`Could not retrieve thread of Post ID: ${postId}`);
+            return undefined;
+        }
+    }
+
+    /**
+     * Get a page of posts, newest first.
+     * @param {string|null} cursor - The cursor returned with the previous page, or null for the first page.
      * @param {number} limit - The number of posts to fetch per page.
      * @param {Moment|null} before - The timestamp to fetch posts created before this timestamp.
      * @param {Set|null} subjects - The set of subjects to filter the posts by.
-     * @returns {Promise<Array<Post>>} - A Promise that resolves to an array of Post objects.
+     * @returns {Promise<{posts: Array<Post>, nextCursor: string|null}>} - A Promise that resolves to the posts
+     *                                                                     and the cursor of the next page.
      */
-    static async getPosts(page, limit, before = null, subjects = null) {
+    static async getPosts(cursor, limit, before = null, subjects = null) {
         try {
-            let url = `/api/v1/posts/all?page=${page}&limit=${limit}${before ? `&before=${before.unix()}` : ''}`;
+            let url = `/api/v1/posts/all?limit=${limit}${before ? `&before=${before.unix()}` : ''}`;
+            if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
             if (subjects) url += `&subjects=${Array.from(subjects).join(',')}`;
             const response = await fetch(url);
-            const postData = await response.json();
-            return await Promise.all(postData.map(async post => await Post.fromJson(post)));
+            const data = await response.json();
+            const posts = await Promise.all(data.posts.map(async post => await Post.fromJson(post)));
+            return {posts: posts, nextCursor: data.nextCursor};
         } catch (error) {
             console.error(`Could not fetch posts with pagination`, error);
-            return [];
+            return {posts: [], nextCursor: null};
         }
     }
 
     static async search(query, limit = 5) {
         try {
             const response = await fetch(`/api/v1/posts/search?query=${encodeURIComponent(query)}&limit=${limit}`);
-            const postData = await response.json();
-            return await Promise.all(postData.map(async post => await Post.fromJson(post)));
+            const data = await response.json();
+            return await Promise.all(data.posts.map(async post => await Post.fromJson(post)));
         } catch (error) {
             console.error(`Could not search for posts`);
             return [];
@@ -207,9 +250,7 @@ class Post {
      * @returns {number} - The total vote count for the post.
      */
     getVoteCount() {
-        return this.votes.map(vote => vote.vote).reduce((accumulator, currentValue) => {
-            return accumulator + currentValue;
-        }, 0);
+        return this.score;
     }
 
     async resolve(reply) {
@@ -230,7 +271,8 @@ class Post {
         try {
             const response = await fetch(`/api/v1/posts/${this.id}/upvote`, {method: 'POST'});
             const postData = await response.json();
-            this.votes = postData.votes;
+            this.score = postData.score;
+            this.userVote = postData.userVote;
         } catch (error) {
             console.error(`Could not upvote post: ${this.id}`);
         }
@@ -244,7 +286,8 @@ class Post {
         try {
             const response = await fetch(`/api/v1/posts/${this.id}/downvote`, {method: 'POST'});
             const postData = await response.json();
-            this.votes = postData.votes;
+            this.score = postData.score;
+            this.userVote = postData.userVote;
         } catch (error) {
             console.error(`Could not downvote post: ${this.id}`);
         }
@@ -37,12 +37,20 @@ class Reply {
         this._reply = value;
     }
 
-    get votes() {
-        return this._votes;
+    get score() {
+        return this._score;
     }
 
-    set votes(value) {
-        this._votes = value;
+    set score(value) {
+        this._score = value;
+    }
+
+    get userVote() {
+        return this._userVote;
+    }
+
+    set userVote(value) {
+        this._userVote = value;
     }
 
     get timestamp() {
@@ -59,14 +67,15 @@ class Reply {
      * @returns {Reply} - The created Reply object.
      */
     static async fromJson(json) {
-        const { id, authorId, postId, text, votes, timestamp } = json;
+        const { id, authorId, author, postId, text, score, userVote, timestamp } = json;
         const reply = new Reply(id);
 
         reply.reply = text;
-        reply.votes = votes;
+        reply.score = score;
+        reply.userVote = userVote;
         reply.timestamp = moment.utc(timestamp);
         reply.postId = postId;
-        reply.author = await User.getById(authorId);
+        reply.author = author ? User.fromJson(author) : await User.getById(authorId);
 
         return reply;
     }
@@ -115,9 +124,7 @@ class Reply {
      * @returns {number} - The total vote count for the reply.
      */
     getVoteCount() {
-        return this.votes.map(vote => vote.vote).reduce((accumulator, currentValue) => {
-            return accumulator + currentValue;
-        }, 0);
+        return this.score;
     }
 
     /**
@@ -128,7 +135,8 @@ class Reply {
         try {
             const response = await fetch(`/api/v1/replies/${this.id}/upvote`, { method: 'POST' });
             const replyData = await response.json();
-            this.votes = replyData.votes;
+            this.score = replyData.score;
+            this.userVote = replyData.userVote;
         } catch (error) {
             console.error(`Could not upvote reply: ${this.id}`);
         }
@@ -142,7 +150,8 @@ class Reply {
         try {
             const response = await fetch(`/api/v1/replies/${this.id}/downvote`, { method: 'POST' });
             const replyData = await response.json();
-            this.votes = replyData.votes;
+            this.score = replyData.score;
+            this.userVote = replyData.userVote;
         } catch (error) {
             console.error(`Could not downvote reply: ${this.id}`);
         }
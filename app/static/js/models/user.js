@@ -3,6 +3,10 @@ class User {
     static #cache = new Map();
     // Reference to the current user
     static #currentUser = undefined;
+    // Pending lookups by user ID, fetched together by the next batch request
+    static #pending = new Map();
+    // Maximum number of users fetched by a batch request
+    static #batchLimit = 100;
 
     /**
      * User class constructor
@@ -12,8 +16,9 @@ class User {
      * @param {Date} dateCreated - The date the user was created
      * @param {string} pfp - The profile picture URL of the user
      * @param answered
+     * @param {object} pfpVariants - The profile picture URLs of the user by size in pixels
      */
-    constructor(id, email, username, dateCreated, pfp, answered) {
+    constructor(id, email, username, dateCreated, pfp, answered, pfpVariants = {}) {
         if (User.#cache.has(id)) return User.#cache.get(id);
 
         this.id = id;
@@ -21,10 +26,22 @@ class User {
         this.username = username;
         this.dateCreated = dateCreated;
         this.pfp = pfp;
+        this.pfpVariants = pfpVariants;
         this.answered = answered;
         User.#cache.set(id, this);
     }
 
+    /**
+     * Get the smallest profile picture of the user at least as large as the size
+     * @param {number} size - The displayed size in pixels
+     * @returns {string} - The profile picture URL
+     */
+    avatar(size) {
+        const sizes = Object.keys(this.pfpVariants).map(Number).sort((a, b) => a - b);
+        const fit = sizes.find(variant => variant >= size);
+        return fit ? this.pfpVariants[fit] : this.pfp;
+    }
+
     async updateProfilePicture(file) {
         const formData = new FormData();
         formData.append('file', file);
@@ -34,8 +51,12 @@ class User {
             body: formData
         });
 
+        // The picture is processed in the background when no URL is returned yet
         const json = await response.json();
-        this.pfp = json.url;
+        if (json.url) {
+            this.pfp = json.url;
+            this.pfpVariants = {};
+        }
     }
 
     /**
@@ -44,8 +65,8 @@ class User {
      * @returns {User} - The created User object
      */
     static fromJson(json) {
-        const { id, email, username, dateCreated, pfp, answered } = json;
-        return new User(id, email, username, moment.utc(dateCreated), pfp, answered);
+        const { id, email, username, dateCreated, pfp, answered, pfpVariants } = json;
+        return new User(id, email, username, moment.utc(dateCreated), pfp, answered, pfpVariants);
     }
 
     /**
@@ -68,11 +89,42 @@ class User {
      */
     static async getById(userId) {
         if (User.#cache.has(userId)) return User.#cache.get(userId);
+        if (User.#pending.has(userId)) return User.#pending.get(userId).promise;
+
+        // Lookups made in the same task, such as the authors of a page of replies, share one request
+        if (User.#pending.size === 0) setTimeout(() => User.#fetchPending());
+        let resolve, reject;
+        const promise = new Promise((res, rej) => [resolve, reject] = [res, rej]);
+        User.#pending.set(userId, {promise, resolve, reject});
+        return promise;
+    }
 
-        const response = await fetch(`/api/v1/users/${userId}`);
-        const userData = await response.json();
+    /**
+     * Get several users by ID with a single request
+     * @param {Array<number>} userIds - The IDs of the users to retrieve
+     * @returns {Promise<Array<User>>} - The retrieved User objects, in the order of the IDs
+     */
+    static async getByIds(userIds) {
+        const users = await Promise.all(userIds.map(userId => User.getById(userId)));
+        return users.filter(user => user);
+    }
 
-        return User.fromJson(userData);
+    static async #fetchPending() {
+        const pending = User.#pending;
+        User.#pending = new Map();
+        const userIds = [...pending.keys()];
+
+        for (let i = 0; i < userIds.length; i += User.#batchLimit) {
+            const batch = userIds.slice(i, i + User.#batchLimit);
+            try {
+                const response = await fetch(`/api/v1/users?ids=${batch.join(',')}`);
+                const users = new Map((await response.json()).map(json => [json.id, User.fromJson(json)]));
+                batch.forEach(userId => pending.get(userId).resolve(users.get(userId)));
+            } catch (error) {
+                console.error(`Could not fetch users: ${batch}`);
+                batch.forEach(userId => pending.get(userId).reject(error));
+            }
+        }
     }
 
     /**
@@ -87,13 +139,33 @@ class User {
         return User.fromJson(userData);
     }
 
-    static async getUserPosts(page, limit, userid) {
+    static async getUserPosts(cursor, limit, userid) {
         try {
-            let url = `/api/v1/posts/user?page=${page}&limit=${limit}&id=${userid}`;
+            let url = `/api/v1/posts/user?limit=${limit}&id=${userid}`;
+            if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
             const response = await fetch(url);
             return await response.json();
         } catch (error) {
             console.error(`Could not fetch posts from user`);
+            return {posts: [], nextCursor: null};
+        }
+    }
+
+    /**
+     * Suggest users whose username starts with the prefix
+     * @param {string} prefix - The start of the username
+     * @param {number} limit - The maximum number of suggestions
+     * @returns {Promise<Array<User>>} - The suggested users
+     */
+    static async autocomplete(prefix, limit = 8) {
+        if (prefix.trim() === '') return [];
+
+        try {
+            const response = await fetch(`/api/v1/users/autocomplete?q=${encodeURIComponent(prefix.trim())}&limit=${limit}`);
+            const userData = await response.json();
+            return userData.map(user => User.fromJson(user));
+        } catch (error) {
+            console.error(`Could not autocomplete users: ${prefix}`);
             return [];
         }
     }
@@ -7,22 +7,38 @@ const sortBy = searchParams.get('sortBy')?.toLowerCase() || 'recent';
 let post;
 const postId = parseInt(window.location.pathname.split('/').pop());
 
+let nextCursor = null;
+const repliesPerPage = 20;
+let loading = false, reachedEnd = true;
+
+window.addEventListener('scroll', handleScroll);
+
 $(document).ready(async function () {
-    post = await Post.getById(postId);
-    await post.loadReplies();
+    const thread = await Post.getThread(postId, null, repliesPerPage);
+    document.getElementById('post-container').classList.remove('loading-skeleton');
+    if (!thread) {
+        document.getElementById('post-title').textContent = 'This post could not be loaded';
+        document.getElementById('post-body').textContent = 'Please refresh the page to try again.';
+        return;
+    }
+
+    post = thread.post;
     renderPost(post);
-    renderReplies(post.replies);
 
-    document.getElementById('post-container').classList.remove('loading-skeleton');
+    // The marked answer is shown first, whichever page of replies it is on
+    if (thread.resolvedReply) document.getElementById('post-replies').appendChild(renderReply(thread.resolvedReply));
+    renderReplies(thread.replies);
+    nextCursor = thread.nextCursor;
+    reachedEnd = !nextCursor;
 
-    const relatedPosts = await Post.getPosts(1, 10, null, new Set([post.subject]));
+    const {posts: relatedPosts} = await Post.getPosts(null, 10, null, new Set([post.subject]));
     renderRelatedPosts(relatedPosts.filter(relatedPost => relatedPost.id !== post.id));
 });
 
 function renderPost(post) {
     const postUpvoteButton = document.getElementById('post-upvote');
     const postDownvoteButton = document.getElementById('post-downvote');
-    const userVote = post.votes.find(vote => vote.userId === currentUser.id)?.vote || 0;
+    const userVote = post.userVote;
 
     postUpvoteButton.classList.remove('active');
     postDownvoteButton.classList.remove('active');
@@ -76,6 +92,29 @@ function renderPost(post) {
     }
 }
 
+async function fetchReplies() {
+    loading = true;
+    const thread = await Post.getThread(postId, nextCursor, repliesPerPage);
+    loading = false;
+
+    // Stop paging on failure rather than retrying on every scroll event
+    if (!thread) {
+        reachedEnd = true;
+        return;
+    }
+
+    renderReplies(thread.replies);
+    nextCursor = thread.nextCursor;
+    if (!nextCursor) reachedEnd = true;
+}
+
+async function handleScroll() {
+    const {scrollTop, scrollHeight, clientHeight} = document.documentElement;
+    if (!loading && !reachedEnd && scrollTop + clientHeight >= scrollHeight - 200) {
+        await fetchReplies();
+    }
+}
+
 function renderReplies(replies) {
     const postReplies = document.getElementById('post-replies');
     const sorting = {
@@ -83,20 +122,19 @@ function renderReplies(replies) {
         'popular': (a, b) => b.getVoteCount() - a.getVoteCount() || b.timestamp - a.timestamp
     }
 
-    const markedReply = replies.find(reply => reply.id === post.resolvedBy?.id);
-    if (markedReply) postReplies.appendChild(renderReply(markedReply));
+    // Replies are loaded a page at a time, so each page is sorted as it is appended
     replies.filter(reply => reply.id !== post.resolvedBy?.id).sort(sorting[sortBy]).forEach(reply => postReplies.appendChild(renderReply(reply)));
 }
 
 function renderReply(reply) {
-    const userVote = reply.votes.find(vote => vote.userId === currentUser.id)?.vote || 0;
+    const userVote = reply.userVote;
     const replyDiv = document.createElement('div');
     replyDiv.setAttribute('data-reply-id', reply.id);
     replyDiv.classList.add('card', 'post-card', 'w-100', 'shadow-xss', 'rounded-xxl', 'border-0', 'p-4', 'mb-3');
 
     replyDiv.innerHTML = DOMPurify.sanitize(
         `<div class="card-body p-0 d-flex">
-            <figure class="avatar me-3"><img src=${reply.author.pfp} alt="avater" class="shadow-sm rounded-circle w45"></figure>
+            <figure class="avatar me-3"><img src=${reply.author.avatar(64)} alt="avater" class="shadow-sm rounded-circle w45"></figure>
             <div><h4 class="fw-700 text-grey-900 font-xssss mt-1">${reply.author.username}<span class="d-block font-xssss fw-500 mt-1 lh-3 text-grey-500">${reply.timestamp.fromNow()}</span></h4></div>
             <div class="ms-auto pointer d-flex align-items-center">
                 ${post.resolvedBy?.id === reply.id ? `<div id="post-solved" class="rounded-pill bg-success text-white px-4 py-2 me-3 font-xssss">Marked as Answer</div>` : ``}
@@ -146,7 +184,7 @@ function renderRelatedPosts(posts) {
 
         postDiv.innerHTML = DOMPurify.sanitize(
             `<div class="card-body p-0 d-flex">
-                <figure class="avatar me-1"><img src="${post.author.pfp}" alt="avater" class="shadow-sm rounded-circle w25"></figure>
+                <figure class="avatar me-1"><img src="${post.author.avatar(64)}" alt="avater" class="shadow-sm rounded-circle w25"></figure>
                 <h3 class="fw-600 text-grey-900 font-xsss lh-28">${post.author.username}</h3>
                 <span class="fw-900 font-x mx-1">&#183;</span>
                 <span class="font-xsss fw-500 text-grey-500">${post.timestamp.fromNow()}</span>
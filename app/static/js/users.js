@@ -20,7 +20,8 @@ $(document).ready(async function () {
         fileInput.addEventListener("change", async function () {
             const selectedFile = fileInput.files[0];
             await user.updateProfilePicture(selectedFile);
-            location.reload();
+            // Preview the picture, as a picture processed in the background is only served once ready
+            document.getElementById('pfp').src = URL.createObjectURL(selectedFile);
         });
     } else {
         document.getElementById("message").style.visibility = "visible";
@@ -32,21 +33,25 @@ $(document).ready(async function () {
 
 window.addEventListener('scroll', handleScroll);
 
-let currentPage = 1;
+let nextCursor = null;
 const postsPerPage = 2;
-let reachedEnd = false;
+let reachedEnd = false, loading = false;
 let lastPostTimestamp = null;
 
 async function fetchUserPosts() {
-    const posts = await User.getUserPosts(currentPage, postsPerPage, user.id);
-    const postsContainer = document.getElementById('posts');
+    loading = true;
+    const page = await User.getUserPosts(nextCursor, postsPerPage, user.id);
 
-    if (posts.length > 0) {
-        lastPostTimestamp = posts[posts.length - 1].timestamp;
-        posts.forEach(post => {
+    if (page.posts.length > 0) {
+        lastPostTimestamp = page.posts[page.posts.length - 1].timestamp;
+        page.posts.forEach(post => {
             createPostCard(post);
         });
-    } else reachedEnd = true;
+    }
+
+    nextCursor = page.nextCursor;
+    if (!nextCursor) reachedEnd = true;
+    loading = false;
 }
 
 function createPostCard(post) {
@@ -78,20 +83,19 @@ function createPostCard(post) {
                             <div class="card-body d-flex p-0">
                                 <div class="emoji-bttn pointer d-flex align-items-center fw-600 text-grey-900 text-dark lh-26 font-xssss me-2">
                                     <i class="feather-thumbs-up text-white bg-primary-gradiant me-1 btn-round-xs font-xss"></i>
-                                    <i class="feather-heart text-white bg-red-gradiant me-2 btn-round-xs font-xss"></i>${post.votes.length}
+                                    <i class="feather-heart text-white bg-red-gradiant me-2 btn-round-xs font-xss"></i>${post.score}
                                     Like
                                 </div>
                                 <a class="d-flex align-items-center fw-600 text-grey-900 text-dark lh-26 font-xssss"><i
                                         class="feather-message-circle text-dark text-grey-900 btn-round-sm font-lg"></i><span
-                                        class="d-none-xss">${post.votes.length}</span></a>
+                                        class="d-none-xss">${post.replyCount}</span></a>
                             </div>
                         </div>`;
 }
 
 async function handleScroll() {
     const {scrollTop, scrollHeight, clientHeight} = document.documentElement;
-    if (!reachedEnd && scrollTop + clientHeight >= scrollHeight - 200) {
-        currentPage += 1;
+    if (!loading && !reachedEnd && scrollTop + clientHeight >= scrollHeight - 200) {
         await fetchUserPosts();
     }
 }
\ No newline at end of file
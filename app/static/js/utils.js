@@ -5,4 +5,32 @@ function isEqualSets(a, b) {
     return true;
 }
 
-export { isEqualSets }
\ No newline at end of file
+/**
+ * Upload a file directly to S3 with a presigned request, then record it.
+ * @param {File} file - The file to upload.
+ * @param {string} purpose - The purpose of the file, such as 'post_attachment'.
+ * @returns {Promise<object>} - A Promise that resolves to the recorded upload, with its key and URL.
+ */
+async function uploadDirect(file, purpose) {
+    const headers = { 'Content-Type': 'application/json' };
+    const presigned = await fetch(`/api/v1/upload/presign?purpose=${purpose}`, {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify({ contentType: file.type || 'application/octet-stream' })
+    }).then(response => response.json());
+
+    const formData = new FormData();
+    Object.entries(presigned.fields).forEach(([name, value]) => formData.append(name, value));
+    formData.append('file', file);
+
+    const response = await fetch(presigned.url, { method: 'POST', body: formData });
+    if (!response.ok) throw new Error(`Could not upload ${file.name}`);
+
+    return await fetch('/api/v1/upload/complete', {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify({ key: presigned.key })
+    }).then(response => response.json());
+}
+
+export { isEqualSets, uploadDirect }
\ No newline at end of file
@@ -1,10 +1,14 @@
 import boto3
 import os
+from botocore.config import Config
 from flask import Blueprint
 
 session = boto3.Session()
+# S3_ENDPOINT_URL points the uploads at an S3 compatible server, such as benchmarks.mock_s3_server
 s3 = session.client('s3', aws_access_key_id=os.getenv('AWS_ACCESS_KEY', 'aws'),
-                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'aws'))
+                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'aws'),
+                    endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+                    config=Config(s3={'addressing_style': 'path'}) if os.getenv('S3_ENDPOINT_URL') else None)
 
 upload_api_blueprint = Blueprint('upload_api', __name__, url_prefix='/api/v1/upload')
 
@@ -2,7 +2,7 @@ from flask import jsonify, request, render_template, redirect
 from flask_login import current_user, login_required
 from werkzeug.utils import secure_filename
 
-from app.upload import upload_api_blueprint, s3
+from app.upload import upload_api_blueprint, s3, upload_services
 from app.exceptions import Unauthorized, NotFound, BadRequest
 from app.upload.files import File, FilePurpose
 
@@ -24,6 +24,44 @@ def upload():
     return jsonify({'url': url})
 
 
+@upload_api_blueprint.route('/presign', methods=['POST'])
+@login_required
+def presign():
+    """
+    Issue a presigned request to upload a file directly to S3, so the file never goes through the app.
+    The client then uploads the file and calls the complete endpoint with the returned key.
+
+    :return: JSON containing the method, URL and key of the upload, and its form fields or headers.
+    :raises BadRequest: If the purpose, content type or method is invalid.
+    """
+    purpose = request.args.get('purpose')
+    if not purpose or not FilePurpose.has_key(purpose):
+        raise BadRequest(message='Invalid file purpose')
+
+    content_type = request.json.get('contentType')
+    method = request.json.get('method', 'POST').upper()
+    return jsonify(upload_services.presign_upload(FilePurpose(purpose), current_user.id, content_type, method))
+
+
+@upload_api_blueprint.route('/complete', methods=['POST'])
+@login_required
+def complete():
+    """
+    Validate and record a file uploaded with a presigned request.
+
+    :return: JSON representation of the upload, including its URL.
+    :raises BadRequest: If the key is missing or the uploaded file is invalid.
+    :raises NotFound: If nothing was uploaded under the key.
+    :raises Unauthorized: If the key belongs to another user.
+    """
+    key = request.json.get('key')
+    if not key:
+        raise BadRequest(message='Upload key not present')
+
+    upload = upload_services.complete_upload(key, current_user.id)
+    return jsonify(upload.serialized)
+
+
 @upload_api_blueprint.route('view')
 def view():
     return render_template('upload.html')
@@ -1,13 +1,33 @@
+import hashlib
 import os
+import re
 import uuid
 from enum import Enum
 from io import BytesIO
 from urllib.parse import urlparse
 import requests
-from PIL import ImageOps, Image
+from boto3.s3.transfer import TransferConfig
+from PIL import Image
+from sqlalchemy import delete, update
 from werkzeug.datastructures import FileStorage
 
-from app.upload import s3
+from app.upload import images, s3
+
+MB = 1024 * 1024
+# Files above the threshold are streamed to S3 as a multipart upload, sending up to max_concurrency
+# parts in parallel, so at most max_concurrency parts of a file are held in memory
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=8 * MB, max_concurrency=4)
+HASH_CHUNK_SIZE = 1 * MB
+# Files are stored once per content, under the SHA-256 of their content in place of the user ID
+CONTENT_DIRECTORY = 'sha256'
+CONTENT_FILENAME = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+# Remote files are downloaded through one pooled session, with connect and read timeouts in seconds
+DOWNLOAD_TIMEOUT = (3.05, 10)
+MAX_DOWNLOAD_SIZE = 5 * MB
+download_session = requests.Session()
+download_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+download_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
 
 
 class FilePurpose(Enum):
@@ -26,27 +46,96 @@ class File:
 
     def __init__(self, file_data: FileStorage, file_purpose: FilePurpose, user_id: int):
         self.file_data = file_data
+        self.extension = os.path.splitext(file_data.filename or '')[1].lower()
         self.file_data.filename = str(uuid.uuid4())
         self.file_purpose = file_purpose
         self.user_id = user_id
+        self._digest = None
+        self._size = None
 
     @property
     def filename(self):
-        extension = self.file_data.filename.split('.')[-1]
-        return f'{self.file_data.filename}.{extension}'
+        return f'{self.digest}{self.extension}'
+
+    @property
+    def digest(self):
+        """
+        SHA-256 of the content of the file, hashed in chunks the first time it is needed.
+        """
+        if self._digest is None:
+            self._hash()
+        return self._digest
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._hash()
+        return self._size
+
+    def _hash(self):
+        stream = self.file_data.stream
+        sha256 = hashlib.sha256()
+        size = 0
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            size += len(chunk)
+        stream.seek(0)
+        self._digest, self._size = sha256.hexdigest(), size
 
     @property
     def s3_key(self):
-        return f'{self.file_purpose.value}/{self.user_id}/{self.filename}'
+        return File.build_key(self.file_purpose, self.user_id, self.filename)
+
+    @staticmethod
+    def build_key(file_purpose: FilePurpose, user_id: int, filename: str) -> str:
+        """
+        Get the S3 key of a file: files are grouped by purpose, then by the user who uploaded them.
+        Content-addressed files are shared by every user, so are grouped under CONTENT_DIRECTORY instead.
+        """
+        if CONTENT_FILENAME.match(filename):
+            return f'{file_purpose.value}/{CONTENT_DIRECTORY}/{filename}'
+        return f'{file_purpose.value}/{user_id}/{filename}'
+
+    @property
+    def url(self):
+        return f'https://{self.bucket}.s3.amazonaws.com/{self.s3_key}'
+
+    def upload_stream(self, stream, content_type: str = None):
+        """
+        Stream a file to Amazon S3 under the key of this file, using a multipart upload for large files.
+
+        :param stream: The binary file object to upload.
+        :param content_type: The content type of the file.
+        :raises Exception: If the upload failed, in which case any multipart upload is aborted.
+        """
+        extra_args = {'ContentType': content_type} if content_type else None
+        s3.upload_fileobj(stream, self.bucket, self.s3_key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+
+    def store(self, stream, content_type: str = None):
+        """
+        Reference the stored object of the content of this file, uploading the stream to Amazon S3
+        only if the content is not stored yet.
+
+        :param stream: The binary file object of the content of this file.
+        :param content_type: The content type of the file.
+        :raises Exception: If the upload failed, in which case no reference is recorded.
+        """
+        # Imported here as the models themselves depend on the upload package
+        from app.models import StoredFile
+
+        if StoredFile.add_reference(self.s3_key):
+            return
+        self.upload_stream(stream, content_type)
+        StoredFile.create(self.s3_key, self.size, content_type)
 
     def upload(self):
         """
-        Upload the image to Amazon S3.
-        :return: True if the upload is successful, False otherwise.
+        Upload the file to Amazon S3, unless the same content is already stored.
+        :return: URL if the upload is successful, None otherwise.
         """
         try:
-            s3.put_object(Body=self.file_data, Bucket=self.bucket, Key=self.s3_key)
-            return f'https://{self.bucket}.s3.amazonaws.com/{self.s3_key}'
+            self.store(self.file_data.stream, self.file_data.content_type)
+            return self.url
         except Exception as e:
             print(f"An error occurred while uploading the image: {e}")
         return None
@@ -58,14 +147,51 @@ class File:
 
         :return: URL of the image if found, None otherwise.
         """
-        return f'https://{cls.bucket}.s3.amazonaws.com/{image_type.value}/{user_id}/{filename}'
+        return f'https://{cls.bucket}.s3.amazonaws.com/{File.build_key(image_type, user_id, filename)}'
+
+    @staticmethod
+    def release(filename: str, file_purpose: FilePurpose):
+        """
+        Drop a reference to a content-addressed file, deleting it from Amazon S3 with the last reference.
+        Files which are not content-addressed are left untouched.
+
+        :return: True if the file was deleted, False otherwise.
+        """
+        # Imported here as the models themselves depend on the upload package
+        from app import db
+        from app.models import StoredFile
+
+        if not filename or not CONTENT_FILENAME.match(filename):
+            return False
+
+        key = File.build_key(file_purpose, None, filename)
+        db.session.execute(update(StoredFile).where(StoredFile.key == key)
+                           .values(ref_count=StoredFile.ref_count - 1),
+                           execution_options={'synchronize_session': False})
+        # The row is deleted before the object, so a concurrent upload of the same content waits for
+        # this transaction and then uploads the content again rather than referencing a deleted object
+        deleted = db.session.execute(delete(StoredFile).where(StoredFile.key == key, StoredFile.ref_count <= 0),
+                                     execution_options={'synchronize_session': False}).rowcount
+        try:
+            if deleted:
+                s3.delete_object(Bucket=File.bucket, Key=key)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"An error occurred while deleting the file: {e}")
+            return False
+
+        return bool(deleted)
 
     def delete_from_s3(self):
         """
-        Delete the file from Amazon S3.
+        Delete the file from Amazon S3, or drop a reference to it if it is content-addressed.
 
         :return: True if deletion is successful, False otherwise.
         """
+        if CONTENT_FILENAME.match(self.filename):
+            return File.release(self.filename, self.file_purpose)
+
         try:
             s3.delete_object(Bucket=self.bucket, Key=self.s3_key)
             return True
@@ -84,17 +210,30 @@ class File:
             return False
 
     @staticmethod
-    def download_from_url(url):
+    def download_from_url(url, timeout=DOWNLOAD_TIMEOUT, max_size: int = MAX_DOWNLOAD_SIZE):
+        """
+        Download a file through the pooled download session, streaming the body so that
+        downloads larger than max_size are abandoned without being held in memory.
+
+        :param timeout: The connect and read timeouts in seconds.
+        :param max_size: The maximum size of the file in bytes.
+        :return: The downloaded file if the download is successful, None otherwise.
+        """
         try:
-            response = requests.get(url, verify=True)
-            if response.status_code == 200:
+            with download_session.get(url, verify=True, timeout=timeout, stream=True) as response:
+                if response.status_code != 200 or int(response.headers.get('Content-Length', 0)) > max_size:
+                    return None
+
+                file_stream = BytesIO()
+                for chunk in response.iter_content(HASH_CHUNK_SIZE):
+                    file_stream.write(chunk)
+                    if file_stream.tell() > max_size:
+                        return None
+                file_stream.seek(0)
+
                 filename = os.path.basename(urlparse(url).path)
                 content_type = response.headers.get("Content-Type")
-                file_stream = BytesIO(response.content)
-                file_storage = FileStorage(file_stream, filename=filename, content_type=content_type)
-                return file_storage
-            else:
-                return None
+                return FileStorage(file_stream, filename=filename, content_type=content_type)
         except Exception as e:
             return None
 
@@ -103,35 +242,40 @@ class ProfileFile(File):
     def __init__(self, file_data: FileStorage, user_id: int):
         super().__init__(file_data, FilePurpose.PROFILE_PICTURE, user_id)
 
-    def upload(self):
+    @property
+    def filename(self):
+        return f'{self.file_data.filename}.{images.PFP_FORMAT.lower()}'
+
+    @staticmethod
+    def variant_name(filename: str, size: int) -> str:
         """
-        Upload the image to Amazon S3 after cropping it into a square.
-        :return: URL if the upload is successful, None otherwise.
+        Get the filename of the variant of a profile picture of the given size.
         """
-        try:
-            image = Image.open(self.file_data.stream)
-            image = ImageOps.exif_transpose(image)  # Corrects image orientation if needed
-
-            crop_size = min(image.width, image.height)
-            left = (image.width - crop_size) // 2
-            top = (image.height - crop_size) // 2
-            right = left + crop_size
-            bottom = top + crop_size
-
-            image = image.crop((left, top, right, bottom))  # Crop to a centered square
-
-            image_stream = BytesIO()
-            image.save(image_stream, format='PNG')  # Adjust format if needed
+        stem, extension = os.path.splitext(filename)
+        return f'{stem}_{size}{extension}'
 
-            # Seek to the beginning of the stream before reading
-            image_stream.seek(0)
+    @classmethod
+    def get_variants(cls, filename: str, user_id: int) -> dict:
+        """
+        Get the URLs of the variants of a profile picture by size.
+        """
+        return {size: cls.get(cls.variant_name(filename, size), FilePurpose.PROFILE_PICTURE, user_id)
+                for size in images.PFP_SIZES}
 
-            # Create a FileStorage object from the BytesIO stream
-            file_storage = FileStorage(stream=image_stream, filename=self.filename, content_type='image/png')
+    def upload(self):
+        """
+        Upload a square variant of the image to Amazon S3 for every size of images.PFP_SIZES,
+        the image being processed outside of the web worker.
+        :return: URL of the largest variant if the upload is successful, None otherwise.
+        """
+        try:
+            variants = images.process_profile_picture(self.file_data.stream.read())
 
-            s3.put_object(Body=file_storage, Bucket=self.bucket, Key=self.s3_key)
+            for size, data in variants.items():
+                key = File.build_key(self.file_purpose, self.user_id, ProfileFile.variant_name(self.filename, size))
+                s3.upload_fileobj(BytesIO(data), self.bucket, key, ExtraArgs={'ContentType': images.PFP_CONTENT_TYPE})
 
-            return f'https://{self.bucket}.s3.amazonaws.com/{self.s3_key}'
+            return self.get_variants(self.filename, self.user_id)[max(images.PFP_SIZES)]
         except Exception as e:
             print(f"An error occurred while uploading the image: {e}")
         return None
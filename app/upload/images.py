@@ -0,0 +1,91 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Tuple
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+# Sizes in pixels of the square variants of a profile picture, the largest being the default one
+PFP_SIZES = (32, 64, 256)
+PFP_FORMAT = 'WEBP'
+PFP_CONTENT_TYPE = 'image/webp'
+PFP_QUALITY = 80
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def make_square_variants(data: bytes, sizes: Tuple[int, ...] = PFP_SIZES, image_format: str = PFP_FORMAT,
+                         quality: int = PFP_QUALITY) -> Dict[int, bytes]:
+    """
+    Crop an image into a centered square and encode it at every size.
+    JPEG images are downscaled while decoding to the smallest scale still larger than the largest size,
+    so large photos are never decoded at full resolution.
+
+    :param data: The encoded image.
+    :type data: bytes
+    :param sizes: The sizes of the variants in pixels.
+    :type sizes: Tuple[int, ...]
+    :param image_format: The Pillow format of the variants, such as 'WEBP' or 'JPEG'.
+    :type image_format: str
+    :param quality: The encoding quality of the variants.
+    :type quality: int
+    :return: The encoded variant of every size.
+    :rtype: Dict[int, bytes]
+    :raises PIL.UnidentifiedImageError: If the data is not an image.
+    """
+    image = Image.open(BytesIO(data))
+    largest = max(sizes)
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+
+    crop_size = min(image.width, image.height)
+    left = (image.width - crop_size) // 2
+    top = (image.height - crop_size) // 2
+    image = image.crop((left, top, left + crop_size, top + crop_size))
+
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    mode = 'RGBA' if has_alpha and image_format != 'JPEG' else 'RGB'
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    variants = {}
+    # Every variant is resized from the previous, larger one, which is cheaper than resizing the original
+    for size in sorted(sizes, reverse=True):
+        if image.width != size:
+            image = image.resize((size, size), Image.LANCZOS)
+        stream = BytesIO()
+        image.save(stream, format=image_format, quality=quality)
+        variants[size] = stream.getvalue()
+    return variants
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Get the pool of image processes of this process, sized by the IMAGE_PROCESSES setting.
+    Processes are spawned rather than forked, as forking a process running threads is unsafe.
+
+    :return: The pool of image processes.
+    :rtype: ProcessPoolExecutor
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_PROCESSES'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def process_profile_picture(data: bytes) -> Dict[int, bytes]:
+    """
+    Make the variants of a profile picture in the pool of image processes,
+    so decoding and encoding neither hold the GIL of the web worker nor block other requests.
+
+    :param data: The encoded image.
+    :type data: bytes
+    :return: The encoded variant of every size of PFP_SIZES.
+    :rtype: Dict[int, bytes]
+    """
+    return get_pool().submit(make_square_variants, data).result()
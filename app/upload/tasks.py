@@ -0,0 +1,286 @@
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import select, update
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models import Post, User
+from app.upload import files, upload_services
+from app.upload.files import File, FilePurpose, PostAttachment, ProfileFile
+from app.users import user_services
+
+# Prefix of the spooled attachments whose post is not saved yet
+SPOOL_PREFIX = 'upload-'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(app: Flask) -> ThreadPoolExecutor:
+    """
+    Get the pool of background upload workers of this process, sized by the UPLOAD_WORKERS setting.
+
+    :param app: The app whose settings size the pool.
+    :type app: Flask
+    :return: The pool of upload workers.
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['UPLOAD_WORKERS'], thread_name_prefix='upload')
+        return _executor
+
+
+def get_spool_dir(app: Flask) -> str:
+    """
+    Get the directory of the UPLOAD_SPOOL_DIR setting, where attachments wait to be uploaded, creating it if needed.
+
+    :param app: The app whose settings locate the directory.
+    :type app: Flask
+    :return: The path of the directory.
+    :rtype: str
+    """
+    os.makedirs(app.config['UPLOAD_SPOOL_DIR'], exist_ok=True)
+    return app.config['UPLOAD_SPOOL_DIR']
+
+
+def get_spool_path(app: Flask, post_id: int) -> str:
+    """
+    Get the path where the attachment of a post waits to be uploaded, which is kept until the upload
+    finishes so an upload interrupted by a restart can be resumed.
+
+    :param app: The app whose settings locate the spool directory.
+    :type app: Flask
+    :param post_id: The ID of the post.
+    :type post_id: int
+    :return: The path of the spooled attachment.
+    :rtype: str
+    """
+    return os.path.join(get_spool_dir(app), f'post-{post_id}')
+
+
+def spool(file: File) -> str:
+    """
+    Copy an uploaded file to a temporary file of the spool directory, which outlives the request unlike the
+    upload stream. Files are spooled before the post is saved, so a post is never pending without its file.
+
+    :param file: The uploaded file.
+    :type file: File
+    :return: The path of the temporary file.
+    :rtype: str
+    """
+    with tempfile.NamedTemporaryFile(dir=get_spool_dir(current_app), prefix=SPOOL_PREFIX, delete=False) as fp:
+        shutil.copyfileobj(file.file_data.stream, fp)
+    return fp.name
+
+
+def upload_post_attachment_later(post_id: int, path: str, content_type: str = None) -> Future:
+    """
+    Upload the attachment of a post after the request, while the post is marked as having a pending attachment.
+    The post is marked as ready once the upload succeeds, or loses its attachment if the upload fails.
+
+    :param post_id: The ID of the post, whose attachment_pending flag is set.
+    :type post_id: int
+    :param path: The path of the attachment, as spooled by spool.
+    :type path: str
+    :param content_type: The content type of the attachment.
+    :type content_type: str
+    :return: The future of the upload.
+    :rtype: Future
+    """
+    app = current_app._get_current_object()
+    spool_path = get_spool_path(app, post_id)
+    os.replace(path, spool_path)
+    return submit_post_attachment(app, post_id, spool_path, content_type)
+
+
+def submit_post_attachment(app: Flask, post_id: int, path: str, content_type: str = None) -> Future:
+    """
+    Submit the upload of the spooled attachment of a post to the upload workers.
+
+    :param app: The app the upload runs in.
+    :type app: Flask
+    :param post_id: The ID of the post.
+    :type post_id: int
+    :param path: The path of the spooled attachment, which is deleted once uploaded.
+    :type path: str
+    :param content_type: The content type of the attachment.
+    :type content_type: str
+    :return: The future of the upload.
+    :rtype: Future
+    """
+    return get_executor(app).submit(_upload_post_attachment, app, post_id, path, content_type)
+
+
+def _upload_post_attachment(app: Flask, post_id: int, path: str, content_type: str):
+    with app.app_context():
+        post = Post.get_by_id(post_id)
+        if post is None:
+            # The post was deleted while its attachment was pending, so nothing references the file
+            os.remove(path)
+            return
+
+        stored = False
+        try:
+            with open(path, 'rb') as fp:
+                # The attachment name is content-addressed, so hashing the spooled file gives it back
+                attachment = PostAttachment(FileStorage(fp, filename=post.attachment_name), post.user_id)
+                attachment.store(fp, content_type)
+            stored = True
+            values = {'attachment_pending': False}
+        except Exception:
+            app.logger.exception('Could not upload the attachment of post %s', post_id)
+            values = {'attachment_pending': False, 'attachment_name': None}
+        finally:
+            os.remove(path)
+
+        updated = db.session.execute(update(Post).where(Post.id == post_id, Post.attachment_pending.is_(True))
+                                     .values(**values), execution_options={'synchronize_session': False}).rowcount
+        db.session.commit()
+        if stored and not updated:
+            # The post was deleted during the upload, which released nothing as the attachment was pending
+            File.release(attachment.filename, FilePurpose.POST_ATTACHMENT)
+
+
+def recover_pending_attachments(app: Flask, max_age: int) -> Tuple[int, int]:
+    """
+    Resume the attachment uploads interrupted by stopped upload workers, such as on a restart.
+    The upload of every pending post whose file is still spooled starts over, skipping the transfer
+    if the content was stored meanwhile, and pending posts whose file is gone lose their attachment.
+    Temporary files of requests which failed before saving their post are deleted once older than max_age.
+    Run while no upload workers are running, as uploads in progress would be started again.
+
+    :param app: The app the uploads run in.
+    :type app: Flask
+    :param max_age: The number of seconds after which an unclaimed temporary file is deleted.
+    :type max_age: int
+    :return: The number of uploads resumed, and the number of attachments dropped.
+    :rtype: Tuple[int, int]
+    """
+    resumed, dropped = 0, []
+    for post_id, attachment_name in db.session.execute(
+            select(Post.id, Post.attachment_name).where(Post.attachment_pending.is_(True))).all():
+        spool_path = get_spool_path(app, post_id)
+        if os.path.exists(spool_path):
+            content_type, _ = mimetypes.guess_type(attachment_name or '')
+            submit_post_attachment(app, post_id, spool_path, content_type)
+            resumed += 1
+        else:
+            dropped.append(post_id)
+
+    if dropped:
+        db.session.execute(update(Post).where(Post.id.in_(dropped)).values(attachment_pending=False, attachment_name=None),
+                           execution_options={'synchronize_session': False})
+        db.session.commit()
+
+    spool_dir = get_spool_dir(app)
+    for name in os.listdir(spool_dir):
+        path = os.path.join(spool_dir, name)
+        if name.startswith(SPOOL_PREFIX) and os.path.getmtime(path) < time.time() - max_age:
+            os.remove(path)
+
+    return resumed, len(dropped)
+
+
+def process_profile_picture_later(user_id: int, key: str) -> Future:
+    """
+    Make the variants of a profile picture uploaded directly to S3 after the request.
+    The user keeps their current profile picture until the variants are uploaded.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param key: The S3 key of the uploaded original.
+    :type key: str
+    :return: The future of the processing.
+    :rtype: Future
+    """
+    app = current_app._get_current_object()
+    return get_executor(app).submit(_process_profile_picture, app, user_id, key)
+
+
+def _process_profile_picture(app: Flask, user_id: int, key: str):
+    with app.app_context():
+        try:
+            original = files.s3.get_object(Bucket=File.bucket, Key=key)
+            file_data = FileStorage(BytesIO(original['Body'].read()), content_type=original.get('ContentType'))
+        except Exception:
+            app.logger.exception('Could not process the profile picture %s', key)
+            return
+
+        if _update_profile_picture(user_id, file_data):
+            # The variants replace the original, which is no longer referenced
+            upload_services.delete_upload(FilePurpose.PROFILE_PICTURE, user_id, key.split('/')[-1])
+
+
+def update_profile_picture_later(user_id: int, file_data: FileStorage) -> Future:
+    """
+    Make the variants of a profile picture uploaded through the app after the request, so decoding
+    and resizing the picture does not hold up the request. The user keeps their current profile picture
+    until the variants are uploaded.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param file_data: The uploaded picture.
+    :type file_data: FileStorage
+    :return: The future of the processing.
+    :rtype: Future
+    """
+    app = current_app._get_current_object()
+    # The upload stream is closed with the request, so the picture is read before the request ends
+    file_data = FileStorage(BytesIO(file_data.stream.read()), filename=file_data.filename,
+                            content_type=file_data.content_type)
+    return get_executor(app).submit(_process_uploaded_profile_picture, app, user_id, file_data)
+
+
+def _process_uploaded_profile_picture(app: Flask, user_id: int, file_data: FileStorage):
+    with app.app_context():
+        _update_profile_picture(user_id, file_data)
+
+
+def import_profile_picture_later(user_id: int, url: str) -> Future:
+    """
+    Import a remote profile picture, such as the avatar of a Google account, after the request,
+    so a slow remote host cannot stall the request. The user keeps their current profile picture
+    until the picture is imported, and if the download fails or the picture is too large.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param url: The URL of the picture.
+    :type url: str
+    :return: The future of the import.
+    :rtype: Future
+    """
+    app = current_app._get_current_object()
+    return get_executor(app).submit(_import_profile_picture, app, user_id, url)
+
+
+def _import_profile_picture(app: Flask, user_id: int, url: str):
+    with app.app_context():
+        file_data = File.download_from_url(url)
+        if file_data is None:
+            app.logger.warning('Could not download the profile picture of user %s', user_id)
+            return
+
+        _update_profile_picture(user_id, file_data)
+
+
+def _update_profile_picture(user_id: int, file_data: FileStorage) -> bool:
+    image = ProfileFile(file_data, user_id)
+    if not image.upload():
+        return False
+
+    db.session.execute(update(User).where(User.id == user_id).values(pfp_file_name=image.filename),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+    user_services.invalidate_profile(user_id)
+    return True
@@ -0,0 +1,159 @@
+import mimetypes
+import uuid
+from typing import TYPE_CHECKING
+
+from botocore.exceptions import ClientError
+
+from app.exceptions import BadRequest, NotFound, Unauthorized
+from app.upload import files
+from app.upload.files import File, FilePurpose
+
+if TYPE_CHECKING:
+    from app.models import Upload
+
+MB = 1024 * 1024
+PRESIGNED_EXPIRY = 600
+MAX_UPLOAD_SIZE = {
+    FilePurpose.PROFILE_PICTURE: 10 * MB,
+    FilePurpose.MESSAGE_ATTACHMENT: 25 * MB,
+    FilePurpose.POST_ATTACHMENT: 25 * MB,
+}
+
+
+def _check_content_type(purpose: FilePurpose, content_type: str):
+    if not content_type or '/' not in content_type:
+        raise BadRequest(message='Invalid content type')
+    if purpose == FilePurpose.PROFILE_PICTURE and not content_type.startswith('image/'):
+        raise BadRequest(message='Profile pictures must be images')
+
+
+def presign_upload(purpose: FilePurpose, user_id: int, content_type: str, method: str = 'POST') -> dict:
+    """
+    Issue a presigned request for the client to upload a file directly to S3, under a new key
+    of the purpose and user. Presigned POST requests also limit the size of the file.
+
+    :param purpose: The purpose of the file.
+    :type purpose: FilePurpose
+    :param user_id: The ID of the uploading user.
+    :type user_id: int
+    :param content_type: The content type of the file, which the upload must be sent with.
+    :type content_type: str
+    :param method: 'POST' for a presigned form upload, or 'PUT' for a presigned URL.
+    :type method: str
+    :return: The method, URL and key of the upload, with the form fields or headers to send.
+    :rtype: dict
+    :raises BadRequest: If the method or content type is invalid.
+    """
+    _check_content_type(purpose, content_type)
+
+    filename = f'{uuid.uuid4()}{mimetypes.guess_extension(content_type) or ""}'
+    key = File.build_key(purpose, user_id, filename)
+
+    if method == 'PUT':
+        url = files.s3.generate_presigned_url('put_object', ExpiresIn=PRESIGNED_EXPIRY, Params={
+            'Bucket': File.bucket, 'Key': key, 'ContentType': content_type
+        })
+        return {'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type}, 'key': key}
+
+    if method == 'POST':
+        presigned = files.s3.generate_presigned_post(
+            File.bucket, key, ExpiresIn=PRESIGNED_EXPIRY,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, MAX_UPLOAD_SIZE[purpose]]]
+        )
+        return {'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields'], 'key': key}
+
+    raise BadRequest(message='Invalid upload method')
+
+
+def complete_upload(key: str, user_id: int) -> 'Upload':
+    """
+    Validate and record a file uploaded with a presigned request. Completing an upload twice is a no-op.
+    Objects which are too large or of the wrong type are deleted.
+    A completed profile picture becomes the profile picture of the user once its variants are made in the background,
+    after which the original and its record are deleted.
+
+    :param key: The S3 key of the upload.
+    :type key: str
+    :param user_id: The ID of the uploading user.
+    :type user_id: int
+    :return: The recorded upload.
+    :rtype: Upload
+    :raises Unauthorized: If the key is not a key of the user.
+    :raises NotFound: If nothing was uploaded under the key.
+    :raises BadRequest: If the key is malformed, or the uploaded object is invalid.
+    """
+    # Imported here as the models themselves depend on the upload package
+    from app.models import Upload
+    from app.upload import tasks
+
+    try:
+        purpose, key_user_id, filename = key.split('/')
+        purpose = FilePurpose(purpose)
+    except ValueError:
+        raise BadRequest(message='Invalid upload key')
+
+    if key_user_id != str(user_id):
+        raise Unauthorized(message='This upload is not yours')
+
+    upload = Upload.get_by_key(key)
+    if upload:
+        return upload
+
+    try:
+        head = files.s3.head_object(Bucket=File.bucket, Key=key)
+    except ClientError:
+        raise NotFound(message='Upload not found')
+
+    size, content_type = head['ContentLength'], head.get('ContentType')
+    try:
+        if size > MAX_UPLOAD_SIZE[purpose]:
+            raise BadRequest(message='File is too large')
+        _check_content_type(purpose, content_type)
+    except BadRequest:
+        files.s3.delete_object(Bucket=File.bucket, Key=key)
+        raise
+
+    upload = Upload(key, purpose, filename, size, content_type, user_id)
+    upload.save()
+
+    if purpose == FilePurpose.PROFILE_PICTURE:
+        tasks.process_profile_picture_later(user_id, key)
+
+    return upload
+
+
+def delete_upload(purpose: FilePurpose, user_id: int, filename: str) -> bool:
+    """
+    Delete a file uploaded with a presigned request from S3, along with its record.
+    Files which were not uploaded with a presigned request are left untouched.
+
+    :param purpose: The purpose of the file.
+    :type purpose: FilePurpose
+    :param user_id: The ID of the uploading user.
+    :type user_id: int
+    :param filename: The filename of the upload.
+    :type filename: str
+    :return: True if the upload was deleted, False otherwise.
+    :rtype: bool
+    """
+    # Imported here as the models themselves depend on the upload package
+    from app import db
+    from app.models import Upload
+
+    if not filename:
+        return False
+
+    upload = Upload.get_by_key(File.build_key(purpose, user_id, filename))
+    if not upload:
+        return False
+
+    try:
+        files.s3.delete_object(Bucket=File.bucket, Key=upload.key)
+    except Exception as e:
+        print(f"An error occurred while deleting the file: {e}")
+        return False
+
+    db.session.delete(upload)
+    db.session.commit()
+    return True
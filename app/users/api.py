@@ -1,13 +1,19 @@
 from typing import List
 
 import flask
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from flask_login import current_user, login_required
 
 from app.exceptions import BadRequest, NotFound
 from app.models import User
+from app.shared.pagination import page_size
+from app.upload import tasks
 from app.upload.files import ProfileFile
-from app.users import user_api_blueprint
+from app.users import user_api_blueprint, user_services
+
+SEARCH_LIMIT = 20
+AUTOCOMPLETE_LIMIT = 10
+BATCH_LIMIT = 100
 
 
 @user_api_blueprint.route("/current")
@@ -21,6 +27,25 @@ def get_current_user() -> flask.Response:
     return jsonify(current_user.serialized)
 
 
+@user_api_blueprint.route('')
+def get_users_by_ids() -> flask.Response:
+    """
+    Get the public profiles of several users at once, such as the authors of a page of posts.
+
+    :return: JSON representation of a list of compact user data, in the order of the requested IDs.
+    :raises BadRequest: If the IDs are missing, invalid or too many.
+    """
+    try:
+        user_ids = [int(user_id) for user_id in request.args.get('ids', '').split(',') if user_id]
+    except ValueError:
+        raise BadRequest(message='Invalid user IDs')
+
+    if not user_ids or len(user_ids) > BATCH_LIMIT:
+        raise BadRequest(message=f'Between 1 and {BATCH_LIMIT} user IDs must be given')
+
+    return jsonify(user_services.get_profiles(user_ids))
+
+
 @user_api_blueprint.route('/<int:user_id>')
 def get_user_by_id(user_id: int) -> flask.Response:
     """
@@ -57,8 +82,22 @@ def search_user(query: str) -> flask.Response:
     :param query: The search query to match against usernames.
     :return: JSON representation of a list of matching user data.
     """
-    users: List[User] = User.query.filter(User.username.ilike(f'%{query}%')).all()
-    return jsonify([user.serialized for user in users])
+    limit = page_size(request.args.get('limit', type=int), default=SEARCH_LIMIT, maximum=SEARCH_LIMIT)
+    users: List[User] = User.query.filter(User.username.ilike(f'%{query}%')).limit(limit).all()
+    return jsonify([user.serialized_min for user in users])
+
+
+@user_api_blueprint.route('/autocomplete')
+def autocomplete_user() -> flask.Response:
+    """
+    Suggest users whose username starts with the given prefix, used while typing.
+
+    :return: JSON representation of a list of compact user data.
+    """
+    prefix = request.args.get('q', '').strip()
+    limit = page_size(request.args.get('limit', type=int), default=AUTOCOMPLETE_LIMIT, maximum=AUTOCOMPLETE_LIMIT)
+    users = User.autocomplete(prefix, limit)
+    return jsonify([user.serialized_min for user in users])
 
 
 @user_api_blueprint.route('/pfp/upload', methods=['POST'])
@@ -68,6 +107,11 @@ def upload_pfp() -> flask.Response:
     if not file_data:
         raise BadRequest(message='Upload must contain file')
 
+    if current_app.config['UPLOAD_IN_BACKGROUND']:
+        # The variants are made by the upload workers, and replace the profile picture once uploaded
+        tasks.update_profile_picture_later(current_user.id, file_data)
+        return jsonify({'url': None, 'pending': True}), 202
+
     image = ProfileFile(file_data, current_user.id)
     url = image.upload()
 
@@ -0,0 +1,13 @@
+import click
+
+from app.models import User
+from app.users import user_api_blueprint
+
+
+@user_api_blueprint.cli.command('backfill-usernames')
+def backfill_usernames():
+    """
+    Populate the normalized usernames used by lookups and autocomplete for existing users.
+    """
+    count = User.backfill_username_lower()
+    click.echo(f'Backfilled normalized usernames for {count} users')
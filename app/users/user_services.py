@@ -3,12 +3,22 @@ from typing import List
 import flask
 from flask import jsonify, request
 from flask_login import current_user, login_required
+from sqlalchemy import event
 
 from app.exceptions import BadRequest, NotFound
 from app.models import User
+from app.shared.cache import TTLCache
 from app.upload.files import ProfileFile
 from app.users import user_api_blueprint
 
+PROFILE_CACHE_SIZE = 10000
+# Every gunicorn worker has its own profile cache and invalidation only reaches the worker making the change,
+# so the TTL is what bounds how long other workers serve a stale name or profile picture
+PROFILE_CACHE_TTL = 10
+
+# Maps user IDs to the public profile of the user, as serialized by User.serialized_min
+_profile_cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+
 
 def update_pfp(user_id: int, file):
     user = User.get_by_id(user_id)
@@ -21,3 +31,48 @@ def update_pfp(user_id: int, file):
     user.save()
 
     return url
+
+
+def get_profiles(user_ids: List[int]) -> List[dict]:
+    """
+    Get the public profiles of users, from the profile cache where possible and otherwise with a single query.
+
+    :param user_ids: The IDs of the users.
+    :type user_ids: List[int]
+    :return: The profile of every existing user, in the order of the IDs and without duplicates.
+    :rtype: List[dict]
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    profiles = {}
+    missing = []
+    for user_id in user_ids:
+        profile = _profile_cache.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+
+    if missing:
+        for user in User.query.filter(User.id.in_(missing)):
+            profiles[user.id] = user.serialized_min
+            _profile_cache.set(user.id, profiles[user.id])
+
+    return [profiles[user_id] for user_id in user_ids if user_id in profiles]
+
+
+def invalidate_profile(user_id: int):
+    """
+    Drop the cached profile of a user, for instance after their profile picture was changed by an UPDATE statement.
+    Changes to users made through the session invalidate the profile by themselves.
+    Only the cache of the current worker is invalidated, the other workers serve their copy until it expires.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    """
+    _profile_cache.delete(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_profile(mapper, connection, user: User):
+    invalidate_profile(user.id)
@@ -0,0 +1,57 @@
+"""
+Load test of the AI gateway against the local mock OpenAI server: many concurrent callers embed a
+question each, as concurrent QnA requests do, first with one API request per caller and then through
+the gateway, which batches them. Reports the wall time and the number of API requests sent.
+
+Usage: python -m benchmarks.ai_gateway
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from app.ai.gateway import Gateway
+from app.ai.qna.embedders import EMBEDDINGS_MODEL
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+CALLERS = 200
+CONCURRENCY = 50
+LATENCY = 0.1
+ERROR_RATE = 0.02
+
+
+def direct_embed(server: MockOpenAIServer, text: str):
+    return openai.Embedding.create(input=[text], model=EMBEDDINGS_MODEL, api_base=server.api_base)
+
+
+def run(name: str, server: MockOpenAIServer, embed):
+    server.requests.clear()
+    questions = [f'Question number {i}' for i in range(CALLERS)]
+
+    start = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        for future in [executor.submit(embed, question) for question in questions]:
+            try:
+                future.result()
+            except openai.error.OpenAIError:
+                failed += 1
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>8}: {elapsed:6.2f} s, {sum(server.requests.values()):4d} API requests, {failed} failed')
+
+
+def main():
+    openai.api_key = 'mock'
+    server = MockOpenAIServer(latency=LATENCY, error_rate=ERROR_RATE).start()
+    gateway = Gateway(requests_per_minute=6000, max_concurrency=16, api_base=server.api_base, backoff=0.05)
+
+    print(f'{CALLERS} callers, {CONCURRENCY} concurrent, {LATENCY * 1000:.0f} ms latency, '
+          f'{ERROR_RATE:.0%} of requests rejected with 429')
+    run('direct', server, lambda question: direct_embed(server, question))
+    run('gateway', server, lambda question: gateway.embed([question], EMBEDDINGS_MODEL))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Local mock of the OpenAI chat completion and embeddings endpoints, for load testing the AI features
+without calling the API. Replies take a fixed latency, and a fraction of requests can be rejected
+with 429 to exercise the retries of the gateway.
+
+Usage: python -m benchmarks.mock_openai_server [--port 8081] [--latency 0.2] [--error-rate 0.05]
+Then start the app with OPENAI_API_BASE=http://localhost:8081/v1 and OPENAI_API_KEY set to anything.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = 'This is a mock answer from the local OpenAI server.'
+GRADED_ESSAY = json.dumps({
+    'grade': 'Satisfactory',
+    'comment': 'This is a mock grade from the local OpenAI server.',
+    'suggestions': [{'area': 'Examples', 'problem': 'The examples are vague.', 'solution': 'Add specific examples.'}]
+})
+EMBEDDING_DIMENSION = 1536
+
+
+def mock_embedding(text: str):
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+    generator = random.Random(seed)
+    return [generator.uniform(-1, 1) for _ in range(EMBEDDING_DIMENSION)]
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.requests[self.path] = server.requests.get(self.path, 0) + 1
+
+        time.sleep(server.latency)
+        if random.random() < server.error_rate:
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}})
+            return
+
+        if self.path.endswith('/embeddings'):
+            data = [{'object': 'embedding', 'index': i, 'embedding': mock_embedding(text)}
+                    for i, text in enumerate(request['input'])]
+            self.send_json(200, {'object': 'list', 'data': data, 'model': request['model']})
+        elif self.path.endswith('/chat/completions'):
+            content = GRADED_ESSAY if 'Essay Content' in request['messages'][0]['content'] else ANSWER
+            if request.get('stream'):
+                self.stream_completion(content)
+            else:
+                self.send_json(200, {'object': 'chat.completion', 'model': request['model'], 'choices': [
+                    {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}
+                ]})
+        else:
+            self.send_json(404, {'error': {'message': f'Unknown endpoint {self.path}'}})
+
+    def stream_completion(self, content: str):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for word in content.split(' '):
+            chunk = {'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': word + ' '}}]}
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+            self.wfile.flush()
+            time.sleep(self.server.latency / 10)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.2, error_rate: float = 0.0):
+        super().__init__(('localhost', port), MockOpenAIHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    @property
+    def api_base(self) -> str:
+        return f'http://localhost:{self.server_address[1]}/v1'
+
+    def start(self) -> 'MockOpenAIServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.port, args.latency, args.error_rate)
+    print(f'Mock OpenAI API listening on {server.api_base}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Local in-memory stand-in for the subset of the S3 API used by the uploads: put, get, head and delete
+object, multipart uploads and form uploads. Objects are addressed path-style, and neither authentication
+nor the policy of form uploads is checked.
+
+Usage: python -m benchmarks.mock_s3_server [--port 9000]
+Then start the app with S3_ENDPOINT_URL=http://localhost:9000.
+"""
+import argparse
+import hashlib
+import threading
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+
+XML_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+class MockS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def parse(self) -> Tuple[str, str, Dict[str, str]]:
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        return bucket, unquote(key), query
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def send(self, status: int, body: bytes = b'', headers: Dict[str, str] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_xml(self, root: str, **fields):
+        elements = ''.join(f'<{name}>{value}</{name}>' for name, value in fields.items())
+        body = f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns="{XML_NAMESPACE}">{elements}</{root}>'
+        self.send(200, body.encode(), {'Content-Type': 'application/xml'})
+
+    def send_error_xml(self, status: int, code: str):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{code}</Message></Error>'
+        self.send(status, body.encode(), {'Content-Type': 'application/xml'})
+
+    def do_PUT(self):
+        bucket, key, query = self.parse()
+        body = self.read_body()
+        server = self.server
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+        with server.lock:
+            server.requests.append(('PUT', key, query.get('partNumber')))
+            if 'uploadId' in query:
+                upload = server.uploads.get(query['uploadId'])
+                if upload is None:
+                    return self.send_error_xml(404, 'NoSuchUpload')
+                upload['parts'][int(query['partNumber'])] = body
+            else:
+                server.objects[(bucket, key)] = (body, self.headers.get('Content-Type', 'binary/octet-stream'))
+        self.send(200, headers={'ETag': etag})
+
+    def do_POST(self):
+        bucket, key, query = self.parse()
+        body = self.read_body()
+        server = self.server
+
+        if not key:
+            return self.form_upload(bucket, body)
+
+        with server.lock:
+            server.requests.append(('POST', key, None))
+            if 'uploads' in query:
+                upload_id = uuid.uuid4().hex
+                server.uploads[upload_id] = {'bucket': bucket, 'key': key, 'parts': {},
+                                             'content_type': self.headers.get('Content-Type', 'binary/octet-stream')}
+                return self.send_xml('InitiateMultipartUploadResult', Bucket=bucket, Key=key, UploadId=upload_id)
+
+            upload = server.uploads.pop(query.get('uploadId'), None)
+            if upload is None:
+                return self.send_error_xml(404, 'NoSuchUpload')
+            numbers = [int(element.text) for element in ElementTree.fromstring(body).iter(f'{{{XML_NAMESPACE}}}PartNumber')]
+            data = b''.join(upload['parts'][number] for number in numbers)
+            server.objects[(bucket, key)] = (data, upload['content_type'])
+        self.send_xml('CompleteMultipartUploadResult', Bucket=bucket, Key=key,
+                      ETag=f'"{hashlib.md5(data).hexdigest()}-{len(numbers)}"')
+
+    def form_upload(self, bucket: str, body: bytes):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + body
+        )
+        fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                  for part in message.iter_parts()}
+        key = fields['key'].decode()
+
+        with self.server.lock:
+            self.server.requests.append(('POST', key, None))
+            self.server.objects[(bucket, key)] = (fields['file'], fields.get('Content-Type', b'binary/octet-stream').decode())
+        self.send(204)
+
+    def do_GET(self):
+        bucket, key, _ = self.parse()
+        with self.server.lock:
+            stored = self.server.objects.get((bucket, key))
+        if stored is None:
+            return self.send_error_xml(404, 'NoSuchKey')
+        data, content_type = stored
+        self.send(200, data, {'Content-Type': content_type, 'ETag': f'"{hashlib.md5(data).hexdigest()}"'})
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        bucket, key, query = self.parse()
+        with self.server.lock:
+            self.server.requests.append(('DELETE', key, None))
+            if 'uploadId' in query:
+                self.server.uploads.pop(query['uploadId'], None)
+            else:
+                self.server.objects.pop((bucket, key), None)
+        self.send(204)
+
+
+class MockS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(('localhost', port), MockS3Handler)
+        self.lock = threading.Lock()
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+        self.uploads = {}
+        self.requests = []
+
+    @property
+    def endpoint_url(self) -> str:
+        return f'http://localhost:{self.server_address[1]}'
+
+    def start(self) -> 'MockS3Server':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9000)
+    args = parser.parse_args()
+
+    server = MockS3Server(args.port)
+    print(f'Mock S3 listening on {server.endpoint_url}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
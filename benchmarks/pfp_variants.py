@@ -0,0 +1,80 @@
+"""
+Benchmark of profile picture processing: the previous pipeline, which decoded the full image and stored a
+PNG crop, against the variants of app.upload.images, which decode JPEG photos at a reduced scale and store
+small WebP squares. Reports the time per image and the bytes stored per image.
+
+Usage: python -m benchmarks.pfp_variants [--corpus DIR] [--count 20]
+Without a corpus, synthetic 12 megapixel camera photos are used.
+"""
+import argparse
+import os
+import time
+from io import BytesIO
+from typing import Callable, Dict, List
+
+import numpy
+from PIL import Image, ImageOps
+
+from app.upload.images import make_square_variants
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def previous_pipeline(data: bytes) -> Dict[int, bytes]:
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    crop_size = min(image.width, image.height)
+    left = (image.width - crop_size) // 2
+    top = (image.height - crop_size) // 2
+    image = image.crop((left, top, left + crop_size, top + crop_size))
+
+    stream = BytesIO()
+    image.save(stream, format='PNG')
+    return {crop_size: stream.getvalue()}
+
+
+def load_corpus(path: str) -> List[bytes]:
+    names = sorted(name for name in os.listdir(path) if name.lower().endswith(EXTENSIONS))
+    images = []
+    for name in names:
+        with open(os.path.join(path, name), 'rb') as fp:
+            images.append(fp.read())
+    return images
+
+
+def synthetic_corpus(count: int) -> List[bytes]:
+    random = numpy.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        # A smooth gradient with noise compresses like a photo rather than like a flat or random image
+        gradient = numpy.linspace(0, 255, 4000, dtype=numpy.float32)
+        pixels = (gradient[None, :, None] + gradient[:3000, None, None] * 0.5) % 256
+        pixels = pixels + random.normal(0, 8, (3000, 4000, 3))
+        stream = BytesIO()
+        Image.fromarray(pixels.clip(0, 255).astype(numpy.uint8)).save(stream, format='JPEG', quality=90)
+        images.append(stream.getvalue())
+    return images
+
+
+def run(name: str, images: List[bytes], process: Callable[[bytes], Dict[int, bytes]]):
+    start = time.perf_counter()
+    stored = sum(len(data) for image in images for data in process(image).values())
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>8}: {elapsed / len(images) * 1000:7.1f} ms per image, '
+          f'{stored / len(images) / 1024:8.1f} KiB stored per image')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Directory of images to process')
+    parser.add_argument('--count', type=int, default=20, help='Number of synthetic images')
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count)
+    print(f'{len(images)} images, {sum(map(len, images)) / len(images) / 1024:.0f} KiB on average')
+    run('previous', images, previous_pipeline)
+    run('variants', images, make_square_variants)
+
+
+if __name__ == '__main__':
+    main()
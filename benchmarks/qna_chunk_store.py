@@ -0,0 +1,50 @@
+"""
+Compare the latency of looking up the chunks of a question in the JSON mapping, as answer() used to,
+with the SQLite chunk store. Cold is the first lookup of a process, warm is the average over many questions.
+
+Usage: python -m benchmarks.qna_chunk_store
+"""
+import json
+import os
+import random
+import tempfile
+import timeit
+
+from app.ai.qna.chunk_store import ChunkStore
+
+JSON_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'ai', 'qna', 'file-text-mapping.json')
+LOOKUPS = 10
+REPEAT = 200
+
+
+def json_lookup(chunk_ids):
+    with open(JSON_PATH, 'r') as fp:
+        file_text_dict = json.load(fp)
+    return {chunk_id: file_text_dict.get(chunk_id) for chunk_id in chunk_ids}
+
+
+def main():
+    with open(JSON_PATH, 'r') as fp:
+        all_ids = list(json.load(fp))
+    questions = [random.sample(all_ids, LOOKUPS) for _ in range(REPEAT)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chunks.sqlite')
+
+        build = timeit.timeit(lambda: ChunkStore.from_json(path, JSON_PATH), number=1)
+
+        cold_json = timeit.timeit(lambda: json_lookup(questions[0]), number=1)
+        cold_store = timeit.timeit(lambda: ChunkStore(path).get_many(questions[0]), number=1)
+
+        store = ChunkStore(path)
+        warm_json = timeit.timeit(lambda: [json_lookup(ids) for ids in questions], number=1) / REPEAT
+        warm_store = timeit.timeit(lambda: [store.get_many(ids) for ids in questions], number=1) / REPEAT
+
+    print(f'{"":<12}{"cold (ms)":>12}{"warm (ms)":>12}')
+    print(f'{"json":<12}{cold_json * 1000:>12.3f}{warm_json * 1000:>12.3f}')
+    print(f'{"sqlite":<12}{cold_store * 1000:>12.3f}{warm_store * 1000:>12.3f}')
+    print(f'One-off build of the SQLite store: {build * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 import json
+from contextlib import contextmanager
 
 from flask_testing import TestCase
+from sqlalchemy import event
 
 from app import create_app, db, config
+from app.models import User
 
 
 class BaseTestCase(TestCase):
@@ -50,3 +53,38 @@ class BaseTestCase(TestCase):
             data=dict(email=email, password=password),
             follow_redirects=True
         )
+
+    def create_user(self, email, username):
+        """
+        Helper method for inserting a user directly into the database
+        :return: The created user
+        """
+        user = User(email=email, username=username, password=None, verified=True)
+        user.save()
+        return user
+
+    def login_as(self, user):
+        """
+        Helper method for logging a user in without going through the login form
+        :return:
+        """
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    @contextmanager
+    def count_queries(self):
+        """
+        Helper context manager for counting the SQL statements issued inside its block
+        :return: List that collects the executed statements
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,52 @@
+import unittest
+
+from app.shared.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_entries_expire(self):
+        """
+        Test that entries are no longer returned once older than the TTL.
+        """
+        timer = FakeTimer()
+        cache = TTLCache(maxsize=10, ttl=5, timer=timer)
+        cache.set('key', 'value')
+
+        timer.now = 4.9
+        assert cache.get('key') == 'value'
+        timer.now = 5.0
+        assert cache.get('key', 'missing') == 'missing'
+        assert len(cache) == 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """
+        Test that the least recently used entry is evicted once the cache is full.
+        """
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    def test_false_values_are_cached(self):
+        """
+        Test that falsy values are distinguished from missing entries.
+        """
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('key', False)
+
+        assert cache.get('key') is False
+        cache.delete('key')
+        assert cache.get('key') is None
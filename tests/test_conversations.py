@@ -0,0 +1,273 @@
+import unittest
+
+from sqlalchemy import event, update
+
+from app import db
+from app.conversations import conversation_services
+from app.messages import messages_service
+from app.models import ConversationMember, ReadMessage
+from tests.base import BaseTestCase
+
+
+class TestConversationHistory(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = self.create_user('alice@gmail.com', 'alice')
+        self.bob = self.create_user('bob@gmail.com', 'bob')
+        self.conversation = conversation_services.create_private_conversation(self.alice.id, self.bob.id)
+
+    def test_history_pagination(self):
+        """
+        Test that history pages are returned oldest first while the cursor walks back in time.
+        """
+        messages = [messages_service.create_message(self.alice.id, self.conversation.id, f'Message {i}') for i in range(5)]
+        self.login_as(self.alice)
+
+        latest = self.client.get(f'/api/v1/conversations/history/{self.conversation.id}?limit=3').json
+        older = self.client.get(f'/api/v1/conversations/history/{self.conversation.id}?limit=3&cursor={latest["nextCursor"]}').json
+
+        assert [message['id'] for message in latest['messages']] == [message.id for message in messages[2:]]
+        assert [message['id'] for message in older['messages']] == [message.id for message in messages[:2]]
+        assert older['nextCursor'] is None
+
+    def test_history_requires_membership(self):
+        """
+        Test that users outside the conversation cannot read its history.
+        """
+        outsider = self.create_user('eve@gmail.com', 'eve')
+        self.login_as(outsider)
+
+        response = self.client.get(f'/api/v1/conversations/history/{self.conversation.id}')
+
+        assert response.status_code == 401
+
+
+class TestConversationList(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = self.create_user('alice@gmail.com', 'alice')
+        self.others = [self.create_user(f'user{i}@gmail.com', f'user{i}') for i in range(4)]
+        self.conversations = [conversation_services.create_private_conversation(self.alice.id, other.id)
+                              for other in self.others]
+
+    def test_sorted_by_last_activity(self):
+        """
+        Test that conversations are ordered by their latest message, with previews and unread counts.
+        """
+        messages_service.create_message(self.others[1].id, self.conversations[1].id, 'Hello')
+        messages_service.create_message(self.others[1].id, self.conversations[1].id, 'Are you there?')
+        messages_service.create_message(self.alice.id, self.conversations[2].id, 'Hi')
+        self.login_as(self.alice)
+
+        conversations = self.client.get('/api/v1/conversations/all').json['conversations']
+
+        assert [conversation['id'] for conversation in conversations[:2]] == [self.conversations[2].id, self.conversations[1].id]
+        assert conversations[0]['unreadCount'] == 0
+        assert conversations[1]['unreadCount'] == 2
+        assert conversations[1]['lastMessage']['content'] == 'Are you there?'
+        assert {user['id'] for user in conversations[1]['users']} == {self.alice.id, self.others[1].id}
+
+    def test_unread_count_follows_watermark(self):
+        """
+        Test that reading a conversation clears its unread count.
+        """
+        messages_service.create_message(self.others[0].id, self.conversations[0].id, 'Hello')
+        conversation_services.read_conversation(self.alice.id, self.conversations[0].id)
+        self.login_as(self.alice)
+
+        conversations = self.client.get('/api/v1/conversations/all').json['conversations']
+
+        assert all(conversation['unreadCount'] == 0 for conversation in conversations)
+
+    def test_delete_last_message(self):
+        """
+        Test that deleting the latest message points the conversation at the previous one.
+        """
+        first = messages_service.create_message(self.alice.id, self.conversations[0].id, 'First')
+        second = messages_service.create_message(self.alice.id, self.conversations[0].id, 'Second')
+        messages_service.delete_message(second)
+
+        assert self.conversations[0].last_message_id == first.id
+
+    def test_pagination_and_query_count(self):
+        """
+        Test that the conversation list is paginated and loaded with a constant number of queries.
+        """
+        for conversation, other in zip(self.conversations, self.others):
+            messages_service.create_message(other.id, conversation.id, 'Hello')
+        self.login_as(self.alice)
+        self.client.get('/api/v1/conversations/all?limit=1')
+
+        with self.count_queries() as one:
+            first = self.client.get('/api/v1/conversations/all?limit=1').json
+        with self.count_queries() as many:
+            second = self.client.get(f'/api/v1/conversations/all?limit=3&cursor={first["nextCursor"]}').json
+
+        assert len(first['conversations']) == 1
+        assert len(second['conversations']) == 3
+        assert second['nextCursor'] is None
+        assert len(one) == len(many)
+
+
+class TestMembershipCache(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = self.create_user('alice@gmail.com', 'alice')
+        self.bob = self.create_user('bob@gmail.com', 'bob')
+        self.eve = self.create_user('eve@gmail.com', 'eve')
+
+    def test_repeated_checks_are_cached(self):
+        """
+        Test that membership is checked with at most one query, and none once cached.
+        """
+        conversation = conversation_services.create_private_conversation(self.alice.id, self.bob.id)
+        alice_id, eve_id, conversation_id = self.alice.id, self.eve.id, conversation.id
+        conversation_services.invalidate_membership(alice_id, conversation_id)
+
+        with self.count_queries() as first:
+            assert conversation_services.check_user_in_conversation(alice_id, conversation_id)
+        with self.count_queries() as second:
+            assert conversation_services.check_user_in_conversation(alice_id, conversation_id)
+            assert not conversation_services.check_user_in_conversation(eve_id, conversation_id)
+            assert not conversation_services.check_user_in_conversation(eve_id, conversation_id)
+
+        assert len(first) == 1
+        assert len(second) == 1
+
+    def test_group_creation_replaces_negative_entries(self):
+        """
+        Test that creating a conversation updates the cached memberships of its members.
+        """
+        conversation = conversation_services.create_group_conversation('Group', [self.alice.id, self.bob.id], self.alice.id)
+        assert not conversation_services.check_user_in_conversation(self.eve.id, conversation.id)
+
+        conversation_services.cache_memberships(conversation.id, [self.eve.id])
+
+        assert conversation_services.check_user_in_conversation(self.eve.id, conversation.id)
+
+    def test_rest_endpoint_uses_cache(self):
+        """
+        Test that fetching a conversation checks membership without querying the members.
+        """
+        conversation = conversation_services.create_private_conversation(self.alice.id, self.bob.id)
+        self.login_as(self.alice)
+        self.client.get(f'/api/v1/conversations/{conversation.id}')
+
+        with self.count_queries() as statements:
+            response = self.client.get(f'/api/v1/conversations/{conversation.id}')
+
+        assert response.status_code == 200
+        assert not [statement for statement in statements if 'FROM conversation_members' in statement
+                    and 'LIMIT' in statement]
+
+
+class TestReadState(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = self.create_user('alice@gmail.com', 'alice')
+        self.bob = self.create_user('bob@gmail.com', 'bob')
+        self.carol = self.create_user('carol@gmail.com', 'carol')
+        self.conversation = conversation_services.create_group_conversation(
+            'Study group', [self.alice.id, self.bob.id, self.carol.id], self.alice.id)
+        self.messages = [messages_service.create_message(self.alice.id, self.conversation.id, f'Message {i}')
+                         for i in range(3)]
+
+    def test_read_conversation_reports_messages_read_by_all(self):
+        """
+        Test that bluetick message IDs are only reported once every member has read them.
+        """
+        message_ids = [message.id for message in self.messages]
+
+        assert conversation_services.read_conversation(self.alice.id, self.conversation.id) == []
+        assert conversation_services.read_conversation(self.bob.id, self.conversation.id) == []
+        assert conversation_services.read_conversation(self.carol.id, self.conversation.id) == message_ids
+        assert conversation_services.read_conversation(self.carol.id, self.conversation.id) == []
+
+    def test_concurrent_read_is_reported_once(self):
+        """
+        Test that a read whose watermark was moved past it by a concurrent read reports no messages.
+        """
+        message_ids = [message.id for message in self.messages]
+        conversation_services.read_conversation(self.alice.id, self.conversation.id)
+        conversation_services.read_conversation(self.bob.id, self.conversation.id)
+        concurrent_reads = []
+
+        def read_concurrently(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE conversation_member') and not concurrent_reads:
+                concurrent_reads.append(message_ids)
+                with db.engine.connect() as other:
+                    other.execute(
+                        update(ConversationMember)
+                        .where(ConversationMember.user_id == self.carol.id)
+                        .values(last_read_message_id=message_ids[-1])
+                    )
+                    other.commit()
+
+        event.listen(db.engine, 'before_cursor_execute', read_concurrently)
+        try:
+            read_ids = conversation_services.advance_read_watermark(self.carol.id, self.conversation.id, message_ids[1])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', read_concurrently)
+
+        assert concurrent_reads
+        assert read_ids == []
+
+    def test_read_message_advances_watermark(self):
+        """
+        Test that reading a message also marks the earlier messages as read, but not later ones.
+        """
+        messages_service.read_message(self.messages[1].id, self.bob.id)
+
+        assert self.bob.id in self.messages[0].serialized['readUserIds']
+        assert self.bob.id in self.messages[1].serialized['readUserIds']
+        assert self.bob.id not in self.messages[2].serialized['readUserIds']
+
+    def test_read_by_all(self):
+        """
+        Test that a message is read by all once every member's watermark has passed it.
+        """
+        messages_service.read_message(self.messages[0].id, self.alice.id)
+        messages_service.read_message(self.messages[0].id, self.bob.id)
+
+        assert not self.messages[0].read_by_all
+
+        messages_service.read_message(self.messages[2].id, self.carol.id)
+
+        assert self.messages[0].read_by_all
+        assert not self.messages[1].read_by_all
+
+    def test_history_read_receipts_query_count(self):
+        """
+        Test that read receipts of a history page are loaded without a query per message.
+        """
+        self.login_as(self.alice)
+        url = f'/api/v1/conversations/history/{self.conversation.id}'
+        self.client.get(url)
+
+        with self.count_queries() as few_messages:
+            self.client.get(url)
+        for i in range(10):
+            messages_service.create_message(self.bob.id, self.conversation.id, f'Reply {i}')
+        self.client.get(url)
+        with self.count_queries() as many_messages:
+            response = self.client.get(url)
+
+        assert len(response.json['messages']) == 13
+        assert len(many_messages) == len(few_messages)
+
+    def test_backfill_read_state(self):
+        """
+        Test that the watermarks are initialised from the legacy per-message read records.
+        """
+        db.session.add_all([ReadMessage(self.messages[0].id, self.bob.id), ReadMessage(self.messages[1].id, self.bob.id)])
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['conversations', 'backfill-read-state'])
+
+        assert result.exit_code == 0
+        assert self.bob.id in self.messages[1].serialized['readUserIds']
+        assert self.bob.id not in self.messages[2].serialized['readUserIds']
+
+
+if __name__ == '__main__':
+    unittest.main()
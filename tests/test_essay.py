@@ -0,0 +1,207 @@
+import datetime
+import json
+import threading
+
+from app import db
+from app.ai.essay import jobs, services
+from app.ai.llm import LLMClient
+from app.models import Essay, EssayJob, EssayJobStatus, EssaySuggestion, User
+from tests.base import BaseTestCase
+
+GRADED = {
+    'grade': 'Good',
+    'comment': 'Well argued',
+    'suggestions': [{'area': 'Examples', 'problem': 'Too vague', 'solution': 'Cite a study'}]
+}
+
+
+class FakeLLMClient(LLMClient):
+    """
+    LLM client replying with a fixed grade, optionally waiting for an event before replying
+    """
+
+    def __init__(self, reply=json.dumps(GRADED), release: threading.Event = None):
+        self.reply = reply
+        self.release = release
+        self.calls = 0
+
+    def complete(self, messages, model=None, **options):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return self.reply
+
+
+class TestEssayJobs(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('grader@test.com', 'grader')
+        self.user_id = self.user.id
+        self.login_as(self.user)
+
+        self.llm_client = FakeLLMClient()
+        self.app.extensions['llm_client'] = self.llm_client
+        self.addCleanup(self.app.extensions.pop, 'llm_client', None)
+
+        # Record the future of every submitted job, so tests can wait for the grading workers
+        self.futures = []
+        submit = jobs.submit
+
+        def record_submit(*args):
+            future = submit(*args)
+            self.futures.append(future)
+            return future
+
+        jobs.submit = record_submit
+        self.addCleanup(setattr, jobs, 'submit', submit)
+
+    def wait_for_jobs(self):
+        for future in self.futures:
+            future.result(timeout=10)
+        db.session.expire_all()
+
+    def test_grade_returns_job_before_grading(self):
+        """
+        Test that the grade endpoint returns a queued job without waiting for the LLM
+        """
+        release = threading.Event()
+        self.llm_client.release = release
+
+        response = self.client.post('/api/v1/ai/essay/grade', json={'topic': 'Cities', 'essay': 'Cities are big.'})
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(response.json['status'], ('QUEUED', 'RUNNING'))
+        self.assertIsNone(response.json['essayId'])
+
+        release.set()
+        self.wait_for_jobs()
+
+        response = self.client.get(f"/api/v1/ai/essay/jobs/{response.json['id']}")
+        self.assert200(response)
+        self.assertEqual(response.json['status'], 'DONE')
+
+        essay = Essay.get_by_id(response.json['essayId'])
+        self.assertEqual(essay.topic, 'Cities')
+        self.assertEqual(essay.comment, 'Well argued')
+        self.assertEqual(len(essay.suggestions), 1)
+
+    def test_failed_job_refunds_credit(self):
+        """
+        Test that a job whose reply cannot be parsed fails and refunds the charged credit
+        """
+        self.llm_client.reply = 'not json'
+
+        with self.app.test_request_context():
+            job_id = jobs.enqueue('Cities', 'Cities are big.', self.user_id, charged=True).id
+        self.wait_for_jobs()
+
+        job = EssayJob.get_by_id(job_id)
+        self.assertEqual(job.status, EssayJobStatus.FAILED)
+        self.assertIsNotNone(job.error)
+        self.assertEqual(User.get_by_id(self.user_id).credits, 11)
+        self.assertEqual(Essay.query.count(), 0)
+
+    def test_job_is_graded_once(self):
+        """
+        Test that a job submitted twice is only graded by the worker that claims it
+        """
+        with self.app.test_request_context():
+            job_id = jobs.enqueue('Cities', 'Cities are big.', self.user_id).id
+            jobs.submit(self.app, job_id, self.llm_client)
+        self.wait_for_jobs()
+
+        self.assertEqual(self.llm_client.calls, 1)
+        self.assertEqual(Essay.query.count(), 1)
+
+    def test_recover_lost_jobs(self):
+        """
+        Test that queued jobs are graded again, and stale running jobs are failed and refunded, after a restart
+        """
+        queued, stale, running = (EssayJob('Cities', 'Cities are big.', self.user_id, charged=True) for _ in range(3))
+        stale.status = running.status = EssayJobStatus.RUNNING
+        db.session.add_all([queued, stale, running])
+        db.session.commit()
+        stale.date_updated = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        db.session.commit()
+        queued_id, stale_id, running_id = queued.id, stale.id, running.id
+
+        result = self.app.test_cli_runner().invoke(args=['ai', 'recover-essay-jobs'])
+        self.assertEqual(result.exit_code, 0)
+        self.wait_for_jobs()
+
+        self.assertEqual(EssayJob.get_by_id(queued_id).status, EssayJobStatus.DONE)
+        self.assertEqual(EssayJob.get_by_id(stale_id).status, EssayJobStatus.FAILED)
+        self.assertEqual(EssayJob.get_by_id(running_id).status, EssayJobStatus.RUNNING)
+        self.assertEqual(User.get_by_id(self.user_id).credits, 11)
+
+    def test_get_job_of_another_user(self):
+        """
+        Test that users cannot poll the jobs of other users
+        """
+        other = self.create_user('other@test.com', 'other')
+        job = EssayJob('Cities', 'Cities are big.', other.id)
+        job.save()
+
+        response = self.client.get(f'/api/v1/ai/essay/jobs/{job.id}')
+        self.assert401(response)
+
+        response = self.client.get('/api/v1/ai/essay/jobs/unknown')
+        self.assert404(response)
+
+
+class TestEssayList(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('writer@test.com', 'writer')
+        self.user_id = self.user.id
+        self.login_as(self.user)
+        self.app.extensions['llm_client'] = FakeLLMClient()
+        self.addCleanup(self.app.extensions.pop, 'llm_client', None)
+
+    def grade(self, count):
+        graded = dict(GRADED, suggestions=GRADED['suggestions'] * 3)
+        client = FakeLLMClient(json.dumps(graded))
+        return [services.grade_essay(f'Topic {i}', 'Content', self.user_id, client).id for i in range(count)]
+
+    def test_grade_essay_single_transaction(self):
+        """
+        Test that an essay and its suggestions are persisted with one commit and one suggestions insert
+        """
+        with self.count_queries() as statements:
+            self.grade(1)
+
+        inserts = [statement for statement in statements if statement.startswith('INSERT INTO essay_suggestions')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(EssaySuggestion.query.count(), 3)
+
+    def test_get_all_essays_paginated(self):
+        """
+        Test that the essays are paginated most recent first, with the suggestions loaded by a single query
+        """
+        essay_ids = self.grade(5)
+        self.client.get('/api/v1/ai/essay/all?limit=1')
+
+        with self.count_queries() as statements:
+            response = self.client.get('/api/v1/ai/essay/all?limit=3')
+        self.assert200(response)
+        self.assertEqual([essay['id'] for essay in response.json['essays']], essay_ids[:-4:-1])
+        self.assertEqual(len(response.json['essays'][0]['suggestions']), 3)
+        self.assertEqual(len([statement for statement in statements if 'FROM essay_suggestions' in statement]), 1)
+
+        response = self.client.get(f"/api/v1/ai/essay/all?limit=3&cursor={response.json['nextCursor']}")
+        self.assertEqual([essay['id'] for essay in response.json['essays']], essay_ids[1::-1])
+        self.assertIsNone(response.json['nextCursor'])
+
+    def test_get_all_essays_summary(self):
+        """
+        Test that the summary mode omits the content and suggestions of the essays without loading them
+        """
+        self.grade(2)
+        self.client.get('/api/v1/ai/essay/all?limit=1')
+
+        with self.count_queries() as statements:
+            response = self.client.get('/api/v1/ai/essay/all?summary=true')
+        self.assert200(response)
+        self.assertEqual(len(response.json['essays']), 2)
+        self.assertNotIn('essay', response.json['essays'][0])
+        self.assertNotIn('suggestions', response.json['essays'][0])
+        self.assertFalse([statement for statement in statements if 'essay_suggestions' in statement])
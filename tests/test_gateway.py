@@ -0,0 +1,153 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import openai
+
+from app.ai.gateway import Gateway, TokenBucket
+from benchmarks.mock_openai_server import MockOpenAIServer
+
+
+def embedding_response(texts):
+    return {'data': [{'index': i, 'embedding': [float(len(text))]} for i, text in reversed(list(enumerate(texts)))]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        """
+        Test that the bucket allows a burst of its capacity, then one request per 1 / rate seconds
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, timer=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(clock.now, 0)
+
+        bucket.acquire()
+        bucket.acquire()
+        self.assertAlmostEqual(clock.now, 1.0)
+
+
+class TestGateway(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.gateway = Gateway(requests_per_minute=60000, max_concurrency=4, max_retries=2,
+                               backoff=0.001, batch_window=0.05, max_batch_size=3, sleep=self.sleep)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        time.sleep(seconds)
+
+    def test_retries_with_backoff(self):
+        """
+        Test that retryable errors are retried with increasing delays
+        """
+        reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Hello'))])
+        errors = [openai.error.RateLimitError('Slow down'), openai.error.ServiceUnavailableError('Overloaded')]
+        with patch.object(openai.ChatCompletion, 'create', side_effect=errors + [reply]) as create:
+            self.assertEqual(self.gateway.chat([{'role': 'user', 'content': 'Hi'}], 'model'), 'Hello')
+
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(create.call_args.kwargs['request_timeout'], self.gateway.timeout)
+        self.assertLess(self.sleeps[0], self.sleeps[1])
+
+    def test_client_errors_are_not_retried(self):
+        """
+        Test that errors which cannot succeed on retry are raised immediately, and retries are bounded
+        """
+        with patch.object(openai.ChatCompletion, 'create',
+                          side_effect=openai.error.InvalidRequestError('Bad model', 'model')) as create:
+            with self.assertRaises(openai.error.InvalidRequestError):
+                self.gateway.chat([], 'model')
+        self.assertEqual(create.call_count, 1)
+
+        with patch.object(openai.ChatCompletion, 'create', side_effect=openai.error.Timeout('Timed out')) as create:
+            with self.assertRaises(openai.error.Timeout):
+                self.gateway.chat([], 'model')
+        self.assertEqual(create.call_count, 3)
+
+    def test_stream_retries_like_requests(self):
+        """
+        Test that opening a stream retries server errors like other requests, without holding a concurrency slot
+        while backing off
+        """
+        chunk = SimpleNamespace(choices=[SimpleNamespace(delta={'content': 'Hello'})])
+        slots = []
+        self.gateway.sleep = lambda seconds: slots.append(self.gateway.semaphore._value)
+
+        with patch.object(openai.ChatCompletion, 'create',
+                          side_effect=[openai.error.APIError('Bad gateway', http_status=502), iter([chunk])]) as create:
+            self.assertEqual(list(self.gateway.chat_stream([], 'model')), ['Hello'])
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(slots, [4])
+        self.assertEqual(self.gateway.semaphore._value, 4)
+
+        with patch.object(openai.ChatCompletion, 'create',
+                          side_effect=openai.error.APIError('Bad request', http_status=400)) as create:
+            with self.assertRaises(openai.error.APIError):
+                list(self.gateway.chat_stream([], 'model'))
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(self.gateway.semaphore._value, 4)
+
+    def test_concurrent_embeddings_are_batched(self):
+        """
+        Test that the texts of concurrent callers are embedded by requests of up to max_batch_size texts,
+        and every caller gets the embeddings of its own texts
+        """
+        results = {}
+
+        def embed(texts):
+            results[texts[0]] = self.gateway.embed(texts, 'model')
+
+        with patch.object(openai.Embedding, 'create', side_effect=lambda input, **_: embedding_response(input)) as create:
+            threads = [threading.Thread(target=embed, args=(['x' * i, 'y' * i],)) for i in range(1, 4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(results, {'x' * i: [[float(i)], [float(i)]] for i in range(1, 4)})
+
+    def test_batch_failure_reaches_every_caller(self):
+        """
+        Test that the error of a batch is raised to every caller of the batch
+        """
+        with patch.object(openai.Embedding, 'create', side_effect=openai.error.InvalidRequestError('Too long', 'input')):
+            with self.assertRaises(openai.error.InvalidRequestError):
+                self.gateway.embed(['text'], 'model')
+
+        self.assertEqual(self.gateway._pending, {})
+
+    def test_mock_server(self):
+        """
+        Test that the gateway talks to the mock server through the pooled session, streaming included
+        """
+        server = MockOpenAIServer(latency=0).start()
+        self.addCleanup(server.shutdown)
+        gateway = Gateway(api_base=server.api_base)
+
+        with patch.object(openai, 'api_key', 'mock'):
+            messages = [{'role': 'user', 'content': 'Hi'}]
+            answer = gateway.chat(messages, 'model')
+            self.assertEqual(''.join(gateway.chat_stream(messages, 'model')).strip(), answer)
+            self.assertEqual(len(gateway.embed(['Hi'], 'model')[0]), 1536)
+
+        self.assertEqual(server.requests, {'/v1/chat/completions': 2, '/v1/embeddings': 1})
@@ -0,0 +1,165 @@
+import time
+from unittest.mock import patch
+
+from flask import g
+from socketio import Server
+
+from app import socketio
+from app.conversations import conversation_services
+from app.messages import routes
+from app.shared.message_queue import LocalPubSubManager, create_client_manager
+from tests.base import BaseTestCase
+
+
+class TestMessageQueue(BaseTestCase):
+    def create_worker(self, channel):
+        """
+        Helper method for creating the Socket.IO server of a worker sharing events through the local message queue
+        :return: The server and the packets it sent to its clients
+        """
+        server = Server(client_manager=LocalPubSubManager(channel=channel), async_mode='threading')
+        server.manager.initialize()
+        sent = []
+        server._send_eio_packet = lambda eio_sid, packet: sent.append((eio_sid, packet.data))
+        self.addCleanup(server.manager.close)
+        return server, sent
+
+    def wait_for(self, sent, timeout=2.0):
+        """
+        Helper method for waiting on the packets delivered asynchronously by the message queue
+        :return: The sent packets
+        """
+        deadline = time.time() + timeout
+        while not sent and time.time() < deadline:
+            time.sleep(0.01)
+        return sent
+
+    def test_create_client_manager(self):
+        """
+        Test that the message queue URL selects the client manager.
+        """
+        assert create_client_manager(None, 'channel') is None
+        assert isinstance(create_client_manager('local://', 'channel', write_only=True), LocalPubSubManager)
+
+    def test_emit_from_another_worker(self):
+        """
+        Test that an event emitted by one worker reaches the clients connected to another one.
+        """
+        first, _ = self.create_worker('test-fanout')
+        second, sent = self.create_worker('test-fanout')
+        sid = second.manager.connect('eio-sid', '/messages/socket')
+        second.manager.enter_room(sid, '/messages/socket', 1)
+
+        first.emit('new_message', {'content': 'Hello'}, room=1, namespace='/messages/socket')
+
+        assert self.wait_for(sent) == [('eio-sid', '2/messages/socket,["new_message",{"content":"Hello"}]')]
+
+    def test_channels_are_isolated(self):
+        """
+        Test that events are only delivered to the managers subscribed to the same channel.
+        """
+        publisher = LocalPubSubManager(channel='first', write_only=True)
+        subscriber = LocalPubSubManager(channel='first')
+        other = LocalPubSubManager(channel='second')
+        self.addCleanup(subscriber.close)
+        self.addCleanup(other.close)
+
+        publisher._publish({'method': 'emit'})
+
+        assert subscriber.queue.get(timeout=1) == {'method': 'emit'}
+        assert other.queue.empty()
+
+
+class TestConversationRooms(BaseTestCase):
+    def connect(self, user):
+        """
+        Helper method for connecting a user to the messages socket
+        :return: The Socket.IO test client
+        """
+        self.login_as(user)
+        client = socketio.test_client(self.app, namespace='/messages/socket', flask_test_client=self.client)
+        self.addCleanup(client.disconnect, '/messages/socket')
+        return client
+
+    def send_to_group(self, size):
+        """
+        Helper method for sending a message to a group of the given size
+        :return: The emitted events and the executed statements while handling the message
+        """
+        users = [self.create_user(f'{size}-{i}@gmail.com', f'{size}user{i}') for i in range(size)]
+        conversation = conversation_services.create_group_conversation('Group', [user.id for user in users], users[0].id)
+        client = self.connect(users[0])
+
+        emitted = []
+        with patch.object(routes, 'emit', side_effect=lambda *args, **kwargs: emitted.append(kwargs['room'])):
+            with self.count_queries() as statements:
+                self.emit(client, 'message', {'conversation_id': conversation.id, 'content': 'Hello'})
+        return conversation, emitted, statements
+
+    def emit(self, client, event, payload):
+        """
+        Helper method for emitting an event as the user of a test client
+        :return:
+        """
+        # The app context is shared with the test, so drop the user cached by flask_login for another client
+        g.pop('_login_user', None)
+        client.emit(event, payload, namespace='/messages/socket')
+
+    def rooms_of(self, client):
+        """
+        Helper method for listing the rooms a test client is subscribed to
+        :return: The rooms of the client
+        """
+        manager = socketio.server.manager
+        sid = manager.sid_from_eio_sid(client.eio_sid, '/messages/socket')
+        return set(manager.get_rooms(sid, '/messages/socket'))
+
+    def test_join_conversation_rooms_on_connect(self):
+        """
+        Test that connecting subscribes the socket to the rooms of the conversations of the user.
+        """
+        alice = self.create_user('alice@gmail.com', 'alice')
+        bob = self.create_user('bob@gmail.com', 'bob')
+        conversation = conversation_services.create_private_conversation(alice.id, bob.id)
+
+        assert conversation.id in self.rooms_of(self.connect(alice))
+
+    def test_join_room_of_new_conversation(self):
+        """
+        Test that members connected before a conversation was created are subscribed to its room.
+        """
+        alice = self.create_user('alice@gmail.com', 'alice')
+        bob = self.create_user('bob@gmail.com', 'bob')
+        bob_client = self.connect(bob)
+        alice_client = self.connect(alice)
+
+        self.emit(alice_client, 'create_private_conversation', {'target_id': bob.id})
+        conversation_id = conversation_services.get_user_conversation_ids(alice.id)[0]
+
+        assert conversation_id in self.rooms_of(alice_client)
+        assert conversation_id in self.rooms_of(bob_client)
+
+    def test_join_conversation_requires_membership(self):
+        """
+        Test that a user cannot subscribe to the room of a conversation it is not part of.
+        """
+        alice = self.create_user('alice@gmail.com', 'alice')
+        bob = self.create_user('bob@gmail.com', 'bob')
+        eve = self.create_user('eve@gmail.com', 'eve')
+        conversation = conversation_services.create_private_conversation(alice.id, bob.id)
+        eve_client = self.connect(eve)
+
+        self.emit(eve_client, 'join_conversation', {'conversation_id': conversation.id})
+
+        assert conversation.id not in self.rooms_of(eve_client)
+
+    def test_broadcast_cost_independent_of_group_size(self):
+        """
+        Test that sending a message costs one emit and the same queries whatever the size of the group.
+        """
+        small, small_emits, small_statements = self.send_to_group(2)
+        large, large_emits, large_statements = self.send_to_group(20)
+
+        assert small_emits == [small.id]
+        assert large_emits == [large.id]
+        assert len(small_statements) == len(large_statements)
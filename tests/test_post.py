@@ -0,0 +1,325 @@
+import unittest
+
+from app import db
+from app.models import Post, PostVote, Reply, ReplyVote, Subject
+from tests.base import BaseTestCase
+
+
+class TestPostVotes(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author@gmail.com', 'author')
+        self.post = Post(title='Title', post='Body', subject=Subject.PHYSICS, user_id=self.author.id)
+        self.post.save()
+        self.reply = Reply('Reply', self.author.id, self.post.id)
+        self.reply.save()
+
+    def test_upvote_post_updates_tally(self):
+        """
+        Test that upvoting a post increments its stored counters and reports the user's vote.
+        """
+        self.login_as(self.author)
+        response = self.client.post(f'/api/v1/posts/{self.post.id}/upvote')
+
+        assert response.status_code == 200
+        assert response.json['score'] == 1
+        assert response.json['upvotes'] == 1
+        assert response.json['downvotes'] == 0
+        assert response.json['userVote'] == 1
+
+    def test_toggle_post_vote(self):
+        """
+        Test that switching and retracting a vote keeps the counters consistent.
+        """
+        self.login_as(self.author)
+        self.client.post(f'/api/v1/posts/{self.post.id}/upvote')
+        response = self.client.post(f'/api/v1/posts/{self.post.id}/downvote')
+
+        assert response.json['score'] == -1
+        assert response.json['upvotes'] == 0
+        assert response.json['downvotes'] == 1
+
+        response = self.client.post(f'/api/v1/posts/{self.post.id}/downvote')
+
+        assert response.json['score'] == 0
+        assert response.json['downvotes'] == 0
+        assert response.json['userVote'] == 0
+
+    def test_reply_vote_tally(self):
+        """
+        Test that voting on a reply updates the reply counters.
+        """
+        voter = self.create_user('voter@gmail.com', 'voter')
+        self.login_as(voter)
+        response = self.client.post(f'/api/v1/replies/{self.reply.id}/downvote')
+
+        assert response.status_code == 200
+        assert response.json['score'] == -1
+        assert response.json['downvotes'] == 1
+        assert response.json['userVote'] == -1
+
+    def test_reconcile_vote_tallies(self):
+        """
+        Test that the reconcile command rebuilds the counters from the vote rows.
+        """
+        voter = self.create_user('voter@gmail.com', 'voter')
+        db.session.add_all([PostVote(1, self.author.id, self.post.id), PostVote(-1, voter.id, self.post.id)])
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['posts', 'reconcile-votes'])
+        db.session.refresh(self.post)
+
+        assert result.exit_code == 0
+        assert self.post.upvotes == 1
+        assert self.post.downvotes == 1
+        assert self.post.score == 0
+
+
+class TestPostFeed(BaseTestCase):
+    def create_posts(self, count):
+        """
+        Helper method for creating posts by distinct authors, each with replies and votes
+        """
+        for i in range(count):
+            author = self.create_user(f'author{i}@gmail.com', f'author{i}')
+            post = Post(title=f'Title {i}', post='Body', subject=Subject.PHYSICS, user_id=author.id)
+            post.save()
+            db.session.add_all([Reply('Reply', author.id, post.id), Reply('Reply', author.id, post.id)])
+            db.session.add(PostVote(1, author.id, post.id))
+        db.session.commit()
+        Post.reconcile_vote_tallies()
+
+    def test_feed_serialization(self):
+        """
+        Test that the feed includes reply counts, vote tallies and embedded authors.
+        """
+        self.create_posts(2)
+        response = self.client.get('/api/v1/posts/all?limit=10')
+        posts = response.json['posts']
+
+        assert response.status_code == 200
+        assert len(posts) == 2
+        assert all(post['replyCount'] == 2 for post in posts)
+        assert all(post['score'] == 1 for post in posts)
+        assert all(post['author']['id'] == post['authorId'] for post in posts)
+
+    def test_feed_query_count_is_constant(self):
+        """
+        Test that the number of queries issued by the feed does not grow with the page size.
+        """
+        self.create_posts(10)
+        viewer = self.create_user('viewer@gmail.com', 'viewer')
+        self.login_as(viewer)
+        self.client.get('/api/v1/posts/all?limit=1')
+
+        with self.count_queries() as small_page:
+            self.client.get('/api/v1/posts/all?limit=2')
+        with self.count_queries() as full_page:
+            response = self.client.get('/api/v1/posts/all?limit=10')
+
+        assert len(response.json['posts']) == 10
+        assert len(full_page) == len(small_page)
+        assert len(full_page) <= 4
+
+    def test_feed_cursor_pagination(self):
+        """
+        Test that following the cursors visits every post exactly once, newest first.
+        """
+        self.create_posts(5)
+        seen, cursor = [], None
+        while True:
+            url = '/api/v1/posts/all?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url)
+            seen += [post['id'] for post in response.json['posts']]
+            cursor = response.json['nextCursor']
+            if not cursor:
+                break
+
+        assert seen == sorted(seen, reverse=True)
+        assert len(set(seen)) == 5
+
+    def test_user_posts_cursor_pagination(self):
+        """
+        Test that the user posts endpoint pages through only that user's posts.
+        """
+        self.create_posts(2)
+        author = self.create_user('prolific@gmail.com', 'prolific')
+        for i in range(3):
+            Post(title=f'Mine {i}', post='Body', subject=Subject.MATHEMATICS, user_id=author.id).save()
+
+        first = self.client.get(f'/api/v1/posts/user?id={author.id}&limit=2').json
+        second = self.client.get(f'/api/v1/posts/user?id={author.id}&limit=2&cursor={first["nextCursor"]}').json
+
+        assert len(first['posts']) == 2
+        assert len(second['posts']) == 1
+        assert second['nextCursor'] is None
+        assert all(post['authorId'] == author.id for post in first['posts'] + second['posts'])
+
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor is rejected.
+        """
+        response = self.client.get('/api/v1/posts/all?cursor=not-a-cursor')
+
+        assert response.status_code == 400
+
+
+class TestPostSearch(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author@gmail.com', 'author')
+
+    def create_post(self, title, body, subject=Subject.PHYSICS):
+        post = Post(title=title, post=body, subject=subject, user_id=self.author.id)
+        post.save()
+        return post
+
+    def search(self, query, **params):
+        params = ''.join(f'&{key}={value}' for key, value in params.items())
+        return self.client.get(f'/api/v1/posts/search?query={query}{params}')
+
+    def test_search_matches_title_and_body(self):
+        """
+        Test that search matches both titles and bodies, ranking title matches first.
+        """
+        in_body = self.create_post('Circuit question', 'How does resistance relate to current?')
+        in_title = self.create_post('Resistance of a wire', 'Why does it change with length?')
+        self.create_post('Waves', 'What is the speed of sound?')
+
+        response = self.search('resistance')
+
+        assert response.status_code == 200
+        assert [post['id'] for post in response.json['posts']] == [in_title.id, in_body.id]
+
+    def test_search_prefix_and_subject_filter(self):
+        """
+        Test that partial words match and that results can be filtered by subject.
+        """
+        physics = self.create_post('Electromagnetic induction', 'Faraday')
+        self.create_post('Electrolysis', 'Electrodes', subject=Subject.CHEMISTRY)
+
+        response = self.search('electro', subjects='physics')
+
+        assert [post['id'] for post in response.json['posts']] == [physics.id]
+
+    def test_search_index_follows_deletes(self):
+        """
+        Test that deleted posts disappear from the search results.
+        """
+        post = self.create_post('Refraction', 'Snell law')
+        db.session.delete(post)
+        db.session.commit()
+
+        assert self.search('refraction').json['posts'] == []
+
+    def test_search_cursor_pagination(self):
+        """
+        Test that search results can be paged through with the returned cursor.
+        """
+        for i in range(5):
+            self.create_post(f'Momentum {i}', 'Conservation of momentum')
+
+        first = self.search('momentum', limit=3).json
+        second = self.search('momentum', limit=3, cursor=first['nextCursor']).json
+        ids = [post['id'] for post in first['posts'] + second['posts']]
+
+        assert len(ids) == 5
+        assert len(set(ids)) == 5
+        assert second['nextCursor'] is None
+
+    def test_search_ignores_query_syntax(self):
+        """
+        Test that search operators in user input do not cause errors.
+        """
+        self.create_post('Pressure', 'Force per unit area')
+
+        response = self.search('"pressure" * (')
+
+        assert response.status_code == 200
+        assert len(response.json['posts']) == 1
+
+
+class TestPostThread(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author@gmail.com', 'author')
+        self.post = Post(title='Title', post='Body', subject=Subject.PHYSICS, user_id=self.author.id)
+        self.post.save()
+
+    def create_replies(self, count):
+        """
+        Helper method for creating replies by distinct authors, each upvoted by the post author
+        """
+        replies = []
+        for i in range(count):
+            replier = self.create_user(f'replier{i}@gmail.com', f'replier{i}')
+            reply = Reply(f'Reply {i}', replier.id, self.post.id)
+            reply.save()
+            db.session.add(ReplyVote(1, self.author.id, reply.id))
+            replies.append(reply)
+        db.session.commit()
+        Reply.reconcile_vote_tallies()
+        return replies
+
+    def test_thread(self):
+        """
+        Test that the thread contains the post, its replies with votes and authors, and the resolving reply.
+        """
+        replies = self.create_replies(3)
+        self.post.resolved_by_id = replies[0].id
+        self.post.save()
+        self.login_as(self.author)
+
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/thread?limit=2')
+        thread = response.json
+
+        assert response.status_code == 200
+        assert thread['post']['id'] == self.post.id
+        assert [reply['id'] for reply in thread['replies']] == [replies[2].id, replies[1].id]
+        assert all(reply['userVote'] == 1 and reply['score'] == 1 for reply in thread['replies'])
+        assert all(reply['author']['id'] == reply['authorId'] for reply in thread['replies'])
+        assert thread['resolvedReply']['id'] == replies[0].id
+
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/thread?limit=2&cursor={thread["nextCursor"]}')
+        assert [reply['id'] for reply in response.json['replies']] == [replies[0].id]
+        assert response.json['nextCursor'] is None
+
+        assert self.client.get('/api/v1/posts/0/thread').status_code == 404
+
+    def test_thread_query_count_is_constant(self):
+        """
+        Test that the number of queries issued by the thread does not grow with the number of replies.
+        """
+        self.create_replies(10)
+        self.login_as(self.author)
+        self.client.get(f'/api/v1/posts/{self.post.id}/thread?limit=1')
+
+        with self.count_queries() as small_page:
+            self.client.get(f'/api/v1/posts/{self.post.id}/thread?limit=2')
+        with self.count_queries() as full_page:
+            response = self.client.get(f'/api/v1/posts/{self.post.id}/thread?limit=10')
+
+        assert len(response.json['replies']) == 10
+        assert len(full_page) == len(small_page)
+
+    def test_thread_etag(self):
+        """
+        Test that an unchanged thread is revalidated with a 304, and a changed one is sent again.
+        """
+        self.create_replies(1)
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/thread')
+        etag = response.headers['ETag']
+
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/thread', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        db.session.add(Reply('Another reply', self.author.id, self.post.id))
+        db.session.commit()
+        response = self.client.get(f'/api/v1/posts/{self.post.id}/thread', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert len(response.json['replies']) == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
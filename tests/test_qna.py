@@ -0,0 +1,504 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import openai
+from flask import Flask
+
+from app import config, db
+from app.ai.llm import LLMClient
+from app.ai.qna import cache, services
+from app.ai.qna import ingest
+from app.ai.qna.chunk_store import CHUNK_STORE_FILE, ChunkStore
+from app.ai.qna.embedders import HashingEmbedder
+from app.ai.qna.retrievers import LocalRetriever, Match
+from app.models import QnaAnswer, QnaCacheMetric, User
+from tests.base import BaseTestCase
+
+
+class TestLocalRetriever(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.chunk_ids = [f'Topic{i % 3}/{i}' for i in range(50)]
+        self.embeddings = rng.normal(size=(50, 16))
+        self.retriever = LocalRetriever.from_embeddings(self.chunk_ids, self.embeddings)
+
+    def brute_force(self, query, top_k):
+        """
+        Helper method ranking every chunk by cosine similarity
+        :return: The IDs and scores of the top k chunks
+        """
+        scores = [float(np.dot(row, query) / np.linalg.norm(row) / np.linalg.norm(query)) for row in self.embeddings]
+        order = sorted(range(len(scores)), key=lambda i: -scores[i])[:top_k]
+        return [self.chunk_ids[i] for i in order], [scores[i] for i in order]
+
+    def test_query_matches_brute_force(self):
+        """
+        Test that the top k chunks are the most similar by cosine similarity, best first.
+        """
+        query = self.embeddings[7] + 0.1
+
+        matches = self.retriever.query(query, 5)
+        ids, scores = self.brute_force(query, 5)
+
+        assert [match.id for match in matches] == ids
+        np.testing.assert_allclose([match.score for match in matches], scores, rtol=1e-5)
+        assert matches[0].topic == 'Topic1'
+
+    def test_top_k_larger_than_index(self):
+        """
+        Test that every chunk is returned when fewer chunks than requested are indexed.
+        """
+        assert len(self.retriever.query(self.embeddings[0], 100)) == 50
+
+    def test_save_and_load(self):
+        """
+        Test that a saved index is memory-mapped back with the same results.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.retriever.save(directory)
+            loaded = LocalRetriever.load(directory)
+
+            assert isinstance(loaded.embeddings, np.memmap)
+            assert loaded.query(self.embeddings[3], 4) == self.retriever.query(self.embeddings[3], 4)
+            del loaded
+
+
+class TestFormatExtracts(unittest.TestCase):
+    def test_threshold_keeps_best_match(self):
+        """
+        Test that the best match is always kept and weaker matches stop at the similarity threshold.
+        """
+        texts = {'Waves/0': 'first', 'Waves/1': 'second', 'Sound/0': 'third'}
+
+        extracts = services.format_extracts([Match('Waves/0', 0.5, 'Waves'), Match('Waves/1', 0.4, 'Waves')], texts)
+        assert 'Topic: Waves\nContent: first' in extracts
+        assert 'second' not in extracts
+
+        extracts = services.format_extracts([Match('Waves/1', 0.9, 'Waves'), Match('Waves/0', 0.6, 'Waves'),
+                                             Match('Sound/0', 0.8, 'Sound')], texts)
+        assert 'Topic: Waves\nContent: second' in extracts
+        assert 'first' not in extracts
+        assert 'third' not in extracts
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.json_path = os.path.join(self.directory.name, 'mapping.json')
+        self.path = os.path.join(self.directory.name, 'chunks.sqlite')
+        with open(self.json_path, 'w') as fp:
+            json.dump({'Waves/0': 'first', 'Waves/1': 'second', 'Sound/0': 'third'}, fp)
+
+    def test_lookup(self):
+        """
+        Test that chunks are looked up by ID, ignoring unknown IDs.
+        """
+        store = ChunkStore.from_json(self.path, self.json_path)
+
+        assert store.get('Waves/1') == 'second'
+        assert store.get('Waves/9') is None
+        assert store.get_many(['Sound/0', 'Waves/0', 'Waves/9']) == {'Sound/0': 'third', 'Waves/0': 'first'}
+        assert store.get_many([]) == {}
+
+    def test_rebuilt_when_mapping_changes(self):
+        """
+        Test that the store is rebuilt when the contents of the JSON mapping change, but not when only its time does.
+        """
+        ChunkStore.from_json(self.path, self.json_path)
+        built = os.stat(self.path).st_ino
+        os.utime(self.json_path, (os.path.getmtime(self.path) + 1,) * 2)
+        ChunkStore.from_json(self.path, self.json_path)
+        assert os.stat(self.path).st_ino == built
+
+        with open(self.json_path, 'w') as fp:
+            json.dump({'Waves/0': 'updated'}, fp)
+
+        assert ChunkStore.from_json(self.path, self.json_path).get('Waves/0') == 'updated'
+
+    def test_shipped_mapping(self):
+        """
+        Test that the store holds every chunk of the shipped mapping.
+        """
+        with open(config.BaseConfig.QNA_CHUNKS_JSON, 'r') as fp:
+            mapping = json.load(fp)
+        store = ChunkStore.from_json(self.path, config.BaseConfig.QNA_CHUNKS_JSON)
+
+        assert store.get_many(list(mapping)) == mapping
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dimension=64)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.source_dir = os.path.join(self.directory.name, 'data')
+        self.index_dir = os.path.join(self.directory.name, 'index')
+        os.makedirs(self.source_dir)
+        self.write('Magnetism', 'Like poles repel and unlike poles attract. ' * 60)
+        self.write('Sound', 'Sound is a longitudinal wave that needs a medium to travel. ' * 30)
+
+    def write(self, topic, text):
+        """
+        Helper method for writing a source document
+        :return:
+        """
+        with open(os.path.join(self.source_dir, f'{topic}.txt'), 'w') as fp:
+            fp.write(text)
+
+    def ingest(self, embedder):
+        """
+        Helper method for ingesting the source documents into the temporary directory
+        :return: The result of the ingestion
+        """
+        return ingest.ingest(self.source_dir, self.index_dir, embedder)
+
+    def test_chunk_text_ends_at_sentences(self):
+        """
+        Test that chunks end at the end of a sentence and cover the whole text.
+        """
+        text = 'One two three four five. ' * 40
+        chunks = list(ingest.chunk_text(text, size=20))
+
+        assert all(chunk.endswith('.') for chunk in chunks)
+        assert ' '.join(chunks) == text.strip()
+
+    def test_ingest_writes_index_and_chunk_store(self):
+        """
+        Test that ingestion writes a queryable index and the text of every chunk.
+        """
+        embedder = CountingEmbedder()
+        result = self.ingest(embedder)
+
+        retriever = LocalRetriever.load(self.index_dir)
+        store = ChunkStore(os.path.join(self.index_dir, CHUNK_STORE_FILE))
+        best = retriever.query(embedder.embed(['Which poles repel?'])[0], 1)[0]
+
+        assert result.chunks == len(retriever.chunk_ids)
+        assert best.topic == 'Magnetism'
+        assert 'poles repel' in store.get(best.id)
+
+    def test_only_changed_chunks_are_embedded(self):
+        """
+        Test that ingesting again only embeds the chunks whose content changed.
+        """
+        self.ingest(CountingEmbedder())
+        self.write('Sound', 'Sound travels faster in solids than in gases. ' * 30)
+
+        embedder = CountingEmbedder()
+        result = self.ingest(embedder)
+
+        assert result.embedded == len(embedder.embedded) > 0
+        assert all('solids' in text for text in embedder.embedded)
+        assert result.reused == len([chunk_id for chunk_id in LocalRetriever.load(self.index_dir).chunk_ids
+                                     if chunk_id.startswith('Magnetism/')])
+
+    def test_embedder_change_embeds_everything(self):
+        """
+        Test that embeddings of another embedder are never reused.
+        """
+        self.ingest(HashingEmbedder(dimension=32))
+        result = self.ingest(CountingEmbedder())
+
+        assert result.reused == 0
+
+    def test_ingest_swaps_index_directory(self):
+        """
+        Test that every ingestion writes a new index directory, links it in place and removes the previous one.
+        """
+        self.ingest(CountingEmbedder())
+        previous = os.path.realpath(self.index_dir)
+        self.write('Sound', 'Sound travels faster in solids than in gases. ' * 30)
+        self.ingest(CountingEmbedder())
+
+        assert os.path.islink(self.index_dir)
+        assert os.path.realpath(self.index_dir) != previous
+        assert not os.path.exists(previous)
+        assert sorted(os.listdir(self.directory.name)) == sorted(
+            ['data', 'index', os.path.basename(os.path.realpath(self.index_dir))])
+
+    def test_failed_ingest_keeps_previous_index(self):
+        """
+        Test that an ingestion failing while embedding leaves the previous index and chunk store in place.
+        """
+        self.ingest(CountingEmbedder())
+        chunk_ids = LocalRetriever.load(self.index_dir).chunk_ids
+        files = sorted(os.listdir(self.directory.name))
+        self.write('Sound', 'Sound travels faster in solids than in gases. ' * 30)
+
+        embedder = CountingEmbedder()
+        with patch.object(embedder, 'embed', side_effect=RuntimeError('Embedding failed')):
+            with self.assertRaises(RuntimeError):
+                self.ingest(embedder)
+
+        assert LocalRetriever.load(self.index_dir).chunk_ids == chunk_ids
+        assert sorted(os.listdir(self.directory.name)) == files
+        assert 'longitudinal' in ChunkStore(os.path.join(self.index_dir, CHUNK_STORE_FILE)).get('Sound/0')
+
+    def test_workers_reload_index_and_chunk_store_together(self):
+        """
+        Test that a running worker reloads the retriever and the chunk store together after an ingestion.
+        """
+        app = Flask(__name__)
+        app.config.update(QNA_RETRIEVER='local', QNA_INDEX_DIR=self.index_dir)
+        self.ingest(CountingEmbedder())
+
+        with app.app_context(), patch.object(services, '_local_index', None):
+            retriever, store = services.get_sources()
+            assert services.get_sources() == (retriever, store)
+
+            self.write('Sound', 'Sound travels faster in solids than in gases. ' * 30)
+            self.ingest(CountingEmbedder())
+            new_retriever, new_store = services.get_sources()
+
+            assert new_retriever is not retriever
+            assert 'solids' in new_store.get('Sound/0')
+            assert new_store.get_many(new_retriever.chunk_ids).keys() == set(new_retriever.chunk_ids)
+
+
+class QnaTestCase(BaseTestCase):
+    """
+    Serves QnA answers from two local chunks, with the completion API mocked
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache._answer_index.reset()
+        cache._metrics.reset()
+        cache._table_sizes.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.embedder = CountingEmbedder()
+        texts = {'Electricity/0': "Ohm's law relates voltage, current and resistance.", 'Sound/0': 'Sound is a wave.'}
+        store_path = os.path.join(directory.name, 'chunks.sqlite')
+        ChunkStore.build(store_path, texts.items())
+        retriever = LocalRetriever.from_embeddings(list(texts), self.embedder.embed(list(texts.values())))
+        self.embedder.embedded.clear()
+
+        for name, value in (('_embedder', self.embedder), ('_retriever', retriever), ('_chunk_store', ChunkStore(store_path))):
+            patcher = patch.object(services, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=' V = IR '))])
+        patcher = patch.object(openai.ChatCompletion, 'create', return_value=response)
+        self.completion = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestQnaCache(QnaTestCase):
+    def test_repeated_question_is_served_from_cache(self):
+        """
+        Test that a question differing only in case and punctuation reuses the embedding and the answer.
+        """
+        assert services.answer("What is Ohm's law?") == ('V = IR', False)
+        assert services.answer("what is ohm's law") == ('V = IR', True)
+
+        assert self.completion.call_count == 1
+        assert len(self.embedder.embedded) == 1
+        assert cache.stats() == {'embedding': {'hits': 1, 'misses': 1, 'hitRate': 0.5},
+                                 'answer': {'hits': 1, 'misses': 1, 'hitRate': 0.5}}
+
+    def test_different_question_misses(self):
+        """
+        Test that a question below the similarity threshold is answered again.
+        """
+        services.answer("What is Ohm's law?")
+        services.answer('How fast does sound travel?')
+
+        assert self.completion.call_count == 2
+
+    def test_cache_survives_restart(self):
+        """
+        Test that answers are found again from the database by a new process.
+        """
+        services.answer("What is Ohm's law?")
+        cache._answer_index.reset()
+
+        assert services.answer("What is Ohm's law?") == ('V = IR', True)
+
+    def test_expired_answers_are_not_served(self):
+        """
+        Test that answers older than the TTL are answered again.
+        """
+        services.answer("What is Ohm's law?")
+        QnaAnswer.query.update({'date_created': datetime.datetime.utcnow() - cache.CACHE_TTL * 2})
+        db.session.commit()
+
+        assert services.answer("What is Ohm's law?") == ('V = IR', False)
+
+    def test_least_recently_used_answers_are_evicted(self):
+        """
+        Test that the least recently used answers are evicted beyond the cache size.
+        """
+        with patch.object(cache, 'ANSWER_CACHE_SIZE', 2):
+            for question in ('What is current?', 'What is voltage?', 'What is resistance?'):
+                services.answer(question)
+
+        assert [answer.question for answer in QnaAnswer.query.order_by(QnaAnswer.id)] == ['What is voltage?', 'What is resistance?']
+
+    def test_full_cache_is_shrunk_below_its_size(self):
+        """
+        Test that a full answer cache is shrunk below its size, so it is not counted on every insertion.
+        """
+        questions = ['current', 'voltage', 'resistance', 'power', 'energy', 'charge', 'field', 'force']
+        with patch.object(cache, 'ANSWER_CACHE_SIZE', 5), patch.object(cache, 'EVICTION_SLACK', 0.4):
+            for question in questions[:6]:
+                services.answer(f'What is {question}?')
+            assert [answer.question for answer in QnaAnswer.query.order_by(QnaAnswer.id)] == \
+                   ['What is power?', 'What is energy?', 'What is charge?']
+
+            for question in questions[6:]:
+                services.answer(f'What is {question}?')
+            assert QnaAnswer.query.count() == 5
+
+    def test_answer_index_drops_evicted_answers(self):
+        """
+        Test that the in-process answer index drops evicted answers instead of growing with every cached answer.
+        """
+        questions = ['current', 'voltage', 'resistance', 'power', 'energy', 'charge', 'field', 'force', 'mass',
+                     'weight', 'pressure', 'density']
+        with patch.object(cache, 'ANSWER_CACHE_SIZE', 5), patch.object(cache, 'EVICTION_SLACK', 0.4):
+            for question in questions:
+                services.answer(f'What is {question}?')
+
+        assert len(cache._answer_index.ids) <= 7
+        assert cache._answer_index.max_id == max(answer.id for answer in QnaAnswer.query) - 1
+        assert services.answer('What is pressure?') == ('V = IR', True)
+
+    def test_cache_leaves_request_session_alone(self):
+        """
+        Test that cache writes neither commit nor roll back the pending changes of the request session.
+        """
+        user = self.create_user('alice@gmail.com', 'alice')
+        user.credits = 5
+
+        with patch.object(cache, 'METRICS_FLUSH_INTERVAL', 0):
+            services.answer("What is Ohm's law?")
+            services.answer("What is Ohm's law?")
+
+        assert user in db.session.dirty
+        db.session.rollback()
+        assert User.get_by_id(user.id).credits == 10
+
+    def test_metrics_are_flushed_periodically(self):
+        """
+        Test that cache metrics are counted in process and only written once the flush interval elapsed.
+        """
+        services.answer("What is Ohm's law?")
+        assert QnaCacheMetric.query.count() == 0
+
+        with patch.object(cache, 'METRICS_FLUSH_INTERVAL', 0):
+            services.answer("What is Ohm's law?")
+
+        assert {metric.name: metric.value for metric in QnaCacheMetric.query} == \
+               {'embedding_hits': 1, 'embedding_misses': 1, 'answer_hits': 1, 'answer_misses': 1}
+
+    def test_cached_answers_cost_no_credits(self):
+        """
+        Test that only answers which were not cached cost the user a credit.
+        """
+        user = self.create_user('alice@gmail.com', 'alice')
+        self.login_as(user)
+
+        for _ in range(2):
+            response = self.client.post('/api/v1/ai/qna/answer', json={'question': "What is Ohm's law?"})
+            assert response.status_code == 200
+
+        assert [response.json['cached']] == [True]
+        assert User.get_by_id(user.id).credits == 9
+
+
+class FakeStreamingClient(LLMClient):
+    """
+    LLM client streaming a fixed reply fragment by fragment.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+        self.calls = 0
+
+    def complete(self, messages, model=None, **options):
+        return ''.join(self.stream(messages, model, **options))
+
+    def stream(self, messages, model=None, **options):
+        self.calls += 1
+        yield from self.fragments
+
+
+class TestQnaStreaming(QnaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.llm_client = FakeStreamingClient([' ', 'V', ' =', ' IR', ' '])
+        self.app.extensions['llm_client'] = self.llm_client
+        self.addCleanup(self.app.extensions.pop, 'llm_client', None)
+
+    def read_events(self, response):
+        events = []
+        for block in response.get_data(as_text=True).split('\n\n')[:-1]:
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_context_is_sent_before_generation(self):
+        """
+        Test that the sources are yielded before the model is asked for the answer.
+        """
+        events = services.stream_answer("What is Ohm's law?")
+        event, data = next(events)
+
+        assert event == 'context'
+        assert data['sources'][0]['id'] == 'Electricity/0'
+        assert self.llm_client.calls == 0
+
+        assert [event for event, _ in events] == ['token'] * 4 + ['done']
+
+    def test_streamed_answer_is_cached(self):
+        """
+        Test that the streamed answer is cached like a complete answer, and served from the cache afterwards.
+        """
+        user = self.create_user('alice@gmail.com', 'alice')
+        self.login_as(user)
+
+        response = self.client.post('/api/v1/ai/qna/answer/stream', json={'question': "What is Ohm's law?"})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+        events = self.read_events(response)
+        assert ''.join(data['text'] for event, data in events if event == 'token') == 'V = IR '
+        assert events[-1] == ('done', {'cached': False})
+
+        response = self.client.post('/api/v1/ai/qna/answer/stream', json={'question': "what is ohm's law"})
+        assert self.read_events(response)[1:] == [('token', {'text': 'V = IR'}), ('done', {'cached': True})]
+
+        assert self.llm_client.calls == 1
+        assert User.get_by_id(user.id).credits == 9
+
+    def test_stream_error(self):
+        """
+        Test that a failure of the model is reported as an error event.
+        """
+        def fail(*args, **kwargs):
+            raise RuntimeError('Model unavailable')
+            yield
+
+        self.llm_client.stream = fail
+        events = list(services.stream_answer("What is Ohm's law?"))
+
+        assert events[-1] == ('error', {'message': 'Model unavailable'})
@@ -0,0 +1,436 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import boto3
+import requests
+from botocore.config import Config
+from PIL import Image
+from sqlalchemy import delete
+
+from app import db
+from app.models import Post, StoredFile, Upload, User
+from app.upload import files, images, tasks, upload_services
+from benchmarks.mock_s3_server import MockS3Server
+from tests.base import BaseTestCase
+
+
+class S3TestCase(BaseTestCase):
+    """
+    Uploads files to a local in-memory S3 server
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.s3_server = MockS3Server().start()
+        self.addCleanup(self.s3_server.shutdown)
+
+        client = boto3.client('s3', endpoint_url=self.s3_server.endpoint_url, region_name='us-east-1',
+                              aws_access_key_id='test', aws_secret_access_key='test',
+                              config=Config(s3={'addressing_style': 'path'}))
+        patcher = patch.object(files, 's3', client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, True)
+        patcher = patch.dict(self.app.config, {'UPLOAD_SPOOL_DIR': spool_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = self.create_user('uploader@test.com', 'uploader')
+        self.user_id = self.user.id
+        self.login_as(self.user)
+
+    def stored(self):
+        return {key: data for (_, key), (data, _) in self.s3_server.objects.items()}
+
+
+def make_image(width: int, height: int, image_format: str = 'PNG') -> bytes:
+    stream = io.BytesIO()
+    Image.new('RGB', (width, height), 'teal').save(stream, format=image_format)
+    return stream.getvalue()
+
+
+class TestUpload(S3TestCase):
+    def upload(self, data: bytes):
+        return self.client.post('/api/v1/upload/?purpose=post_attachment',
+                                data={'file': (io.BytesIO(data), 'notes.pdf', 'application/pdf')})
+
+    def test_small_file_is_put(self):
+        """
+        Test that a file below the multipart threshold is uploaded with a single request
+        """
+        response = self.upload(b'lecture notes')
+        self.assert200(response)
+
+        [(key, data)] = self.stored().items()
+        self.assertTrue(response.json['url'].endswith(key))
+        self.assertEqual(data, b'lecture notes')
+        self.assertEqual([method for method, _, _ in self.s3_server.requests], ['PUT'])
+
+    def test_large_file_is_uploaded_in_parts(self):
+        """
+        Test that a file above the multipart threshold is uploaded part by part and reassembled in order
+        """
+        data = bytes(range(256)) * (12 * files.MB // 256)
+        response = self.upload(data)
+        self.assert200(response)
+
+        self.assertEqual(list(self.stored().values()), [data])
+        parts = sorted(part for method, _, part in self.s3_server.requests if part)
+        self.assertEqual(parts, ['1', '2'])
+
+
+class TestDeduplication(S3TestCase):
+    def create_post(self, data: bytes):
+        response = self.client.post('/api/v1/posts/create', data={
+            'title': 'Notes', 'body': 'See attached', 'subject': 'physics',
+            'file': (io.BytesIO(data), 'notes.pdf', 'application/pdf')
+        })
+        self.assert200(response)
+        return response.json
+
+    def test_same_content_is_stored_once(self):
+        """
+        Test that attachments of the same content share one S3 object, uploaded once and
+        deleted with the last post referencing it
+        """
+        first, second = self.create_post(b'lecture notes'), self.create_post(b'lecture notes')
+        other = self.create_post(b'other notes')
+
+        self.assertEqual(first['attachment'], second['attachment'])
+        self.assertNotEqual(first['attachment'], other['attachment'])
+        self.assertEqual([method for method, _, _ in self.s3_server.requests], ['PUT', 'PUT'])
+
+        key = first['attachment'].split('.amazonaws.com/')[1]
+        self.assertEqual(StoredFile.get_by_key(key).ref_count, 2)
+
+        self.client.delete(f'/api/v1/posts/{first["id"]}/delete')
+        self.assertIn(key, self.stored())
+        self.assertEqual(StoredFile.get_by_key(key).ref_count, 1)
+
+        self.client.delete(f'/api/v1/posts/{second["id"]}/delete')
+        self.assertNotIn(key, self.stored())
+        self.assertIsNone(StoredFile.get_by_key(key))
+        self.assertEqual(len(self.stored()), 1)
+
+
+    def test_failed_upload_saves_no_post(self):
+        """
+        Test that a post is not saved when its attachment could not be uploaded
+        """
+        with patch.object(files.PostAttachment, 'upload', return_value=None):
+            response = self.client.post('/api/v1/posts/create', data={
+                'title': 'Notes', 'body': 'See attached', 'subject': 'physics',
+                'file': (io.BytesIO(b'lecture notes'), 'notes.pdf', 'application/pdf')
+            })
+
+        self.assert400(response)
+        self.assertEqual(Post.query.count(), 0)
+
+    def test_failed_save_releases_attachment(self):
+        """
+        Test that the attachment of a post which could not be saved is released
+        """
+        with patch.object(Post, 'save', side_effect=RuntimeError('Database is gone')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/v1/posts/create', data={
+                    'title': 'Notes', 'body': 'See attached', 'subject': 'physics',
+                    'file': (io.BytesIO(b'lecture notes'), 'notes.pdf', 'application/pdf')
+                })
+
+        self.assertEqual(self.stored(), {})
+        self.assertEqual(StoredFile.query.count(), 0)
+
+class TestBackgroundUpload(S3TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['UPLOAD_IN_BACKGROUND'] = True
+        self.addCleanup(self.app.config.__setitem__, 'UPLOAD_IN_BACKGROUND', False)
+
+        # Record the future of every background upload, so tests can wait for the upload workers
+        self.futures = []
+        submit = tasks.submit_post_attachment
+
+        def record_submit(*args):
+            future = submit(*args)
+            self.futures.append(future)
+            return future
+
+        tasks.submit_post_attachment = record_submit
+        self.addCleanup(setattr, tasks, 'submit_post_attachment', submit)
+
+    def create_post(self):
+        return self.client.post('/api/v1/posts/create', data={
+            'title': 'Notes', 'body': 'See attached', 'subject': 'physics',
+            'file': (io.BytesIO(b'lecture notes'), 'notes.pdf', 'application/pdf')
+        })
+
+    def wait_for_uploads(self):
+        for future in self.futures:
+            future.result(timeout=10)
+        db.session.expire_all()
+
+    def test_post_is_pending_until_uploaded(self):
+        """
+        Test that a post is created with a pending attachment, which is shown once uploaded
+        """
+        response = self.create_post()
+        self.assert200(response)
+        self.assertTrue(response.json['attachmentPending'])
+        self.assertIsNone(response.json['attachment'])
+
+        self.wait_for_uploads()
+
+        post = Post.get_by_id(response.json['id'])
+        self.assertFalse(post.attachment_pending)
+        self.assertTrue(post.attachment.endswith(f'{files.CONTENT_DIRECTORY}/{post.attachment_name}'))
+        self.assertEqual(list(self.stored().values()), [b'lecture notes'])
+
+    def test_failed_upload_drops_attachment(self):
+        """
+        Test that a post whose attachment could not be uploaded is left without attachment
+        """
+        with patch.object(files.s3, 'upload_fileobj', side_effect=RuntimeError('S3 unavailable')):
+            response = self.create_post()
+            self.wait_for_uploads()
+
+        post = Post.get_by_id(response.json['id'])
+        self.assertFalse(post.attachment_pending)
+        self.assertIsNone(post.attachment_name)
+
+    def test_failed_spool_saves_no_post(self):
+        """
+        Test that a post is not saved when its attachment cannot be spooled, so no post is left pending
+        """
+        with patch.object(tasks, 'spool', side_effect=OSError('Disk full')):
+            with self.assertRaises(OSError):
+                self.create_post()
+
+        self.assertEqual(Post.query.count(), 0)
+
+    def test_post_deleted_while_pending_stores_nothing(self):
+        """
+        Test that the attachment of a post deleted before or during its upload is not left referenced
+        """
+        with patch.object(tasks, 'submit_post_attachment'):
+            post_id = self.create_post().json['id']
+        self.assert200(self.client.delete(f'/api/v1/posts/{post_id}/delete'))
+        tasks.submit_post_attachment(self.app, post_id, tasks.get_spool_path(self.app, post_id), 'application/pdf')
+
+        store = files.File.store
+
+        def store_then_delete_post(attachment, *args):
+            store(attachment, *args)
+            db.session.execute(delete(Post), execution_options={'synchronize_session': False})
+            db.session.commit()
+
+        with patch.object(files.File, 'store', store_then_delete_post):
+            self.create_post()
+            self.wait_for_uploads()
+
+        self.assertEqual(Post.query.count(), 0)
+        self.assertEqual(StoredFile.query.count(), 0)
+        self.assertEqual(self.stored(), {})
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_SPOOL_DIR']), [])
+
+    def test_recover_pending_attachments(self):
+        """
+        Test that interrupted uploads whose file is still spooled are resumed after a restart,
+        and pending attachments whose file is gone are dropped
+        """
+        with patch.object(tasks, 'submit_post_attachment'):
+            resumable_id = self.create_post().json['id']
+            lost_id = self.create_post().json['id']
+        os.remove(tasks.get_spool_path(self.app, lost_id))
+
+        result = self.app.test_cli_runner().invoke(args=['posts', 'recover-attachments'])
+        self.assertEqual(result.exit_code, 0)
+        self.wait_for_uploads()
+
+        resumed, lost = Post.get_by_id(resumable_id), Post.get_by_id(lost_id)
+        self.assertFalse(resumed.attachment_pending)
+        self.assertIsNotNone(resumed.attachment)
+        self.assertFalse(lost.attachment_pending)
+        self.assertIsNone(lost.attachment_name)
+        self.assertEqual(list(self.stored().values()), [b'lecture notes'])
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_SPOOL_DIR']), [])
+
+
+class TestPresignedUpload(S3TestCase):
+    def presign(self, purpose, content_type, method='POST'):
+        return self.client.post(f'/api/v1/upload/presign?purpose={purpose}',
+                                json={'contentType': content_type, 'method': method})
+
+    def upload_presigned(self, purpose, content_type, data, method='POST'):
+        presigned = self.presign(purpose, content_type, method).json
+        if method == 'PUT':
+            response = requests.put(presigned['url'], data=data, headers=presigned['headers'])
+        else:
+            response = requests.post(presigned['url'], data=presigned['fields'], files={'file': ('file', data)})
+        assert response.ok
+        return presigned['key']
+
+    def complete(self, key):
+        return self.client.post('/api/v1/upload/complete', json={'key': key})
+
+    def test_presigned_post_upload(self):
+        """
+        Test that a file uploaded with a presigned POST is recorded under the key layout of its purpose and user
+        """
+        key = self.upload_presigned('post_attachment', 'application/pdf', b'lecture notes')
+        self.assertTrue(key.startswith(f'post_attachment/{self.user_id}/') and key.endswith('.pdf'))
+
+        response = self.complete(key)
+        self.assert200(response)
+        self.assertEqual(response.json['size'], len(b'lecture notes'))
+        self.assertEqual(response.json['contentType'], 'application/pdf')
+
+        # Completing twice returns the same upload
+        self.assert200(self.complete(key))
+        self.assertEqual(Upload.query.count(), 1)
+
+        response = self.client.post('/api/v1/posts/create', data={
+            'title': 'Notes', 'body': 'See attached', 'subject': 'physics', 'attachmentKey': key
+        })
+        self.assert200(response)
+        self.assertTrue(response.json['attachment'].endswith(key))
+
+    def test_presigned_attachment_is_deleted_with_post(self):
+        """
+        Test that an attachment uploaded with a presigned request belongs to one post, and is deleted with it
+        """
+        key = self.upload_presigned('post_attachment', 'application/pdf', b'lecture notes')
+        self.assert200(self.complete(key))
+
+        data = {'title': 'Notes', 'body': 'See attached', 'subject': 'physics', 'attachmentKey': key}
+        post_id = self.client.post('/api/v1/posts/create', data=data).json['id']
+        self.assert400(self.client.post('/api/v1/posts/create', data=data))
+
+        self.assert200(self.client.delete(f'/api/v1/posts/{post_id}/delete'))
+        self.assertNotIn(key, self.stored())
+        self.assertIsNone(Upload.get_by_key(key))
+
+    def test_presigned_put_profile_picture(self):
+        """
+        Test that a profile picture uploaded with a presigned PUT becomes the profile picture of the user
+        once its variants are made, and the original is then deleted
+        """
+        key = self.upload_presigned('profile_picture', 'image/png', make_image(300, 200), method='PUT')
+
+        futures = []
+        process_later = tasks.process_profile_picture_later
+
+        def record_process_later(*args):
+            futures.append(process_later(*args))
+            return futures[-1]
+
+        with patch.object(tasks, 'process_profile_picture_later', record_process_later):
+            response = self.complete(key)
+        self.assert200(response)
+
+        futures[0].result(timeout=30)
+        db.session.expire_all()
+        variants = User.get_by_id(self.user_id).pfp_variants
+        self.assertEqual(len([name for name in self.stored() if name.endswith('.webp')]), len(images.PFP_SIZES))
+        self.assertTrue(all(name in self.stored() for name in
+                            (url.split('.amazonaws.com/')[1] for url in variants.values())))
+
+        # The original is deleted once its variants are made
+        self.assertNotIn(key, self.stored())
+        self.assertIsNone(Upload.get_by_key(key))
+
+    def test_invalid_uploads_are_rejected(self):
+        """
+        Test that uploads of the wrong type, too large, missing or of another user are rejected
+        """
+        self.assert400(self.presign('profile_picture', 'application/pdf'))
+
+        key = self.upload_presigned('post_attachment', 'application/pdf', b'12345')
+        with patch.dict(upload_services.MAX_UPLOAD_SIZE, {files.FilePurpose.POST_ATTACHMENT: 4}):
+            self.assert400(self.complete(key))
+        self.assertEqual(self.stored(), {})
+
+        self.assert404(self.complete(f'post_attachment/{self.user_id}/missing.pdf'))
+        self.assert401(self.complete('post_attachment/0/other.pdf'))
+        self.assert400(self.complete('not-a-key'))
+
+
+class TestProfilePicture(S3TestCase):
+    def test_variants(self):
+        """
+        Test that every variant is a centered square WebP of its size, downscaled from a large JPEG
+        """
+        variants = images.make_square_variants(make_image(1200, 800, 'JPEG'))
+        self.assertEqual(sorted(variants), sorted(images.PFP_SIZES))
+        for size, data in variants.items():
+            image = Image.open(io.BytesIO(data))
+            self.assertEqual((image.format, image.size), ('WEBP', (size, size)))
+
+    def test_upload_pfp(self):
+        """
+        Test that an uploaded profile picture is stored at every size and served by size,
+        while pictures uploaded before variants are served at every size
+        """
+        user = User.get_by_id(self.user_id)
+        user.pfp_file_name = 'legacy.legacy'
+        user.save()
+        self.assertEqual(len(set(user.pfp_variants.values())), 1)
+
+        response = self.client.post('/api/v1/users/pfp/upload',
+                                    data={'file': (io.BytesIO(make_image(640, 480)), 'me.png', 'image/png')})
+        self.assert200(response)
+
+        user = User.get_by_id(self.user_id)
+        self.assertEqual(response.json['url'], user.pfp)
+        self.assertEqual(user.pfp, user.pfp_variants[max(images.PFP_SIZES)])
+        for size, url in user.pfp_variants.items():
+            data = self.stored()[url.split('.amazonaws.com/')[1]]
+            self.assertEqual(Image.open(io.BytesIO(data)).size, (size, size))
+
+    def test_upload_pfp_in_background(self):
+        """
+        Test that an uploaded profile picture is processed by the upload workers, the user keeping
+        their previous picture until its variants are uploaded
+        """
+        futures = []
+        update_later = tasks.update_profile_picture_later
+
+        def record_update_later(*args):
+            futures.append(update_later(*args))
+            return futures[-1]
+
+        with patch.dict(self.app.config, {'UPLOAD_IN_BACKGROUND': True}), \
+                patch.object(tasks, 'update_profile_picture_later', record_update_later):
+            response = self.client.post('/api/v1/users/pfp/upload',
+                                        data={'file': (io.BytesIO(make_image(640, 480)), 'me.png', 'image/png')})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(User.get_by_id(self.user_id).pfp, '/static/assets/default-pfp.jpg')
+
+        futures[0].result(timeout=30)
+        db.session.expire_all()
+        user = User.get_by_id(self.user_id)
+        self.assertEqual(user.pfp, user.pfp_variants[max(images.PFP_SIZES)])
+        self.assertIn(user.pfp.split('.amazonaws.com/')[1], self.stored())
+
+    def test_import_profile_picture(self):
+        """
+        Test that a remote profile picture is imported in the background, and that pictures
+        above the size limit are not downloaded
+        """
+        self.s3_server.objects[('avatars', 'me.png')] = (make_image(96, 96), 'image/png')
+        url = f'{self.s3_server.endpoint_url}/avatars/me.png'
+
+        self.assertIsNone(files.File.download_from_url(url, max_size=10))
+        self.assertIsNone(files.File.download_from_url(f'{self.s3_server.endpoint_url}/avatars/missing.png'))
+
+        self.assertEqual(User.get_by_id(self.user_id).pfp, '/static/assets/default-pfp.jpg')
+        tasks.import_profile_picture_later(self.user_id, url).result(timeout=30)
+        db.session.expire_all()
+
+        user = User.get_by_id(self.user_id)
+        self.assertTrue(user.pfp_file_name.endswith('.webp'))
+        self.assertIn(user.pfp.split('.amazonaws.com/')[1], self.stored())
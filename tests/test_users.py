@@ -0,0 +1,115 @@
+import unittest
+
+from app import db
+from app.models import User
+from app.users import user_services
+from tests.base import BaseTestCase
+
+
+class TestUserAutocomplete(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for username in ['Alice', 'alicia', 'Albert', 'bob', 'malice']:
+            self.create_user(f'{username.lower()}@gmail.com', username)
+
+    def test_autocomplete_prefix(self):
+        """
+        Test that autocomplete matches username prefixes case-insensitively and returns a compact payload.
+        """
+        response = self.client.get('/api/v1/users/autocomplete?q=ALI')
+
+        assert response.status_code == 200
+        assert [user['username'] for user in response.json] == ['Alice', 'alicia']
+        assert set(response.json[0].keys()) == {'id', 'username', 'pfp', 'pfpVariants'}
+
+    def test_autocomplete_limit(self):
+        """
+        Test that the number of suggestions is capped.
+        """
+        for i in range(15):
+            self.create_user(f'student{i}@gmail.com', f'student{i}')
+
+        assert len(self.client.get('/api/v1/users/autocomplete?q=stu&limit=3').json) == 3
+        assert len(self.client.get('/api/v1/users/autocomplete?q=stu&limit=100').json) == 10
+
+    def test_non_positive_limit_is_capped(self):
+        """
+        Test that a zero or negative limit cannot lift the cap on the number of results.
+        """
+        for i in range(25):
+            self.create_user(f'student{i}@gmail.com', f'student{i}')
+
+        for limit in (0, -1):
+            assert len(self.client.get(f'/api/v1/users/autocomplete?q=stu&limit={limit}').json) == 10
+            assert len(self.client.get(f'/api/v1/users/search/stu?limit={limit}').json) == 20
+
+    def test_autocomplete_empty_prefix(self):
+        """
+        Test that an empty prefix does not return every user.
+        """
+        assert self.client.get('/api/v1/users/autocomplete?q=').json == []
+
+    def test_get_by_username_ignores_case(self):
+        """
+        Test that username lookups use the normalized username.
+        """
+        user = User.get_by_username('ALBERT')
+
+        assert user is not None
+        assert user.username == 'Albert'
+
+    def test_backfill_usernames(self):
+        """
+        Test that the backfill command populates missing normalized usernames.
+        """
+        db.session.execute(db.update(User).values(username_lower=None))
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['users', 'backfill-usernames'])
+
+        assert result.exit_code == 0
+        assert User.get_by_username('bob') is not None
+
+
+class TestUserBatch(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        user_services._profile_cache.clear()
+        self.addCleanup(user_services._profile_cache.clear)
+        self.users = [self.create_user(f'{username}@gmail.com', username) for username in ['alice', 'bob', 'carol']]
+
+    def test_batch_profiles(self):
+        """
+        Test that profiles are returned in the order of the IDs, without duplicates or missing users.
+        """
+        alice, bob, carol = self.users
+        response = self.client.get(f'/api/v1/users?ids={carol.id},{alice.id},0,{carol.id}')
+
+        assert response.status_code == 200
+        assert [user['username'] for user in response.json] == ['carol', 'alice']
+        assert set(response.json[0].keys()) == {'id', 'username', 'pfp', 'pfpVariants'}
+
+        assert self.client.get('/api/v1/users?ids=').status_code == 400
+        assert self.client.get('/api/v1/users?ids=1,two').status_code == 400
+        assert self.client.get(f'/api/v1/users?ids={",".join(["1"] * 101)}').status_code == 400
+
+    def test_profiles_are_cached_until_saved(self):
+        """
+        Test that cached profiles are served without a query, and invalidated once the user is saved.
+        """
+        alice = self.users[0]
+        assert user_services.get_profiles([alice.id])[0]['username'] == 'alice'
+
+        # Changes which bypass the session are not seen until the profile is invalidated
+        db.session.execute(db.update(User).where(User.id == alice.id).values(username='alicia'))
+        db.session.commit()
+        assert user_services.get_profiles([alice.id])[0]['username'] == 'alice'
+
+        alice = User.get_by_id(alice.id)
+        alice.username = 'ally'
+        alice.save()
+        assert user_services.get_profiles([alice.id])[0]['username'] == 'ally'
+
+
+if __name__ == '__main__':
+    unittest.main()